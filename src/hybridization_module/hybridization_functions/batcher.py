@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future
+
+from hybridization_module.hybridization_functions.registry import get_hybridization_function
+from hybridization_module.hybridization_functions.xoring import xoring_kdf_many
+from hybridization_module.model.config import HybridizationBatcherConfiguration
+from hybridization_module.model.metrics import HybridizationBatcherMetrics
+from hybridization_module.model.shared_enums import HybridizationMethod
+
+log = logging.getLogger(__name__)
+
+XOR_BATCH_MAX_CHUNK_SIZE = 1024 # Over this size, joining the keys costs more than the separate XORs
+
+
+class _HybridizationJob:
+    def __init__(self, method: HybridizationMethod, keys: list[bytes], chunk_size: int) -> None:
+        self.future: Future = Future()
+        self.method: HybridizationMethod = method
+        self.keys: list[bytes] = keys
+        self.chunk_size: int = chunk_size
+
+
+class HybridizationBatcher:
+    """Node-wide thread that hybridizes the keys of every session in batches.
+
+    The jobs that arrive within window seconds of the first one (up to max_batch_size) run together:
+    the XOR jobs with the same chunk size and number of keys take a single XOR per key position (for
+    chunks up to XOR_BATCH_MAX_CHUNK_SIZE), and the rest run one after the other in the batch thread
+    (hashlib releases the GIL for the large keys). Each job completes the future of its session.
+    """
+
+    def __init__(self, config: HybridizationBatcherConfiguration) -> None:
+        self.enabled: bool = config.enabled
+        self.max_batch_size: int = config.max_batch_size
+        self.window: float = config.window
+
+        self._condition: threading.Condition = threading.Condition()
+        self._jobs: deque[_HybridizationJob] = deque()
+        self._running: bool = False
+        self._thread: threading.Thread = None
+
+        self._batches: int = 0
+        self._completed: int = 0
+        self._vectorized: int = 0
+        self._failed: int = 0
+        self._largest_batch: int = 0
+
+    def submit(self, method: HybridizationMethod, keys: list[bytes], chunk_size: int) -> Future:
+        """Schedules the hybridization of keys (already sorted) into a key of chunk_size bytes.
+
+        Returns:
+            Future: Future that will contain the hybrid key (or the exception of the hybridization).
+        """
+        job = _HybridizationJob(method, keys, chunk_size)
+
+        with self._condition:
+            if self._running:
+                self._jobs.append(job)
+                # Wake up the batch thread for the first job of a batch, or once the batch is full
+                if len(self._jobs) == 1 or len(self._jobs) >= self.max_batch_size:
+                    self._condition.notify()
+                return job.future
+
+        # The batcher is not running, the job runs in the caller thread
+        self._run_batch([job])
+        return job.future
+
+    def _collect_batch(self) -> list[_HybridizationJob]:
+        """Waits for the first job and then for the rest of the batch (lock must be held)."""
+        while self._running and not self._jobs:
+            self._condition.wait()
+
+        window_end = time.monotonic() + self.window
+        while self._running and len(self._jobs) < self.max_batch_size:
+            remaining = window_end - time.monotonic()
+            if remaining <= 0:
+                break
+            self._condition.wait(remaining)
+
+        return [self._jobs.popleft() for _ in range(min(len(self._jobs), self.max_batch_size))]
+
+    def _run_batch(self, batch: list[_HybridizationJob]) -> None:
+        groups: dict[tuple[HybridizationMethod, int, int], list[_HybridizationJob]] = defaultdict(list)
+        for job in batch:
+            groups[(job.method, job.chunk_size, len(job.keys))].append(job)
+
+        completed = vectorized = failed = 0
+        for (method, chunk_size, _), jobs in groups.items():
+            if method == HybridizationMethod.XOR and len(jobs) > 1 and chunk_size <= XOR_BATCH_MAX_CHUNK_SIZE:
+                try:
+                    hybrid_keys = xoring_kdf_many([job.keys for job in jobs], chunk_size)
+                except Exception as e:
+                    log.error("Failed to XOR a batch of %s keys, hybridizing them one by one: %s", len(jobs), e)
+                else:
+                    for job, hybrid_key in zip(jobs, hybrid_keys):
+                        job.future.set_result(hybrid_key)
+                    completed += len(jobs)
+                    vectorized += len(jobs)
+                    continue
+
+            for job in jobs:
+                try:
+                    job.future.set_result(get_hybridization_function(method)(job.keys, chunk_size))
+                    completed += 1
+                except Exception as e:
+                    job.future.set_exception(e)
+                    failed += 1
+
+        with self._condition:
+            self._batches += 1
+            self._completed += completed
+            self._vectorized += vectorized
+            self._failed += failed
+            self._largest_batch = max(self._largest_batch, len(batch))
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                batch = self._collect_batch()
+                if not batch and not self._running:
+                    return
+
+            if batch:
+                self._run_batch(batch)
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+
+        with self._condition:
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="hybridization_batcher")
+        self._thread.start()
+        log.debug("Hybridization batcher started (window of %s seconds, up to %s jobs).", self.window, self.max_batch_size)
+
+    def stop(self) -> None:
+        """Stops the batch thread once the queued jobs are done, new jobs run in the caller thread."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_metrics(self) -> HybridizationBatcherMetrics:
+        with self._condition:
+            return HybridizationBatcherMetrics(
+                enabled=self._thread is not None,
+                batches=self._batches,
+                completed=self._completed,
+                vectorized=self._vectorized,
+                failed=self._failed,
+                largest_batch=self._largest_batch,
+                mean_batch_size=(self._completed + self._failed) / self._batches if self._batches else 0.0,
+                queued=len(self._jobs),
+            )
@@ -0,0 +1,32 @@
+# kdfix/funtion/hkdf.py
+import hashlib
+import hmac
+
+from hybridization_module.key_generation.key_expansion import hkdf_expand
+from hybridization_module.utils import key_formatting
+
+HKDF_LABEL = b"kdfix-hybridization-hkdf"
+HKDF_MAX_CHUNK_SIZE = 255 * hashlib.sha256().digest_size # 8160 bytes, the limit of HKDF-SHA256
+
+
+def hkdf_kdf(keys: list[bytes], chunk_size: int) -> bytes:
+    """
+    Derives a key of chunk_size bytes with HKDF-SHA256 (RFC 5869), as the two-step key derivation of NIST SP 800-56C.
+    The extract step hashes the concatenation of the keys (one key at a time), and the expand step produces the key.
+
+    Args:
+        keys (list[bytes]): An list with all the keys to hybridize.
+        chunk_size (int): The size of the derived key.
+
+    Returns:
+        bytes: The derived key.
+
+    Raises:
+        ValueError: If chunk_size is over 8160 bytes, the limit of HKDF-SHA256.
+    """
+
+    extractor = hmac.new(bytes(hashlib.sha256().digest_size), digestmod=hashlib.sha256)
+    for key in keys:
+        extractor.update(key)
+
+    return hkdf_expand(extractor.digest(), HKDF_LABEL + key_formatting.encode_key_sizes(keys), chunk_size)
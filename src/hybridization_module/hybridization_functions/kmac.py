@@ -0,0 +1,33 @@
+# kdfix/funtion/kmac.py
+from Crypto.Hash import KMAC256
+
+from hybridization_module.utils import key_formatting
+
+KMAC_SALT = bytes(132) # Default salt of the KMAC256 one-step key derivation (NIST SP 800-56C)
+KMAC_LABEL = b"kdfix-hybridization-kmac256"
+KMAC_MIN_CHUNK_SIZE = 8 # Minimum output of KMAC
+
+
+def kmac_kdf(keys: list[bytes], chunk_size: int) -> bytes:
+    """
+    Derives a key of any size with the KMAC256 one-step key derivation of NIST SP 800-56C, where the shared
+    secret is the concatenation of the keys (absorbed one at a time).
+
+    Args:
+        keys (list[bytes]): An list with all the keys to hybridize.
+        chunk_size (int): The size of the derived key.
+
+    Returns:
+        bytes: The derived key.
+
+    Raises:
+        ValueError: If chunk_size is under 8 bytes, the minimum output of KMAC.
+    """
+
+    kmac = KMAC256.new(key=KMAC_SALT, mac_len=chunk_size, custom=b"KDF")
+    kmac.update((1).to_bytes(4, "big")) # The counter, a single KMAC call produces the whole key
+    for key in keys:
+        kmac.update(key)
+    kmac.update(KMAC_LABEL + key_formatting.encode_key_sizes(keys)) # FixedInfo
+
+    return kmac.digest()
@@ -0,0 +1,69 @@
+# kdfix/funtion/registry.py
+from collections.abc import Callable
+
+from hybridization_module.hybridization_functions.hkdf import HKDF_MAX_CHUNK_SIZE, hkdf_kdf
+from hybridization_module.hybridization_functions.hmac import hmac_kdf
+from hybridization_module.hybridization_functions.kmac import KMAC_MIN_CHUNK_SIZE, kmac_kdf
+from hybridization_module.hybridization_functions.shake import shake_kdf
+from hybridization_module.hybridization_functions.xorhmac import xorhmac_kdf
+from hybridization_module.hybridization_functions.xoring import xoring_kdf
+from hybridization_module.model.shared_enums import HybridizationMethod
+
+HybridizationFunction = Callable[[list[bytes], int], bytes] # Keys to hybridize and key_chunk_size
+
+
+def _hmac_kdf(keys: list[bytes], chunk_size: int) -> bytes:
+    return hmac_kdf(keys) # Always 32 bytes
+
+
+_HYBRIDIZATION_FUNCTIONS: dict[HybridizationMethod, HybridizationFunction] = {
+    HybridizationMethod.XOR: xoring_kdf,
+    HybridizationMethod.HMAC: _hmac_kdf,
+    HybridizationMethod.XORHMAC: xorhmac_kdf,
+    HybridizationMethod.HKDF: hkdf_kdf,
+    HybridizationMethod.SHAKE: shake_kdf,
+    HybridizationMethod.KMAC: kmac_kdf,
+}
+
+# Range of key_chunk_size each method can produce (minimum, maximum or None without limit)
+_CHUNK_SIZE_LIMITS: dict[HybridizationMethod, tuple[int, int | None]] = {
+    HybridizationMethod.HKDF: (1, HKDF_MAX_CHUNK_SIZE),
+    HybridizationMethod.KMAC: (KMAC_MIN_CHUNK_SIZE, None),
+}
+
+
+def register_hybridization_function(
+        method: HybridizationMethod,
+        function: HybridizationFunction,
+        min_chunk_size: int = 1,
+        max_chunk_size: int | None = None
+    ) -> None:
+    """Sets the function that implements the hybridization method (replacing the current one, if any),
+    and the range of key_chunk_size it can produce."""
+    _HYBRIDIZATION_FUNCTIONS[method] = function
+    _CHUNK_SIZE_LIMITS[method] = (min_chunk_size, max_chunk_size)
+
+
+def check_chunk_size(method: HybridizationMethod, chunk_size: int) -> None:
+    """
+    Checks that the hybridization method can produce keys of chunk_size bytes, so a session that cannot
+    be served is rejected before it uses any key of the sources.
+
+    Raises:
+        ValueError: If chunk_size is out of the range of the method.
+    """
+    min_chunk_size, max_chunk_size = _CHUNK_SIZE_LIMITS.get(method, (1, None))
+    if chunk_size < min_chunk_size or (max_chunk_size is not None and chunk_size > max_chunk_size):
+        limits = f"from {min_chunk_size} to {max_chunk_size}" if max_chunk_size is not None else f"from {min_chunk_size}"
+        raise ValueError(f"The hybridization method {method} only produces keys {limits} bytes, not {chunk_size}.")
+
+
+def get_hybridization_function(method: HybridizationMethod) -> HybridizationFunction:
+    """
+    Raises:
+        ValueError: If the method has no function registered.
+    """
+    function = _HYBRIDIZATION_FUNCTIONS.get(method)
+    if function is None:
+        raise ValueError(f"Unknown hybrid method {method}")
+    return function
@@ -0,0 +1,26 @@
+# kdfix/funtion/shake.py
+import hashlib
+
+from hybridization_module.utils import key_formatting
+
+SHAKE_LABEL = b"kdfix-hybridization-shake256"
+
+
+def shake_kdf(keys: list[bytes], chunk_size: int) -> bytes:
+    """
+    Derives a key of any size with SHAKE256 (FIPS 202) over the concatenation of the keys.
+    The keys are absorbed one at a time and the output is squeezed directly into the key, so large keys are never copied.
+
+    Args:
+        keys (list[bytes]): An list with all the keys to hybridize.
+        chunk_size (int): The size of the derived key.
+
+    Returns:
+        bytes: The derived key.
+    """
+
+    shake = hashlib.shake_256(SHAKE_LABEL + key_formatting.encode_key_sizes(keys))
+    for key in keys:
+        shake.update(key)
+
+    return shake.digest(chunk_size)
@@ -3,6 +3,25 @@
 from hybridization_module.utils import key_formatting
 
 
+def xor_buffers(buffers: list[bytes], size: int) -> bytes:
+    """
+    XORs whole buffers at once, each one converted into a single integer.
+
+    Args:
+        buffers (list[bytes]): The buffers to combine, each one is truncated or padded with zeros to size.
+        size (int): Bytes of the result.
+
+    Returns:
+        bytes: The XOR of all the buffers.
+    """
+    result = 0
+    for buffer in buffers:
+        # Little endian, so a shorter buffer is padded with zeros at the end
+        result ^= int.from_bytes(buffer[:size], "little")
+
+    return result.to_bytes(size, "little")
+
+
 def xoring_kdf(keys: list[bytes], chunk_size: int) -> bytes:
     """
     Derives a key using XOR operation between two input keys.
@@ -17,11 +36,36 @@ def xoring_kdf(keys: list[bytes], chunk_size: int) -> bytes:
         ValueError: If the keys are not of the same length.
     """
 
-    derived_key: bytes = key_formatting.enforce_key_size(keys[0], chunk_size)
+    return xor_buffers(keys, chunk_size)
+
+
+
+def xoring_kdf_many(key_sets: list[list[bytes]], chunk_size: int) -> list[bytes]:
+    """
+    Derives several keys at once, the same as calling xoring_kdf() with each list of keys.
+
+    The i-th keys of all the lists are joined into one buffer, so the whole batch takes a single XOR per position
+    instead of one per derived key. It pays off for small chunk sizes, where the cost of each call dominates.
+
+    Args:
+        key_sets (list[list[bytes]]): The keys of each derived key, every list must have the same number of keys.
+        chunk_size (int): The size of each derived key.
+
+    Returns:
+        list[bytes]: The derived keys, in the order of key_sets.
+
+    Raises:
+        ValueError: If the lists do not have the same number of keys.
+    """
 
-    for key in keys[1:]:
-        key_formatted = key_formatting.enforce_key_size(key, chunk_size)
+    keys_per_set = len(key_sets[0])
+    if any(len(keys) != keys_per_set for keys in key_sets):
+        raise ValueError("Every list must have the same number of keys.")
 
-        derived_key = bytes(a ^ b for a, b in zip(derived_key, key_formatted))
+    columns = [
+        b"".join(key_formatting.enforce_key_size(keys[i], chunk_size) for keys in key_sets)
+        for i in range(keys_per_set)
+    ]
+    derived_keys = xor_buffers(columns, len(key_sets) * chunk_size)
 
-    return derived_key
+    return [derived_keys[i:i + chunk_size] for i in range(0, len(derived_keys), chunk_size)]
@@ -1,24 +1,57 @@
 # KDFix.py
 
+import asyncio
 import json
 import logging
 import socket
 import threading
 from concurrent.futures import ThreadPoolExecutor
-
+from functools import partial
+
+from hybridization_module.hybridization_functions.batcher import HybridizationBatcher
+from hybridization_module.key_generation.kem_context_pool import KemContextPool
+from hybridization_module.key_generation.kem_keypair_pool import KemKeypairPool
+from hybridization_module.key_generation.kem_process_pool import KemProcessPool
+from hybridization_module.key_generation.kms_connection_pool import KmsConnectionPool
+from hybridization_module.key_generation.source_executor import SourceOperationExecutor
 from hybridization_module.model.config import GeneralConfiguration, PeerInfo
-from hybridization_module.model.requests import CloseRequest, GetKeyRequest, OpenConnectRequest
+from hybridization_module.model.exceptions import FramingError
+from hybridization_module.model.requests import (
+    CloseRequest,
+    GetKeyRequest,
+    GetKeysRequest,
+    OpenConnectRequest,
+)
+from hybridization_module.model.shared_enums import MessageFraming, PeerConnectorMode, ServerEngine
 from hybridization_module.model.shared_types import NetworkAddress
+from hybridization_module.peer_connector.async_connector import AsyncPeerConnectionManager
 from hybridization_module.peer_connector.connector_interface import PeerConnectionManager
+from hybridization_module.peer_connector.multiplexed_connector import (
+    MultiplexedPeerConnectionManager,
+)
 from hybridization_module.peer_connector.peer_to_peer_connector import PeerToPeerConnectionManager
 from hybridization_module.sessions.etsi004_session import Etsi004Session
+from hybridization_module.utils.framing import FrameDecoder, encode_frame
 
 log = logging.getLogger(__name__)
 
 # Initialize global variables
 class Etsi004Server():
 
-    def __init__(self, config: GeneralConfiguration, peers_info: dict[str, PeerInfo]) -> None:
+    def __init__(
+            self,
+            config: GeneralConfiguration,
+            peers_info: dict[str, PeerInfo],
+            peer_manager: PeerConnectionManager | None = None
+        ) -> None:
+        """
+        Args:
+            config (GeneralConfiguration): The configuration of the node.
+            peers_info (dict[str, PeerInfo]): The trusted peers, by uuid.
+            peer_manager (PeerConnectionManager | None): Connects the sessions with the peers, None
+                creates the one selected in peer_connector_config (a LoopbackPeerConnectionManager
+                allows to run several nodes in the same process).
+        """
         self.config: GeneralConfiguration = config
         self.peers_info: dict[str, PeerInfo] = peers_info
 
@@ -27,8 +60,32 @@ class Etsi004Server():
         self.sessions_locks: dict[str, threading.Lock] = {}
 
         ## Initialize the peer connector
-        self.peer_manager: PeerConnectionManager = PeerToPeerConnectionManager(self.config.peer_local_address, config.certificate_config)
-        self.thread_pool: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=10, thread_name_prefix="request")
+        self.peer_manager: PeerConnectionManager = peer_manager or self._create_peer_manager()
+        self.source_executor: SourceOperationExecutor = SourceOperationExecutor(config.source_executor_config)
+        self.kms_pool: KmsConnectionPool = KmsConnectionPool(config.qkd_address, config.kms_pool_config)
+        self.kem_contexts: KemContextPool = KemContextPool(config.kem_context_pool_config)
+        self.kem_processes: KemProcessPool = KemProcessPool(config.kem_process_pool_config)
+        self.kem_keypair_pool: KemKeypairPool = KemKeypairPool(config.kem_keypair_pool_config, self.kem_processes)
+        self.hybridization_batcher: HybridizationBatcher = HybridizationBatcher(config.hybridization_batcher_config)
+        self.thread_pool: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=self.config.server_config.max_workers, thread_name_prefix="request"
+        )
+
+        ## Only used by the asyncio engine
+        self._async_loop: asyncio.AbstractEventLoop = None
+        self._async_server: asyncio.Server = None
+        self._async_writers: set[asyncio.StreamWriter] = set() # Connections of the applications
+
+    def _create_peer_manager(self) -> PeerConnectionManager:
+        address = self.config.peer_local_address
+        cert_config = self.config.certificate_config
+        peer_config = self.config.peer_connector_config
+
+        if peer_config.mode == PeerConnectorMode.MULTIPLEXED:
+            return MultiplexedPeerConnectionManager(address, cert_config, peer_config)
+        if peer_config.mode == PeerConnectorMode.ASYNCIO:
+            return AsyncPeerConnectionManager(address, cert_config, peer_config)
+        return PeerToPeerConnectionManager(address, cert_config, peer_config)
 
     def _process_request(self, request: dict) -> dict:
         """
@@ -52,7 +109,18 @@ class Etsi004Server():
 
             # Determine the interface
             try:
-                session = Etsi004Session(self.config, self.peers_info, self.peer_manager, uri_params)
+                session = Etsi004Session(
+                    self.config,
+                    self.peers_info,
+                    self.peer_manager,
+                    self.source_executor,
+                    self.kms_pool,
+                    self.kem_keypair_pool,
+                    self.kem_processes,
+                    self.kem_contexts,
+                    self.hybridization_batcher if self.hybridization_batcher.enabled else None,
+                    uri_params,
+                )
                 log.info("Initializing new Etsi 004 session")
                 response = session.open_connect(oc_request)
             except Exception as e:
@@ -87,6 +155,26 @@ class Etsi004Server():
                 log.error("Exception during %s GET_KEY: %s", gk_request.key_stream_id, e)
                 return {"status": 1, "message": "Fatal error during GET_KEY."}
 
+        elif command == "GET_KEYS":
+            gks_request = GetKeysRequest.model_validate(data)
+
+            # Use the previously selected interface
+            with self.sessions_dicts_lock:
+                if gks_request.key_stream_id not in self.open_sessions:
+                    return {"status": 1, "message": "No interface selected. OPEN_CONNECT must be called first."}
+
+                session = self.open_sessions[gks_request.key_stream_id]
+                session_lock = self.sessions_locks[gks_request.key_stream_id]
+
+            log.info("Routing GET_KEYS (%s keys) to %s interface.", gks_request.count, gks_request.key_stream_id)
+            try:
+                with session_lock:
+                    return session.get_keys(gks_request)
+
+            except Exception as e:
+                log.error("Exception during %s GET_KEYS: %s", gks_request.key_stream_id, e)
+                return {"status": 1, "message": "Fatal error during GET_KEYS."}
+
         elif command == "CLOSE":
             cl_request = CloseRequest.model_validate(data)
 
@@ -107,10 +195,68 @@ class Etsi004Server():
                 log.error("Exception during %s CLOSE: %s", cl_request.key_stream_id, e)
                 return {"status": 1, "message": "Fatal error during CLOSE."}
 
+        elif command == "GET_METRICS":
+            return {"status": 0, "metrics": self.get_metrics()}
+
         else:
             return {"status": "error", "message": "Unknown command"}
 
+    def get_metrics(self) -> dict:
+        """Returns the performance metrics of the node components."""
+        return {
+            "source_executor": self.source_executor.get_metrics().model_dump(mode="json"),
+            "kms_pool": self.kms_pool.get_metrics().model_dump(mode="json"),
+            "kem_keypair_pool": self.kem_keypair_pool.get_metrics().model_dump(mode="json"),
+            "kem_context_pool": self.kem_contexts.get_metrics().model_dump(mode="json"),
+            "kem_process_pool": self.kem_processes.get_metrics().model_dump(mode="json"),
+            "hybridization_batcher": self.hybridization_batcher.get_metrics().model_dump(mode="json"),
+            "peer_connector": self.peer_manager.get_metrics().model_dump(mode="json"),
+        }
+
+    def _decode_request(self, data: bytes) -> dict | None:
+        """Decodes a raw JSON request received from an application, returns None if it is not valid."""
+        try:
+            request = json.loads(data.decode('utf-8'))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None
+
+        return request if isinstance(request, dict) else None
+
+    def _answer(self, request: dict | None) -> dict:
+        """Processes a decoded request and tags the response with the request_id (if the request had one)."""
+        if request is None:
+            return {"status" : "error", "message" : "Invalid JSON received"}
+
+        try:
+            response = self._process_request(request)
+        except ValueError as e:
+            log.error("Invalid %s request: %s", request.get("command"), e)
+            response = {"status": 1, "message": "Invalid request."}
+        except Exception as e:
+            # The application must always get a response, or a pipelined request would never be answered
+            log.error("Exception during %s request: %s", request.get("command"), e)
+            response = {"status": 1, "message": "Fatal error processing the request."}
+
+        if "request_id" in request:
+            response["request_id"] = request["request_id"]
+
+        return response
+
+    def _encode_response(self, response: dict) -> bytes:
+        return encode_frame(json.dumps(response).encode('utf-8'), self.config.server_config.framing)
+
+    def _log_response(self, response: dict, addr: NetworkAddress) -> None:
+        if "status" in response:
+            log.info("Sending response to %s. Status=%s", addr, response["status"])
+        else:
+            log.warning("Sending response without status to %s.", addr)
+
+        log.debug("Response: %s", response)
+
+    ### Threaded engine ###
+
     def _handle_connection(self, connection_socket: socket.socket, addr: NetworkAddress) -> None:
+        decoder = FrameDecoder(self.config.server_config.framing)
 
         with connection_socket:
             log.info("Connection established with AGENT at %s", addr)
@@ -120,28 +266,23 @@ class Etsi004Server():
                     log.info("Connection closed by AGENT at %s", addr)
                     break
 
-                # Handle the received data (assuming JSON requests)
                 try:
-                    request = json.loads(data.decode('utf-8'))
-                    response = self._process_request(request)
-                except json.JSONDecodeError:
-                    response = {"status" : "error", "message" : "Invalid JSON received"}
+                    frames = decoder.feed(data)
+                except FramingError as e:
+                    log.error("Closing connection with AGENT at %s: %s", addr, e)
+                    break
 
-                if "status" in response:
-                    log.info("Sending response to %s. Status=%s", addr, response["status"])
-                else:
-                    log.warning("Sending response without status to %s.", addr)
+                # Pipelined requests are answered in the same order they arrived
+                for frame in frames:
+                    response = self._answer(self._decode_request(frame))
+                    self._log_response(response, addr)
 
-                # Send the response back to the client
-                log.debug("Response: %s", response)
-                connection_socket.sendall(json.dumps(response).encode('utf-8'))
+                    # Send the response back to the client
+                    connection_socket.sendall(self._encode_response(response))
 
         log.info("Request flow with AGENT %s completed.", addr)
 
-
-    def start_server(self) -> None:
-        self.peer_manager.start_listening()
-
+    def _serve_threaded(self) -> None:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
             server_socket.bind(self.config.hybridization_server_address.to_tuple())
             server_socket.listen()
@@ -151,9 +292,142 @@ class Etsi004Server():
                 conn, addr = server_socket.accept()
                 self.thread_pool.submit(self._handle_connection, conn, NetworkAddress.from_tuple(addr))
 
+    ### Asyncio engine ###
+
+    async def _answer_async(
+        self,
+        request: dict | None,
+        addr: NetworkAddress,
+        writer: asyncio.StreamWriter,
+        stream_lock: asyncio.Lock | None = None
+    ) -> None:
+        loop = asyncio.get_running_loop()
+
+        # Only the request processing blocks (key sources, peers...), so only that leaves the loop
+        if stream_lock is None:
+            response = await loop.run_in_executor(self.thread_pool, self._answer, request)
+        else:
+            async with stream_lock:
+                response = await loop.run_in_executor(self.thread_pool, self._answer, request)
+
+        self._log_response(response, addr)
+        try:
+            writer.write(self._encode_response(response))
+            await writer.drain()
+        except ConnectionError as e:
+            log.warning("Could not send the response to AGENT at %s: %s", addr, e)
+
+    def _get_stream_lock(self, request: dict | None, stream_locks: dict[str, asyncio.Lock]) -> asyncio.Lock | None:
+        """Returns the lock that keeps the order of the requests aimed to the same key stream."""
+        data = request.get("data") if request is not None else None
+        if not isinstance(data, dict) or not isinstance(data.get("key_stream_id"), str):
+            return None
+
+        return stream_locks.setdefault(data["key_stream_id"], asyncio.Lock())
+
+    def _drop_stream_lock(
+        self, request: dict, stream_lock: asyncio.Lock, stream_locks: dict[str, asyncio.Lock], _task: asyncio.Task
+    ) -> None:
+        """Forgets the lock of a key stream once its CLOSE is answered (unless a new lock replaced it)."""
+        key_stream_id = request["data"]["key_stream_id"]
+        if stream_locks.get(key_stream_id) is stream_lock:
+            del stream_locks[key_stream_id]
+
+    async def _handle_async_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        addr = NetworkAddress.from_tuple(writer.get_extra_info("peername")[:2])
+        decoder = FrameDecoder(self.config.server_config.framing)
+        pipelining = self.config.server_config.framing != MessageFraming.NONE
+
+        pending_requests: set[asyncio.Task] = set()
+        stream_locks: dict[str, asyncio.Lock] = {}
+
+        self._async_writers.add(writer)
+        log.info("Connection established with AGENT at %s", addr)
+        try:
+            while True:
+                data = await reader.read(65057)
+                if not data:
+                    log.info("Connection closed by AGENT at %s", addr)
+                    break
+
+                for frame in decoder.feed(data):
+                    request = self._decode_request(frame)
+
+                    if not pipelining:
+                        await self._answer_async(request, addr, writer)
+                        continue
+
+                    # Requests of different key streams are processed concurrently, requests aimed to
+                    # the same key stream wait for the previous ones (asyncio locks are FIFO).
+                    stream_lock = self._get_stream_lock(request, stream_locks)
+                    task = asyncio.create_task(self._answer_async(request, addr, writer, stream_lock))
+                    pending_requests.add(task)
+                    task.add_done_callback(pending_requests.discard)
+                    if stream_lock is not None and request.get("command") == "CLOSE":
+                        task.add_done_callback(partial(self._drop_stream_lock, request, stream_lock, stream_locks))
+
+            if pending_requests:
+                await asyncio.gather(*pending_requests)
+
+        except FramingError as e:
+            log.error("Closing connection with AGENT at %s: %s", addr, e)
+        except ConnectionError as e:
+            log.warning("Connection with AGENT at %s lost: %s", addr, e)
+        finally:
+            self._async_writers.discard(writer)
+            writer.close()
+
+        log.info("Request flow with AGENT %s completed.", addr)
+
+    def _close_async_server(self) -> None:
+        """Stops accepting applications and closes their open connections (runs in the event loop).
+
+        Since Python 3.12.1 the server waits for all its connections to close when it stops serving,
+        so they are closed here instead of waiting for the applications to disconnect.
+        """
+        self._async_server.close()
+        for writer in list(self._async_writers):
+            writer.close()
+
+    async def _serve_asyncio(self) -> None:
+        self._async_loop = asyncio.get_running_loop()
+        self._async_server = await asyncio.start_server(
+            self._handle_async_connection, *self.config.hybridization_server_address.to_tuple()
+        )
+        log.info("Server listening on %s (asyncio engine)", self.config.hybridization_server_address)
+
+        async with self._async_server:
+            try:
+                await self._async_server.serve_forever()
+            except asyncio.CancelledError:
+                log.info("The asyncio server stopped serving.")
+
+    def start_server(self) -> None:
+        self.peer_manager.set_trusted_peers(
+            [peer.address for uuid, peer in self.peers_info.items() if uuid != self.config.uuid]
+        )
+        self.peer_manager.start_listening()
+        self.kem_processes.start()
+        self.kem_keypair_pool.start()
+        self.hybridization_batcher.start()
+
+        if self.config.server_config.engine == ServerEngine.ASYNCIO:
+            asyncio.run(self._serve_asyncio())
+        else:
+            self._serve_threaded()
+
 
     def shutdown(self) -> None:
 
+        if self._async_loop is not None and self._async_server is not None:
+            self._async_loop.call_soon_threadsafe(self._close_async_server)
+
         self.thread_pool.shutdown(wait=True)
+        self.source_executor.shutdown()
+        self.hybridization_batcher.stop()
+        self.kms_pool.close()
+        self.kem_keypair_pool.stop()
+        self.kem_processes.stop()
+        self.kem_contexts.close()
         self.peer_manager.stop_listening()
         log.info("Shutting down server gracefully...")
\ No newline at end of file
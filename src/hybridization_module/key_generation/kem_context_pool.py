@@ -0,0 +1,121 @@
+import ctypes
+import logging
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+import oqs
+
+from hybridization_module.model.config import KemContextPoolConfiguration
+from hybridization_module.model.metrics import KemContextPoolMetrics
+from hybridization_module.model.shared_enums import KeyExtractionAlgorithm
+
+log = logging.getLogger(__name__)
+
+
+def _context_size(kem: oqs.KeyEncapsulation) -> int:
+    """Bytes of the key buffers that a KEM context keeps."""
+    return kem.details["length_public_key"] + kem.details["length_secret_key"]
+
+
+def load_secret_key(kem: oqs.KeyEncapsulation, secret_key: bytes) -> None:
+    """Makes kem decapsulate with secret_key, as a context created with oqs.KeyEncapsulation(algorithm, secret_key)."""
+    kem.secret_key = ctypes.create_string_buffer(secret_key, kem.details["length_secret_key"])
+
+
+def _clear_secret_key(kem: oqs.KeyEncapsulation) -> None:
+    """Overwrites the secret key kept by kem with zeros."""
+    secret_key = getattr(kem, "secret_key", None)
+    if secret_key is not None:
+        ctypes.memset(secret_key, 0, ctypes.sizeof(secret_key))
+
+
+class KemContextPool:
+    """Node-wide pool of oqs.KeyEncapsulation contexts, reused by the PQC sources of every session.
+
+    A source checks out a context of its algorithm for each operation and returns it afterwards,
+    so the sessions that open and close do not allocate (and free) the key buffers of the large
+    KEMs each time. Each context is used by one thread at a time. At most max_idle_per_algorithm
+    contexts of each algorithm are kept, the rest are freed when they are returned. The secret key
+    of a returned context is zeroed, so an idle context does not keep the key of a past session.
+    """
+
+    def __init__(self, config: KemContextPoolConfiguration) -> None:
+        self.max_idle_per_algorithm: int = config.max_idle_per_algorithm
+
+        self._lock: threading.Lock = threading.Lock()
+        self._idle: dict[KeyExtractionAlgorithm, list[oqs.KeyEncapsulation]] = {}
+        self._in_use: int = 0
+
+        self._allocated: int = 0
+        self._reused: int = 0
+        self._discarded: int = 0
+        self._live_bytes: int = 0 # Key buffers of the contexts allocated and not freed
+        self._peak_bytes: int = 0
+
+    def _acquire(self, algorithm: KeyExtractionAlgorithm) -> oqs.KeyEncapsulation:
+        with self._lock:
+            idle = self._idle.get(algorithm)
+            if idle:
+                self._reused += 1
+                self._in_use += 1
+                return idle.pop()
+
+        kem = oqs.KeyEncapsulation(algorithm)
+        with self._lock:
+            self._allocated += 1
+            self._in_use += 1
+            self._live_bytes += _context_size(kem)
+            self._peak_bytes = max(self._peak_bytes, self._live_bytes)
+        return kem
+
+    def _release(self, algorithm: KeyExtractionAlgorithm, kem: oqs.KeyEncapsulation) -> None:
+        _clear_secret_key(kem)
+        with self._lock:
+            self._in_use -= 1
+            idle = self._idle.setdefault(algorithm, [])
+            if len(idle) < self.max_idle_per_algorithm:
+                idle.append(kem)
+                return
+
+            self._discarded += 1
+            self._live_bytes -= _context_size(kem)
+
+        kem.free()
+
+    @contextmanager
+    def checkout(self, algorithm: KeyExtractionAlgorithm) -> Iterator[oqs.KeyEncapsulation]:
+        """Context manager that lends a KEM context of algorithm, and returns it to the pool afterwards.
+
+        The secret key of the context is zeroed when it is returned, so the caller must generate
+        its own keypair (or load a secret key) before decapsulating with it.
+        """
+        kem = self._acquire(algorithm)
+        try:
+            yield kem
+        finally:
+            self._release(algorithm, kem)
+
+    def close(self) -> None:
+        """Frees the idle contexts."""
+        with self._lock:
+            contexts = [kem for idle in self._idle.values() for kem in idle]
+            self._idle.clear()
+            self._live_bytes -= sum(_context_size(kem) for kem in contexts)
+
+        for kem in contexts:
+            kem.free()
+        log.debug("KEM context pool closed, %s contexts freed.", len(contexts))
+
+    def get_metrics(self) -> KemContextPoolMetrics:
+        with self._lock:
+            return KemContextPoolMetrics(
+                max_idle_per_algorithm=self.max_idle_per_algorithm,
+                allocated=self._allocated,
+                reused=self._reused,
+                discarded=self._discarded,
+                in_use=self._in_use,
+                idle={algorithm: len(idle) for algorithm, idle in self._idle.items()},
+                live_bytes=self._live_bytes,
+                peak_bytes=self._peak_bytes,
+            )
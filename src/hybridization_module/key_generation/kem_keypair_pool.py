@@ -0,0 +1,146 @@
+import logging
+import threading
+from collections import deque
+
+import oqs
+
+from hybridization_module.key_generation.kem_process_pool import KemProcessPool
+from hybridization_module.model.config import KemKeypairPoolConfiguration
+from hybridization_module.model.metrics import KemKeypairPoolMetrics
+from hybridization_module.model.shared_enums import KeyExtractionAlgorithm
+
+log = logging.getLogger(__name__)
+
+KemKeypair = tuple[bytes, bytes] # Public key and secret key
+
+
+def generate_kem_keypair(algorithm: KeyExtractionAlgorithm) -> KemKeypair:
+    with oqs.KeyEncapsulation(algorithm) as kem:
+        public_key = kem.generate_keypair()
+        return public_key, kem.export_secret_key()
+
+
+class _AlgorithmPool:
+    def __init__(self) -> None:
+        self.keypairs: deque[KemKeypair] = deque()
+        self.generating: int = 0 # Keypairs being generated by the producers
+
+
+class KemKeypairPool:
+    """Node-wide pool of KEM keypairs generated in the background, one queue per algorithm.
+
+    The PQC sources take a ready keypair instead of generating it while the request waits, which
+    matters for the algorithms with slow key generation (Classic-McEliece, FrodoKEM...). The
+    producer threads keep `depth` keypairs of every algorithm that has been used (or listed in
+    the configuration). If a queue is empty, take() generates the keypair inline. With a
+    KemProcessPool, the keypairs of the algorithms it handles are generated in its processes.
+    """
+
+    def __init__(self, config: KemKeypairPoolConfiguration, kem_processes: KemProcessPool | None = None) -> None:
+        self.depth: int = config.depth
+        self.producer_threads: int = config.producer_threads
+        self.kem_processes: KemProcessPool | None = kem_processes
+
+        self._condition: threading.Condition = threading.Condition()
+        self._pools: dict[KeyExtractionAlgorithm, _AlgorithmPool] = {
+            algorithm: _AlgorithmPool() for algorithm in config.algorithms
+        }
+        self._running: bool = False
+        self._producers: list[threading.Thread] = []
+
+        self._hits: int = 0
+        self._misses: int = 0
+        self._failed: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.depth > 0
+
+    def take(self, algorithm: KeyExtractionAlgorithm) -> KemKeypair:
+        """Returns a keypair of the algorithm that has never been used before."""
+        with self._condition:
+            pool = self._pools.setdefault(algorithm, _AlgorithmPool())
+            self._condition.notify_all() # The producers refill the keypair taken (or start with a new algorithm)
+
+            if pool.keypairs:
+                self._hits += 1
+                return pool.keypairs.popleft()
+            self._misses += 1
+
+        return self._generate(algorithm)
+
+    def _generate(self, algorithm: KeyExtractionAlgorithm) -> KemKeypair:
+        if self.kem_processes is not None and self.kem_processes.handles(algorithm):
+            return self.kem_processes.generate_keypair(algorithm)
+        return generate_kem_keypair(algorithm)
+
+    def _next_algorithm(self) -> KeyExtractionAlgorithm | None:
+        """Returns the algorithm with the fewest keypairs among the ones below depth (lock must be held)."""
+        missing = {
+            algorithm: len(pool.keypairs) + pool.generating
+            for algorithm, pool in self._pools.items()
+            if len(pool.keypairs) + pool.generating < self.depth
+        }
+        return min(missing, key=missing.get) if missing else None
+
+    def _produce(self) -> None:
+        while True:
+            with self._condition:
+                algorithm = self._next_algorithm()
+                while self._running and algorithm is None:
+                    self._condition.wait()
+                    algorithm = self._next_algorithm()
+
+                if not self._running:
+                    return
+                pool = self._pools[algorithm]
+                pool.generating += 1
+
+            try:
+                keypair = self._generate(algorithm)
+            except Exception as e:
+                log.error("Failed to generate a %s keypair for the pool: %s", algorithm, e)
+                with self._condition:
+                    pool.generating -= 1
+                    self._failed += 1
+                    # Stop producing the algorithm, it will be tried again the next time it is taken
+                    self._pools.pop(algorithm, None)
+                continue
+
+            with self._condition:
+                pool.generating -= 1
+                pool.keypairs.append(keypair)
+
+    def start(self) -> None:
+        if self.depth <= 0:
+            return
+
+        with self._condition:
+            self._running = True
+
+        self._producers = [
+            threading.Thread(target=self._produce, name=f"kem_keypair_{i}")
+            for i in range(self.producer_threads)
+        ]
+        for producer in self._producers:
+            producer.start()
+        log.debug("KEM keypair pool started with %s producers.", self.producer_threads)
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+
+        for producer in self._producers:
+            producer.join()
+        self._producers = []
+
+    def get_metrics(self) -> KemKeypairPoolMetrics:
+        with self._condition:
+            return KemKeypairPoolMetrics(
+                depth=self.depth,
+                hits=self._hits,
+                misses=self._misses,
+                failed=self._failed,
+                ready={algorithm: len(pool.keypairs) for algorithm, pool in self._pools.items()},
+            )
@@ -0,0 +1,182 @@
+import logging
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import oqs
+
+from hybridization_module.model.config import KemProcessPoolConfiguration
+from hybridization_module.model.exceptions import PqcError
+from hybridization_module.model.metrics import KemProcessPoolMetrics
+from hybridization_module.model.shared_enums import KeyExtractionAlgorithm
+
+log = logging.getLogger(__name__)
+
+
+## Functions run inside the worker processes
+
+_worker_kems: dict[KeyExtractionAlgorithm, oqs.KeyEncapsulation] = {} # KEM objects of each worker, per algorithm
+
+
+def _get_worker_kem(algorithm: KeyExtractionAlgorithm) -> oqs.KeyEncapsulation:
+    kem = _worker_kems.get(algorithm)
+    if kem is None:
+        kem = _worker_kems[algorithm] = oqs.KeyEncapsulation(algorithm)
+    return kem
+
+
+def _init_worker(algorithms: list[KeyExtractionAlgorithm]) -> None:
+    for algorithm in algorithms:
+        _get_worker_kem(algorithm)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _generate_keypair(algorithm: KeyExtractionAlgorithm) -> tuple[bytes, bytes]:
+    kem = _get_worker_kem(algorithm)
+    public_key = kem.generate_keypair()
+    return public_key, kem.export_secret_key()
+
+
+def _encap_secret(algorithm: KeyExtractionAlgorithm, public_key: bytes) -> tuple[bytes, bytes]:
+    return _get_worker_kem(algorithm).encap_secret(public_key)
+
+
+def _decap_secret(algorithm: KeyExtractionAlgorithm, secret_key: bytes, ciphertext: bytes) -> bytes:
+    with oqs.KeyEncapsulation(algorithm, secret_key) as kem:
+        return kem.decap_secret(ciphertext)
+
+
+class KemProcessPool:
+    """Node-wide pool of processes that run the KEM operations (keygen, encaps and decaps) of the PQC sources.
+
+    The operations of the large KEMs (Classic-McEliece, FrodoKEM, HQC...) are CPU-bound, so running
+    them in processes lets the node use every core. Each worker keeps its own KEM object per
+    algorithm, and only keys, ciphertexts and shared secrets are sent between the processes. The
+    callers block until their operation finishes, as with the inline operations.
+    """
+
+    def __init__(self, config: KemProcessPoolConfiguration) -> None:
+        self.enabled: bool = config.enabled
+        self.workers: int = config.workers or os.cpu_count() or 1
+        self.algorithms: list[KeyExtractionAlgorithm] = list(config.algorithms)
+
+        self._lock: threading.Lock = threading.Lock()
+        self._executor: ProcessPoolExecutor = None
+
+        self._pending: int = 0
+        self._completed: int = 0
+        self._failed: int = 0
+        self._restarts: int = 0
+
+    def handles(self, algorithm: KeyExtractionAlgorithm) -> bool:
+        """Whether the operations of algorithm run in the pool (if not, the caller runs them inline)."""
+        return self._executor is not None and (not self.algorithms or algorithm in self.algorithms)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # The processes are spawned, forking a process with running threads is not safe
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.algorithms,),
+        )
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+
+        self._executor = self._new_executor()
+
+        # Start every worker now, instead of making the first requests wait for them
+        pids = {future.result() for future in [self._executor.submit(_ping) for _ in range(self.workers)]}
+        log.debug("KEM process pool started with %s workers.", len(pids))
+
+    def stop(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _replace_broken_executor(self, broken: ProcessPoolExecutor) -> None:
+        """Replaces the executor after one of its workers died, since a broken executor rejects every operation."""
+        with self._lock:
+            if self._executor is not broken:
+                return # Already replaced by another caller, or the pool was stopped
+            self._executor = self._new_executor()
+            self._restarts += 1
+
+        broken.shutdown(wait=False, cancel_futures=True)
+        log.warning("KEM process pool restarted after a worker died.")
+
+    def _run_all(self, operation: Callable[..., object], calls: list[tuple]) -> list:
+        """Runs operation(*args) in the workers for each args of calls, and waits for all the results.
+
+        Raises:
+            PqcError: If any operation fails or the pool is not running.
+        """
+        with self._lock:
+            executor = self._executor
+            self._pending += len(calls)
+
+        try:
+            futures: list[Future] = [executor.submit(operation, *args) for args in calls]
+            results = [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            with self._lock:
+                self._failed += 1
+            log.error("A worker of the KEM process pool died: %s", e)
+            self._replace_broken_executor(executor)
+            raise PqcError("The KEM process pool is broken") from e
+        except Exception as e:
+            with self._lock:
+                self._failed += 1
+            raise PqcError(f"KEM operation failed in the process pool: {e}") from e
+        finally:
+            with self._lock:
+                self._pending -= len(calls)
+
+        with self._lock:
+            self._completed += len(calls)
+        return results
+
+    def generate_keypair(self, algorithm: KeyExtractionAlgorithm) -> tuple[bytes, bytes]:
+        """Returns a new public key and secret key of algorithm."""
+        return self._run_all(_generate_keypair, [(algorithm,)])[0]
+
+    def generate_keypairs(self, algorithm: KeyExtractionAlgorithm, count: int) -> list[tuple[bytes, bytes]]:
+        """Returns count new keypairs of algorithm, generated in parallel."""
+        return self._run_all(_generate_keypair, [(algorithm,)] * count)
+
+    def encap_secret(self, algorithm: KeyExtractionAlgorithm, public_key: bytes) -> tuple[bytes, bytes]:
+        """Returns the ciphertext and the shared secret encapsulated with public_key."""
+        return self._run_all(_encap_secret, [(algorithm, public_key)])[0]
+
+    def encap_secrets(self, algorithm: KeyExtractionAlgorithm, public_keys: list[bytes]) -> list[tuple[bytes, bytes]]:
+        """Returns the ciphertext and the shared secret of each public key, encapsulated in parallel."""
+        return self._run_all(_encap_secret, [(algorithm, public_key) for public_key in public_keys])
+
+    def decap_secret(self, algorithm: KeyExtractionAlgorithm, secret_key: bytes, ciphertext: bytes) -> bytes:
+        """Returns the shared secret of ciphertext."""
+        return self._run_all(_decap_secret, [(algorithm, secret_key, ciphertext)])[0]
+
+    def decap_secrets(self, algorithm: KeyExtractionAlgorithm, pairs: list[tuple[bytes, bytes]]) -> list[bytes]:
+        """Returns the shared secret of each (secret key, ciphertext) pair, decapsulated in parallel."""
+        return self._run_all(_decap_secret, [(algorithm, *pair) for pair in pairs])
+
+    def get_metrics(self) -> KemProcessPoolMetrics:
+        with self._lock:
+            return KemProcessPoolMetrics(
+                enabled=self._executor is not None,
+                workers=self.workers,
+                pending=self._pending,
+                completed=self._completed,
+                failed=self._failed,
+                restarts=self._restarts,
+            )
@@ -1,8 +1,5 @@
 import hashlib
 import logging
-import random
-
-from hybridization_module.utils.key_formatting import key_to_bytes
 
 log = logging.getLogger(__name__)
 
@@ -29,32 +26,33 @@ def generate_deterministic_aux_key(seed: str, key_length: int) -> list:
 
 
 class MockQKDStack:
+    """In-process stand-in of the KMS. As in the KmsEmulator, each key only depends on the key_stream_id
+    and the index, so the QKD sources of both nodes get the same keys without any KMS."""
+
     def __init__(self) -> None:
         self.mock_key_store = {}
 
-    def open_connect(self, chunk_size: int) -> str:
+    def open_connect(self, key_stream_id: str, chunk_size: int) -> str:
         """
         Mocks the OPEN_CONNECT request to the QKD node.
-        Returns a mock key_stream_id.
+        Returns the key_stream_id proposed by the caller (the hybrid ksid, shared by both nodes).
         """
-        key_stream_id = f"{random.randint(1000, 9999)}-mock"
-        print(f"Connection opened with key_stream_id: {key_stream_id}")
         self.mock_key_store[key_stream_id] = {"chunk_size": chunk_size}
 
         log.info("Open connect mocked: key_stream_id=%s", key_stream_id)
         return key_stream_id
 
-    def get_key(self, key_stream_id: str) -> bytes:
+    def get_key(self, key_stream_id: str, index: int) -> bytes:
         """
-        Mocks the GET_KEY request to the QKD node and returns a simulated key.
+        Mocks the GET_KEY request to the QKD node and returns the simulated key in index of the key stream.
         """
         if key_stream_id not in self.mock_key_store:
             raise Exception("Invalid key_stream_id")
-        print(f"Sending GET_KEY request for key_stream_id: {key_stream_id}")
+
         chunk_size = self.mock_key_store[key_stream_id]["chunk_size"]
-        simulated_key = [random.randint(0, 255) for _ in range(chunk_size)]
-        log.info("Key buffer mocked: %s", simulated_key)
-        return key_to_bytes(simulated_key)
+        simulated_key = hashlib.shake_256(f"{key_stream_id}|{index}".encode()).digest(chunk_size)
+        log.debug("Key %s of %s mocked.", index, key_stream_id)
+        return simulated_key
 
     def close_connection(self, key_stream_id: str) -> None:
         """
@@ -63,4 +61,4 @@ class MockQKDStack:
         if key_stream_id in self.mock_key_store:
             del self.mock_key_store[key_stream_id]
         else:
-            raise Exception("Invalid key_stream_id")
\ No newline at end of file
+            raise Exception("Invalid key_stream_id")
@@ -0,0 +1,79 @@
+import hashlib
+import hmac
+import time
+
+from Crypto.Hash import KMAC128, KMAC256
+
+from hybridization_module.model.shared_enums import KeyExpansionFunction
+
+EXPANSION_LABEL = b"kdfix-pqc-key-expansion"
+COUNTER_SIZE = 8 # Bytes of the (big endian) counter of each derived key
+
+
+def hkdf_extract(salt: bytes, secret: bytes) -> bytes:
+    return hmac.digest(salt, secret, hashlib.sha256)
+
+
+def hkdf_expand(prk: bytes, info: bytes, length: int) -> bytes:
+    """HKDF-Expand with SHA-256 (RFC 5869), the blocks are written into a preallocated buffer.
+
+    Raises:
+        ValueError: If length is over 255 blocks (8160 bytes), the limit of HKDF.
+    """
+    block_size = hashlib.sha256().digest_size
+    block_count = (length + block_size - 1) // block_size
+    if block_count > 255:
+        raise ValueError(f"HKDF-SHA256 cannot expand more than {255 * block_size} bytes.")
+
+    output = bytearray(block_count * block_size)
+    block = b""
+    for i in range(block_count):
+        block = hmac.digest(prk, block + info + bytes([i + 1]), hashlib.sha256)
+        output[i * block_size:(i + 1) * block_size] = block
+    return bytes(memoryview(output)[:length])
+
+
+class CounterKeyExpander:
+    """Derives a sequence of keys from one shared secret, each one with the next value of a counter.
+
+    Both peers derive the same sequence from the same secret and context, so a single KEM exchange
+    can provide several keys. The keys are independent of each other: knowing some of them does not
+    reveal the secret nor the rest.
+    """
+
+    def __init__(self, function: KeyExpansionFunction, secret: bytes, context: bytes, length: int) -> None:
+        """
+        Args:
+            function (KeyExpansionFunction): The construction that derives each key.
+            secret (bytes): The shared secret of the KEM exchange.
+            context (bytes): Binds the keys to the session (both peers must use the same one).
+            length (int): Bytes of each derived key.
+        """
+        self.function: KeyExpansionFunction = function
+        self.length: int = length
+        self.context: bytes = context
+        self.counter: int = 0 # Keys derived so far
+        self.created: float = time.monotonic()
+
+        if function == KeyExpansionFunction.HKDF:
+            self._key: bytes = hkdf_extract(EXPANSION_LABEL + context, secret)
+        elif function == KeyExpansionFunction.KMAC:
+            self._key = secret
+        else:
+            raise ValueError(f"Unsupported key expansion function: {function}")
+
+    def age(self) -> float:
+        """Seconds since the secret was obtained."""
+        return time.monotonic() - self.created
+
+    def next_key(self) -> bytes:
+        counter = self.counter.to_bytes(COUNTER_SIZE, "big")
+        self.counter += 1
+
+        if self.function == KeyExpansionFunction.HKDF:
+            return hkdf_expand(self._key, EXPANSION_LABEL + counter, self.length)
+
+        # KMAC256 needs a 256 bit key, the KEMs with 128 bit secrets (FrodoKEM-640...) use KMAC128
+        kmac_class = KMAC256 if len(self._key) >= 32 else KMAC128
+        kmac = kmac_class.new(key=self._key, mac_len=self.length, custom=EXPANSION_LABEL + self.context)
+        return kmac.update(counter).digest()
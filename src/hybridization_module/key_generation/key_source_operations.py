@@ -0,0 +1,62 @@
+import logging
+
+from hybridization_module.key_generation.key_source_interface import KeySource
+from hybridization_module.model.requests import OpenConnectQos
+from hybridization_module.utils.deadline import Deadline
+
+log = logging.getLogger(__name__)
+
+def handle_open_connect(source: KeySource, hybrid_ksid: str, qos: OpenConnectQos, deadline: Deadline) -> bool:
+
+    source_id = source.get_id()
+    try:
+        log.info("Attempting to OPEN CONNECTION with %s...", source_id)
+        source.open_connect(hybrid_ksid, qos, timeout=deadline.check_remaining())
+        log.info("OPEN CONNECT succesful at %s.", source_id)
+        return True
+
+    except Exception as e:
+        log.error("Failed OPEN CONNECT in %s: %s", source_id, e)
+        raise
+
+def handle_get_key(source: KeySource, deadline: Deadline) -> bytes:
+
+    source_id = source.get_id()
+    try:
+        log.info("Attempting to GET KEY from the %s source...", source_id)
+        result = source.get_key(timeout=deadline.check_remaining())
+        log.info("Obtained key from %s source.", source_id)
+        return result
+
+    except Exception as e:
+        log.error("Failed GET KEY from %s: %s", source_id, e)
+        raise
+
+def handle_get_keys(source: KeySource, count: int, deadline: Deadline) -> list[bytes]:
+
+    source_id = source.get_id()
+    keys: list[bytes] = []
+    try:
+        log.info("Attempting to GET %s KEYS from the %s source...", count, source_id)
+        for _ in range(count):
+            keys.append(source.get_key(timeout=deadline.check_remaining()))
+        log.info("Obtained %s keys from %s source.", count, source_id)
+
+    except Exception as e:
+        log.error("Failed GET KEYS from %s after %s keys: %s", source_id, len(keys), e)
+        if not keys:
+            raise
+
+    # The keys obtained before a failure are still valid
+    return keys
+
+def handle_close(source: KeySource) -> None:
+
+    source_id = source.get_id()
+    try:
+        log.info("Attempting to CLOSE the %s source...", source_id)
+        source.close()
+        log.info("Source %s closed.", source_id)
+    except Exception as e:
+        log.error("Failed CLOSE from %s: %s", source_id, e)
+        raise
@@ -0,0 +1,245 @@
+import json
+import logging
+import select
+import socket
+import threading
+import time
+
+from hybridization_module.model.config import KmsConnectionPoolConfiguration
+from hybridization_module.model.exceptions import QkdError
+from hybridization_module.model.metrics import KmsConnectionPoolMetrics
+from hybridization_module.model.shared_types import NetworkAddress
+
+log = logging.getLogger(__name__)
+
+RECEIVE_CHUNK_SIZE = 64 * 1024
+MAX_RESPONSE_SIZE = 16 * 1024 * 1024
+
+
+class _KmsConnection:
+    """A TCP connection to the KMS that reads complete JSON messages, whatever their size."""
+
+    def __init__(self, address: NetworkAddress, timeout: float | None) -> None:
+        self.sock: socket.socket = socket.create_connection(address.to_tuple(), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.last_used: float = time.monotonic()
+        self.requests: int = 0 # Requests answered through this connection
+
+        self._buffer: str = ""
+        self._decoder: json.JSONDecoder = json.JSONDecoder()
+
+    def is_healthy(self) -> bool:
+        """Checks, without blocking, that the KMS has not closed the idle connection.
+
+        An idle connection should have nothing to read, so if it is readable the KMS either closed
+        it (EOF) or sent something unexpected. Either way, the connection cannot be reused.
+        """
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+
+        return not readable and not self._buffer
+
+    def _next_message(self) -> dict | None:
+        text = self._buffer.lstrip()
+        if not text:
+            return None
+
+        try:
+            message, end = self._decoder.raw_decode(text)
+        except json.JSONDecodeError:
+            return None # Incomplete message, more data is needed
+
+        self._buffer = text[end:]
+        return message
+
+    def request(self, message: dict, timeout: float | None) -> dict:
+        """Sends a JSON message and waits for the JSON response.
+
+        The response is read in chunks until a complete JSON value has been received, so large
+        responses are never truncated.
+
+        Raises:
+            ConnectionError: If the KMS closed the connection before the whole response arrived.
+            QkdError: If the response exceeds MAX_RESPONSE_SIZE.
+        """
+        self.sock.settimeout(timeout)
+        self.sock.sendall(json.dumps(message).encode("utf8"))
+
+        received = b""
+        response = None
+        while response is None:
+            data = self.sock.recv(RECEIVE_CHUNK_SIZE)
+            if not data:
+                raise ConnectionError("The KMS closed the connection before sending a complete response.")
+
+            received += data
+            if len(received) > MAX_RESPONSE_SIZE:
+                raise QkdError(f"The KMS response exceeded {MAX_RESPONSE_SIZE} bytes.")
+
+            # Only try to decode once a JSON object could have finished
+            if b"}" in data:
+                try:
+                    self._buffer += received.decode("utf8")
+                except UnicodeDecodeError:
+                    continue # A multibyte character was split between chunks
+                received = b""
+                response = self._next_message()
+
+        self.requests += 1
+        self.last_used = time.monotonic()
+        return response
+
+    def close(self) -> None:
+        try:
+            self.sock.close()
+        except OSError as e:
+            log.debug("Error closing a KMS connection: %s", e)
+
+
+class KmsConnectionPool:
+    """Node-wide pool of keep-alive connections to the KMS, shared by every QKDSource.
+
+    Each request borrows an idle connection (or opens a new one if the pool is not full), sends
+    the JSON message, reads the JSON response and gives the connection back. Idle connections are
+    health-checked before being reused and closed once they have been idle for too long.
+
+    If the KMS closes the connections after each response, the pool notices it on the next
+    request and opens a new connection, so it behaves as the previous one-connection-per-request
+    approach.
+    """
+
+    def __init__(self, address: NetworkAddress, config: KmsConnectionPoolConfiguration) -> None:
+        self.address: NetworkAddress = address
+        self.max_connections: int = config.max_connections
+        self.idle_timeout: float = config.idle_timeout
+        self.request_timeout: float = config.request_timeout
+
+        self._condition: threading.Condition = threading.Condition()
+        self._idle: list[_KmsConnection] = [] # The most recently used connection is the last one
+        self._in_use: int = 0
+        self._closed: bool = False
+
+        self._created: int = 0
+        self._reused: int = 0
+        self._discarded: int = 0
+
+    def _evict_idle(self) -> None:
+        """Closes the connections that have been idle for longer than idle_timeout (lock must be held)."""
+        now = time.monotonic()
+        while self._idle and now - self._idle[0].last_used > self.idle_timeout:
+            self._idle.pop(0).close()
+            self._discarded += 1
+
+    def _acquire(self, timeout: float) -> tuple[_KmsConnection | None, bool]:
+        """Takes a healthy idle connection, or reserves a slot to open a new one.
+
+        Returns:
+            tuple[_KmsConnection | None, bool]: The connection (None if a new one has to be opened)
+            and whether it is a reused connection.
+        """
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise QkdError("The KMS connection pool is closed.")
+
+                self._evict_idle()
+
+                while self._idle:
+                    connection = self._idle.pop()
+                    if connection.is_healthy():
+                        self._in_use += 1
+                        self._reused += 1
+                        return connection, True
+
+                    log.debug("Discarding a KMS connection closed by the KMS.")
+                    connection.close()
+                    self._discarded += 1
+
+                if self._in_use < self.max_connections:
+                    self._in_use += 1
+                    return None, False
+
+                if not self._condition.wait(timeout):
+                    raise QkdError(f"No KMS connection was available after {timeout} seconds.")
+
+    def _release(self, connection: _KmsConnection | None, reusable: bool) -> None:
+        with self._condition:
+            self._in_use -= 1
+            if connection is not None:
+                if reusable and not self._closed:
+                    self._idle.append(connection)
+                else:
+                    connection.close()
+                    self._discarded += 1
+            self._condition.notify()
+
+    def request(self, message: dict, timeout: float | None = None) -> dict:
+        """Sends a JSON message to the KMS and returns its JSON response.
+
+        Args:
+            message (dict): The ETSI 004 request.
+            timeout (float | None): Maximum seconds for the request, None uses request_timeout.
+
+        Returns:
+            dict: The decoded response of the KMS.
+
+        Raises:
+            QkdError: If no connection could be obtained or the response is invalid.
+            OSError: If the connection with the KMS fails.
+        """
+        if timeout is None:
+            timeout = self.request_timeout
+
+        connection, reused = self._acquire(timeout)
+        try:
+            if connection is None:
+                connection = _KmsConnection(self.address, timeout)
+                with self._condition:
+                    self._created += 1
+
+            try:
+                response = connection.request(message, timeout)
+            except ConnectionError:
+                if not reused:
+                    raise
+
+                # The KMS closed the idle connection while the request was being sent, retry once
+                log.debug("Reused KMS connection was closed by the KMS, retrying with a new one.")
+                connection.close()
+                connection = None
+                with self._condition:
+                    self._discarded += 1
+
+                connection = _KmsConnection(self.address, timeout)
+                with self._condition:
+                    self._created += 1
+                response = connection.request(message, timeout)
+
+        except BaseException:
+            self._release(connection, reusable=False)
+            raise
+
+        self._release(connection, reusable=True)
+        return response
+
+    def get_metrics(self) -> KmsConnectionPoolMetrics:
+        with self._condition:
+            return KmsConnectionPoolMetrics(
+                max_connections=self.max_connections,
+                idle=len(self._idle),
+                in_use=self._in_use,
+                created=self._created,
+                reused=self._reused,
+                discarded=self._discarded,
+            )
+
+    def close(self) -> None:
+        """Closes every idle connection, the ones in use are closed when they are released."""
+        with self._condition:
+            self._closed = True
+            for connection in self._idle:
+                connection.close()
+            self._idle.clear()
+            self._condition.notify_all()
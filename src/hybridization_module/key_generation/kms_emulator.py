@@ -0,0 +1,287 @@
+"""Stand-in for a QKD KMS that speaks the ETSI 004 JSON protocol used by QKDSource.
+
+It allows to run full two-node benchmarks on a single machine without QKD hardware:
+
+    python -m hybridization_module.key_generation.kms_emulator --port 25575 --key-rate-bps 100000
+
+The keys are derived from the seed, the key_stream_id and the index of the key, so two emulators
+started with the same seed (one per node) give the same key to both ends of a key stream.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from hybridization_module.model.config import KmsEmulatorConfiguration
+from hybridization_module.model.shared_enums import LatencyDistribution
+from hybridization_module.model.shared_types import NetworkAddress
+
+log = logging.getLogger(__name__)
+
+RECEIVE_CHUNK_SIZE = 64 * 1024
+MAX_TRACKED_KEYS = 4096 # Keys per stream whose generation time is remembered
+KSID_NAMESPACE = uuid.UUID("6f1c1b54-3c1e-4c4e-9a57-2b5a4b0f8e11")
+
+
+class _KeyStream:
+    def __init__(self, key_size: int) -> None:
+        self.key_size: int = key_size
+        self.open_count: int = 0 # Applications (usually one per node) that opened the stream
+        self.ready_at: dict[int, float] = {} # When each reserved key is generated by the link
+
+
+class KmsEmulator:
+    """Multi-threaded ETSI 004 server that emulates the KMS of a QKD link.
+
+    - OPEN_CONNECT uses the key_stream_id of the request, or derives one from the source and the
+      destination so that both ends of the link get the same one.
+    - GET_KEY returns the key in the requested index. The link generates key_rate_bps bits per
+      second shared by every key stream, a key is reserved the first time any end asks for it and
+      the request waits until it has been generated.
+    - Every response is delayed by a latency sampled from the configured distribution, and
+      answered with one of the error_codes with probability error_rate.
+    """
+
+    def __init__(self, config: KmsEmulatorConfiguration, max_workers: int = 64) -> None:
+        self.config: KmsEmulatorConfiguration = config
+        self._random: random.Random = random.Random()
+
+        self._lock: threading.Lock = threading.Lock()
+        self._key_streams: dict[str, _KeyStream] = {}
+        self._link_free_at: float = time.monotonic() # When the link finishes the keys already reserved
+
+        self._thread_pool: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kms")
+        self._server_socket: socket.socket = None
+        self._connections: set[socket.socket] = set()
+        self._running: bool = False
+
+    ### Emulation ###
+
+    def _sample_latency(self) -> float:
+        mean = self.config.latency_ms / 1000
+        jitter = self.config.latency_jitter_ms / 1000
+        distribution = self.config.latency_distribution
+
+        if distribution == LatencyDistribution.UNIFORM:
+            latency = self._random.uniform(mean - jitter, mean + jitter)
+        elif distribution == LatencyDistribution.NORMAL:
+            latency = self._random.gauss(mean, jitter)
+        elif distribution == LatencyDistribution.EXPONENTIAL:
+            latency = self._random.expovariate(1 / mean) if mean > 0 else 0
+        else:
+            latency = mean
+
+        return max(0.0, latency)
+
+    def _injected_error(self) -> dict | None:
+        if self.config.error_rate > 0 and self._random.random() < self.config.error_rate:
+            status = self._random.choice(self.config.error_codes)
+            return {"status": status, "message": f"Injected error {status}"}
+        return None
+
+    def derive_key(self, key_stream_id: str, index: int, key_size: int) -> bytes:
+        """Returns the key in index of the key stream, it only depends on the seed and the arguments."""
+        key_material = f"{self.config.seed}|{key_stream_id}|{index}".encode()
+        return hashlib.shake_256(key_material).digest(key_size)
+
+    def _reserve_key(self, key_stream: _KeyStream, index: int) -> float:
+        """Returns when the key in index is available, reserving link time for it if it is new (lock must be held)."""
+        if index in key_stream.ready_at:
+            return key_stream.ready_at[index]
+
+        if len(key_stream.ready_at) >= MAX_TRACKED_KEYS:
+            # Forget the oldest half, asking for them again only costs link time again
+            for old_index in sorted(key_stream.ready_at)[:MAX_TRACKED_KEYS // 2]:
+                del key_stream.ready_at[old_index]
+
+        ready_at = time.monotonic()
+        if self.config.key_rate_bps > 0:
+            ready_at = max(ready_at, self._link_free_at) + key_stream.key_size * 8 / self.config.key_rate_bps
+            self._link_free_at = ready_at
+
+        key_stream.ready_at[index] = ready_at
+        return ready_at
+
+    ### Commands ###
+
+    def _open_connect(self, data: dict) -> dict:
+        key_stream_id = data.get("key_stream_id") or str(
+            uuid.uuid5(KSID_NAMESPACE, f"{self.config.seed}|{data['source']}|{data['destination']}")
+        )
+        key_size = self.config.key_size or data["qos"]["key_chunk_size"]
+
+        with self._lock:
+            key_stream = self._key_streams.setdefault(key_stream_id, _KeyStream(key_size))
+            key_stream.open_count += 1
+
+        log.info("OPEN_CONNECT of %s (%s bytes per key).", key_stream_id, key_size)
+        return {"status": 0, "key_stream_id": key_stream_id, "qos": data.get("qos")}
+
+    def _get_key(self, data: dict) -> dict:
+        key_stream_id = data["key_stream_id"]
+        index = data.get("index", 0)
+
+        with self._lock:
+            key_stream = self._key_streams.get(key_stream_id)
+            if key_stream is None:
+                return {"status": 3, "message": f"The key stream {key_stream_id} is not open."}
+            ready_at = self._reserve_key(key_stream, index)
+
+        # Wait until the link has generated the key
+        delay = ready_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        key = self.derive_key(key_stream_id, index, key_stream.key_size)
+        return {"status": 0, "index": index, "key_buffer": list(key), "metadata": data.get("metadata")}
+
+    def _close(self, data: dict) -> dict:
+        key_stream_id = data["key_stream_id"]
+
+        with self._lock:
+            key_stream = self._key_streams.get(key_stream_id)
+            if key_stream is None:
+                return {"status": 1, "message": f"The key stream {key_stream_id} is not open."}
+
+            key_stream.open_count -= 1
+            if key_stream.open_count <= 0:
+                del self._key_streams[key_stream_id]
+
+        log.info("CLOSE of %s.", key_stream_id)
+        return {"status": 0}
+
+    def handle_request(self, request: dict) -> dict:
+        """Answers one ETSI 004 request (with the configured latency and error injection)."""
+        time.sleep(self._sample_latency())
+
+        injected_error = self._injected_error()
+        if injected_error is not None:
+            log.debug("Injecting status %s in %s.", injected_error["status"], request.get("command"))
+            return injected_error
+
+        command = request.get("command")
+        data = request.get("data", {})
+        try:
+            if command == "OPEN_CONNECT":
+                return self._open_connect(data)
+            elif command == "GET_KEY":
+                return self._get_key(data)
+            elif command == "CLOSE":
+                return self._close(data)
+            else:
+                return {"status": "error", "message": "Unknown command"}
+        except (KeyError, TypeError, ValueError) as e:
+            log.error("Invalid %s request: %s", command, e)
+            return {"status": "error", "message": f"Invalid request: {e}"}
+
+    ### Server ###
+
+    def _handle_connection(self, connection: socket.socket, addr: tuple[str, int]) -> None:
+        """Answers every request of a keep-alive connection until the client closes it."""
+        decoder = json.JSONDecoder()
+        buffer = ""
+
+        with self._lock:
+            self._connections.add(connection)
+
+        try:
+            while self._running:
+                data = connection.recv(RECEIVE_CHUNK_SIZE)
+                if not data:
+                    break
+
+                buffer += data.decode("utf8")
+                while buffer.strip():
+                    try:
+                        request, end = decoder.raw_decode(buffer.lstrip())
+                    except json.JSONDecodeError:
+                        break # Incomplete request
+
+                    buffer = buffer.lstrip()[end:]
+                    response = self.handle_request(request)
+                    connection.sendall(json.dumps(response).encode("utf8"))
+        except OSError as e:
+            log.debug("Connection with %s failed: %s", addr, e)
+        finally:
+            with self._lock:
+                self._connections.discard(connection)
+            connection.close()
+
+        log.debug("Connection with %s closed.", addr)
+
+    def serve_forever(self) -> None:
+        address = self.config.address
+        self._server_socket = socket.create_server(address.to_tuple())
+        self._running = True
+        log.info("KMS emulator listening at %s", address)
+
+        while self._running:
+            try:
+                connection, addr = self._server_socket.accept()
+            except OSError:
+                break
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._thread_pool.submit(self._handle_connection, connection, addr)
+
+        self._thread_pool.shutdown(wait=False)
+
+    def shutdown(self) -> None:
+        self._running = False
+        if self._server_socket is not None:
+            self._server_socket.close()
+
+        # Wake up the workers waiting for requests in keep-alive connections
+        with self._lock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ETSI 004 KMS emulator for QKD sources.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=25575)
+    parser.add_argument("--seed", default="kms-emulator", help="Emulators of the same link need the same seed.")
+    parser.add_argument("--key-size", type=int, default=None, help="Bytes per key (default: key_chunk_size of the QoS).")
+    parser.add_argument("--key-rate-bps", type=float, default=0, help="Key bits generated per second (0 is unlimited).")
+    parser.add_argument("--latency-distribution", default=LatencyDistribution.CONSTANT,
+                        choices=[distribution.value for distribution in LatencyDistribution])
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="Probability of answering with an error.")
+    parser.add_argument("--error-codes", type=int, nargs="+", default=[2], help="Status codes of the injected errors.")
+    parser.add_argument("--max-workers", type=int, default=64, help="Connections served at the same time.")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(levelname)s] [%(threadName)s]: %(message)s")
+
+    config = KmsEmulatorConfiguration(
+        address=NetworkAddress(host=args.host, port=args.port),
+        seed=args.seed,
+        key_size=args.key_size,
+        key_rate_bps=args.key_rate_bps,
+        latency_distribution=args.latency_distribution,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        error_codes=args.error_codes,
+    )
+
+    emulator = KmsEmulator(config, args.max_workers)
+    try:
+        emulator.serve_forever()
+    except KeyboardInterrupt:
+        emulator.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import logging
+import threading
+from collections import defaultdict, deque
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from hybridization_module.key_generation.key_source_interface import KeySource
+from hybridization_module.model.config import SourceExecutorConfiguration
+from hybridization_module.model.metrics import SourceExecutorMetrics
+from hybridization_module.model.shared_enums import KeyType
+
+log = logging.getLogger(__name__)
+
+
+class _SourceOperation:
+    def __init__(self, future: Future, operation: Callable[..., object], args: tuple) -> None:
+        self.future: Future = future
+        self.operation: Callable[..., object] = operation
+        self.args: tuple = args
+
+
+class SourceOperationExecutor:
+    """Node-wide pool of workers that runs the operations (open_connect, get_key, close...) of the key sources.
+
+    Every session shares the same workers, so there is no thread creation per operation. Besides the
+    size of the pool, the number of operations running at the same time can be capped per key type. The
+    operations over the cap wait in a queue without taking a worker.
+
+    The operations of the sources that wait for the peer (PQC) run in a second pool of max_peer_workers
+    threads, which are only created when no idle one is left, and they are not capped. Otherwise both
+    nodes could fill their workers with operations that wait for each other, and none would finish.
+    """
+
+    def __init__(self, config: SourceExecutorConfiguration) -> None:
+        self.max_workers: int = config.max_workers
+        self._concurrency_caps: dict[KeyType, int] = dict(config.max_concurrency_per_key_type)
+        self.max_peer_workers: int = config.max_peer_workers
+        self._pool: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=config.max_workers, thread_name_prefix="source")
+        self._peer_pool: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=config.max_peer_workers, thread_name_prefix="source-peer"
+        )
+
+        self._lock: threading.Lock = threading.Lock()
+        self._capped_operations: dict[KeyType, deque[_SourceOperation]] = defaultdict(deque)
+        self._dispatched: dict[KeyType, int] = defaultdict(int) # Given to the pool, either running or waiting a worker
+        self._running: dict[KeyType, int] = defaultdict(int)
+
+        self._completed: int = 0
+        self._failed: int = 0
+        self._peak_queued: int = 0
+
+    def _queued(self) -> int:
+        waiting_cap = sum(len(operations) for operations in self._capped_operations.values())
+        waiting_worker = sum(self._dispatched.values()) - sum(self._running.values())
+        return waiting_cap + waiting_worker
+
+    def submit(self, source: KeySource, operation: Callable[..., object], *args: object) -> Future:
+        """Schedules operation(*args), an operation over source.
+
+        Args:
+            source (KeySource): The source the operation works with (used for the concurrency caps).
+            operation (Callable): The function to run.
+            *args: The arguments of the function.
+
+        Returns:
+            Future: Future that will contain the result (or the exception) of the operation.
+        """
+        key_type = source.get_key_type()
+        source_operation = _SourceOperation(Future(), operation, args)
+
+        if source.waits_for_peer():
+            with self._lock:
+                self._dispatched[key_type] += 1
+                self._peer_pool.submit(self._run, key_type, source_operation, False)
+            return source_operation.future
+
+        with self._lock:
+            cap = self._concurrency_caps.get(key_type)
+            if cap is not None and self._dispatched[key_type] >= cap:
+                self._capped_operations[key_type].append(source_operation)
+                log.debug("Concurrency cap of %s sources reached, operation queued.", key_type)
+            else:
+                self._dispatched[key_type] += 1
+                self._pool.submit(self._run, key_type, source_operation)
+
+            self._peak_queued = max(self._peak_queued, self._queued())
+
+        return source_operation.future
+
+    def _run(self, key_type: KeyType, source_operation: _SourceOperation, pooled: bool = True) -> None:
+        with self._lock:
+            self._running[key_type] += 1
+
+        try:
+            if source_operation.future.set_running_or_notify_cancel():
+                try:
+                    source_operation.future.set_result(source_operation.operation(*source_operation.args))
+                except BaseException as e:
+                    source_operation.future.set_exception(e)
+        finally:
+            with self._lock:
+                self._running[key_type] -= 1
+                if source_operation.future.cancelled() or source_operation.future.exception() is not None:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+
+                # The slot of this operation goes to the next capped operation of the same key type
+                if pooled and self._capped_operations[key_type]:
+                    self._pool.submit(self._run, key_type, self._capped_operations[key_type].popleft())
+                else:
+                    self._dispatched[key_type] -= 1
+
+    def get_metrics(self) -> SourceExecutorMetrics:
+        with self._lock:
+            key_types = set(self._dispatched) | set(self._capped_operations)
+            return SourceExecutorMetrics(
+                max_workers=self.max_workers,
+                max_peer_workers=self.max_peer_workers,
+                queued=self._queued(),
+                running=sum(self._running.values()),
+                completed=self._completed,
+                failed=self._failed,
+                peak_queued=self._peak_queued,
+                queued_per_key_type={
+                    key_type: len(self._capped_operations[key_type]) + self._dispatched[key_type] - self._running[key_type]
+                    for key_type in key_types
+                },
+                running_per_key_type={key_type: self._running[key_type] for key_type in key_types},
+            )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for operations in self._capped_operations.values():
+                for source_operation in operations:
+                    source_operation.future.cancel()
+                operations.clear()
+
+        self._pool.shutdown(wait=True)
+        self._peer_pool.shutdown(wait=True)
@@ -1,15 +1,28 @@
 #kdfix/key/pqc_source.py
 import logging
 import socket
+import struct
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
 from uuid import uuid4
 
 import oqs
 
+from hybridization_module.key_generation.kem_context_pool import KemContextPool, load_secret_key
+from hybridization_module.key_generation.kem_keypair_pool import KemKeypairPool
+from hybridization_module.key_generation.kem_process_pool import KemProcessPool
+from hybridization_module.key_generation.key_expansion import CounterKeyExpander
 from hybridization_module.key_generation.key_source_interface import KeySource
 from hybridization_module.model.exceptions import PqcError
-from hybridization_module.model.requests import OpenConnectQos
+from hybridization_module.model.requests import (
+    MAX_PQC_BATCH_SIZE,
+    OpenConnectOptions,
+    OpenConnectQos,
+)
 from hybridization_module.model.shared_enums import (
     ConnectionRole,
+    KeyExpansionFunction,
     KeyExtractionAlgorithm,
     KeyType,
     PeerSessionType,
@@ -20,6 +33,10 @@ from hybridization_module.utils.io_utils import receive_nbytes
 
 log = logging.getLogger(__name__)
 
+BATCH_HEADER = struct.Struct("!H") # Number of public keys of a batched exchange
+REKEY_MARKER = b"R" # Sent by the client before a key when the secrets expire by time: a KEM exchange follows
+CONTINUE_MARKER = b"C" # The key is derived from the current secret
+
 class PQCSource(KeySource):
     def __init__(
         self,
@@ -28,7 +45,10 @@ class PQCSource(KeySource):
         role: ConnectionRole,
         kem_algorithm: KeyExtractionAlgorithm = KeyExtractionAlgorithm.KYBER512,
         kem_appearance_index: int = 0,
-        sig_algorithm: str = None) -> None:
+        sig_algorithm: str = None,
+        keypair_pool: KemKeypairPool | None = None,
+        kem_processes: KemProcessPool | None = None,
+        kem_contexts: KemContextPool | None = None) -> None:
         """
         Initializes the PQC Link using the node, and with a specified KEM and optional signature mechanism.
 
@@ -39,6 +59,10 @@ class PQCSource(KeySource):
             kem_algorithm (str): The KEM algorithm to use (default: 'Kyber512').
             kem_appearance_index (int): The number of souces that have the same kem_algorithm when the PQCSource was created.
             sig_algorithm (str): The signature algorithm to use (optional).
+            keypair_pool (KemKeypairPool | None): Node-wide pool of pre-generated keypairs (optional).
+            kem_processes (KemProcessPool | None): Node-wide processes that run the KEM operations (optional).
+            kem_contexts (KemContextPool | None): Node-wide pool of reusable KEM contexts (optional, without
+                it the source allocates its own context).
         """
         self.id: str = f"{self.get_key_type()}-{uuid4()}"
         log.debug("Initializing PQC source with id: %s", self.id)
@@ -51,11 +75,29 @@ class PQCSource(KeySource):
         self.role: ConnectionRole = role
         self.key_stream_id: str = None
         self.secure_socket: socket.socket = None
+        self.keypair_pool: KemKeypairPool | None = keypair_pool
+        self.kem_processes: KemProcessPool | None = kem_processes
+        self.kem_contexts: KemContextPool | None = kem_contexts
+        self.peer_session_id: str = None
+        self._batched_secrets: deque[bytes] = deque() # Shared secrets of the last batched exchange not used yet
+        self._expander: CounterKeyExpander | None = None # Derives the keys from the current secret
+
+        # Exchange options of the session, set with set_options()
+        self.batch_size: int = 1 # KEM exchanges per round trip with the peer
+        self.rekey_keys: int = 1 # Keys derived from each KEM shared secret (1 uses each secret as the key)
+        self.rekey_seconds: float = 0 # Maximum age of the secret the keys are derived from (0 has no limit)
+        self.key_expansion: KeyExpansionFunction = KeyExpansionFunction.HKDF
 
         if not self.kem_algorithm:
             raise ValueError("The PQC source cannot start because it is missing the pqc algorithm.")
 
-        self.kem = oqs.KeyEncapsulation(self.kem_algorithm)
+        if self.kem_contexts is None:
+            self.kem: oqs.KeyEncapsulation = oqs.KeyEncapsulation(self.kem_algorithm)
+            self.kem_details: dict = self.kem.details
+        else:
+            self.kem = None
+            with self.kem_contexts.checkout(self.kem_algorithm) as kem: # Also checks that the algorithm is supported
+                self.kem_details = dict(kem.details)
 
         log.debug("Configuration loaded:")
         log.debug("Role=%s", role)
@@ -71,37 +113,86 @@ class PQCSource(KeySource):
     def get_key_type(cls) -> KeyType:
         return KeyType.PQC
 
+    @classmethod
+    def waits_for_peer(cls) -> bool:
+        return True # Every KEM exchange is done with the PQC source of the peer session
+
     def get_id(self) -> str:
         return self.id
 
+    def set_options(self, options: OpenConnectOptions) -> None:
+        """Sets how the keys of the session are exchanged, it must be called before open_connect()."""
+        self.batch_size = options.pqc_batch_size
+        self.rekey_keys = options.pqc_rekey_keys
+        self.rekey_seconds = options.pqc_rekey_seconds
+        self.key_expansion = options.pqc_key_expansion
+
     ### Open Connect ###
 
-    def open_connect(self, hybrid_ksid: str, qos: OpenConnectQos, timeout: int = 10) -> None:
+    def open_connect(self, hybrid_ksid: str, qos: OpenConnectQos, timeout: float = 10) -> None:
         """Implements the open_connect method from KeySource.
 
         Starts the socket connection between the peers so that they can exchange PQC information.
         """
 
-        peer_session_id = f"{self.kem_algorithm}-{self.kem_appearance_index}-{hybrid_ksid}"
-        peer_session_ref = PeerSessionReference(type=PeerSessionType.PQC, id=peer_session_id)
-        self.secure_socket = self.peer_manager.connect_peer(peer_session_ref, self.role, self.peer_address)
+        self.peer_session_id = f"{self.kem_algorithm}-{self.kem_appearance_index}-{hybrid_ksid}"
+        peer_session_ref = PeerSessionReference(type=PeerSessionType.PQC, id=self.peer_session_id)
+        self.secure_socket = self.peer_manager.connect_peer(peer_session_ref, self.role, self.peer_address, timeout)
         self.key_stream_id = hybrid_ksid
 
     ### Get Key ###
 
+    def _offloaded(self) -> bool:
+        """Whether the KEM operations of this source run in the process pool."""
+        return self.kem_processes is not None and self.kem_processes.handles(self.kem_algorithm)
+
+    @contextmanager
+    def _kem_context(self) -> Iterator[oqs.KeyEncapsulation]:
+        """Lends the KEM context for one operation, taken from the node pool if there is one."""
+        if self.kem_contexts is None:
+            yield self.kem
+        else:
+            with self.kem_contexts.checkout(self.kem_algorithm) as kem:
+                yield kem
+
+    def _send_public_key(self, public_key: bytes) -> bytes:
+        """Sends the public key to the server and returns the ciphertext it answers with."""
+        self.secure_socket.sendall(public_key)
+        log.debug("[CLIENT] Server received public key. Waiting for ciphertext...")
+
+        ciphertext = receive_nbytes(self.secure_socket, self.kem_details["length_ciphertext"])
+        log.debug("[CLIENT] Received ciphertext, starting decapsulation...")
+        return ciphertext
+
     def _client_side_get_key(self) -> bytes:
 
         # CLIENT: Generates keypair, send public key, and receives ciphertext to get the shared secret
-        public_key = self.kem.generate_keypair()
-        log.debug("[CLIENT] Public key generated, sending it to server...")
+        from_keypair_pool = self.keypair_pool is not None and self.keypair_pool.enabled
+        if from_keypair_pool or self._offloaded():
+            if from_keypair_pool:
+                public_key, secret_key = self.keypair_pool.take(self.kem_algorithm)
+                log.debug("[CLIENT] Public key taken from the keypair pool, sending it to server...")
+            else:
+                public_key, secret_key = self.kem_processes.generate_keypair(self.kem_algorithm)
+                log.debug("[CLIENT] Public key generated in the process pool, sending it to server...")
 
-        self.secure_socket.sendall(public_key)
-        log.debug("[CLIENT] Server received public key. Waiting for ciphertext...")
+            ciphertext = self._send_public_key(public_key)
+            if self._offloaded():
+                shared_secret = self.kem_processes.decap_secret(self.kem_algorithm, secret_key, ciphertext)
+            else:
+                with self._kem_context() as kem:
+                    load_secret_key(kem, secret_key)
+                    shared_secret = kem.decap_secret(ciphertext)
 
-        ciphertext = receive_nbytes(self.secure_socket, self.kem.details["length_ciphertext"])
-        log.debug("[CLIENT] Received ciphertext, starting decapsulation...")
+        else:
+            # The context keeps the secret key between the generation and the decapsulation
+            with self._kem_context() as kem:
+                public_key = kem.generate_keypair()
+                log.debug("[CLIENT] Public key generated, sending it to server...")
+
+                ciphertext = self._send_public_key(public_key)
+                shared_secret = kem.decap_secret(ciphertext)
 
-        shared_secret= self.kem.decap_secret(ciphertext)
         log.debug("[CLIENT] Shared secret decapsulated. GET KEY completed successfully.", )
         return  shared_secret
 
@@ -109,38 +200,164 @@ class PQCSource(KeySource):
     def _server_side_get_key(self) -> bytes:
 
         # SEVER: Receives public key from the secure socket and sends the ciphertext.
-        public_key = receive_nbytes(self.secure_socket, self.kem.details["length_public_key"])
+        public_key = receive_nbytes(self.secure_socket, self.kem_details["length_public_key"])
         log.debug("[SERVER] Received public key, encapsulating secret...")
 
-        ciphertext, shared_secret = self.kem.encap_secret(public_key)
+        if self._offloaded():
+            ciphertext, shared_secret = self.kem_processes.encap_secret(self.kem_algorithm, public_key)
+        else:
+            with self._kem_context() as kem:
+                ciphertext, shared_secret = kem.encap_secret(public_key)
         log.debug("[SERVER] Shared secret encapsulated. Sending ciphertext to client.")
 
         self.secure_socket.sendall(ciphertext)  # Send back shared secret
         log.debug("[SERVER] Client received ciphertext. GET KEY completed successfully.")
         return shared_secret
 
-    def get_key(self, retries: int = 5, timeout: int = 10) -> bytes:
+    ### Batched exchanges ###
+
+    @staticmethod
+    def _split(data: bytes, size: int) -> list[bytes]:
+        return [data[i:i + size] for i in range(0, len(data), size)]
+
+    def _generate_keypairs(self, count: int) -> list[tuple[bytes, bytes]]:
+        if self.keypair_pool is not None and self.keypair_pool.enabled:
+            return [self.keypair_pool.take(self.kem_algorithm) for _ in range(count)]
+        if self._offloaded():
+            return self.kem_processes.generate_keypairs(self.kem_algorithm, count)
+
+        with self._kem_context() as kem:
+            return [(kem.generate_keypair(), kem.export_secret_key()) for _ in range(count)]
+
+    def _client_side_batch(self) -> list[bytes]:
+
+        # CLIENT: Sends batch_size public keys in one message and decapsulates the ciphertexts of the answer
+        keypairs = self._generate_keypairs(self.batch_size)
+        self.secure_socket.sendall(BATCH_HEADER.pack(len(keypairs)) + b"".join(pk for pk, _ in keypairs))
+        log.debug("[CLIENT] Sent %s public keys to server. Waiting for ciphertexts...", len(keypairs))
+
+        ciphertext_length = self.kem_details["length_ciphertext"]
+        ciphertexts = self._split(
+            receive_nbytes(self.secure_socket, len(keypairs) * ciphertext_length), ciphertext_length
+        )
+        pairs = [(secret_key, ciphertext) for (_, secret_key), ciphertext in zip(keypairs, ciphertexts)]
+
+        if self._offloaded():
+            return self.kem_processes.decap_secrets(self.kem_algorithm, pairs)
+
+        shared_secrets = []
+        with self._kem_context() as kem:
+            for secret_key, ciphertext in pairs:
+                load_secret_key(kem, secret_key)
+                shared_secrets.append(kem.decap_secret(ciphertext))
+        return shared_secrets
+
+    def _server_side_batch(self) -> list[bytes]:
+
+        # SERVER: Receives the public keys of the client and answers with all the ciphertexts in one message
+        (count,) = BATCH_HEADER.unpack(receive_nbytes(self.secure_socket, BATCH_HEADER.size))
+        if not 0 < count <= MAX_PQC_BATCH_SIZE:
+            raise PqcError(f"Invalid number of public keys in a batched exchange: {count}")
+
+        public_key_length = self.kem_details["length_public_key"]
+        public_keys = self._split(receive_nbytes(self.secure_socket, count * public_key_length), public_key_length)
+        log.debug("[SERVER] Received %s public keys, encapsulating secrets...", count)
+
+        if self._offloaded():
+            encapsulations = self.kem_processes.encap_secrets(self.kem_algorithm, public_keys)
+        else:
+            with self._kem_context() as kem:
+                encapsulations = [kem.encap_secret(public_key) for public_key in public_keys]
+
+        self.secure_socket.sendall(b"".join(ciphertext for ciphertext, _ in encapsulations))
+        return [shared_secret for _, shared_secret in encapsulations]
+
+    def _batched_get_key(self) -> bytes:
+        """Returns the next shared secret of the current batch, and exchanges a new batch when it is empty.
+
+        The client decides how many exchanges a batch has (the server follows the count it receives),
+        so both buffers always hold the same secrets.
+        """
+        if not self._batched_secrets:
+            if self.role == ConnectionRole.CLIENT:
+                self._batched_secrets.extend(self._client_side_batch())
+            elif self.role == ConnectionRole.SERVER:
+                self._batched_secrets.extend(self._server_side_batch())
+            else:
+                raise ValueError(f"Invalid role: must be {ConnectionRole.CLIENT} or {ConnectionRole.SERVER}")
+            log.debug("[%s] Batched exchange of %s keys completed.", self.role, len(self._batched_secrets))
+
+        return self._batched_secrets.popleft()
+
+    ### Key expansion ###
+
+    def _exchange_secret(self) -> bytes:
+        """Obtains a new shared secret with the peer (from the current batch if the exchanges are batched)."""
+        if self.batch_size > 1:
+            return self._batched_get_key()
+        elif self.role == ConnectionRole.CLIENT:
+            return self._client_side_get_key()
+        elif self.role == ConnectionRole.SERVER:
+            return self._server_side_get_key()
+        else:
+            raise ValueError(f"Invalid role: must be {ConnectionRole.CLIENT} or {ConnectionRole.SERVER}")
+
+    def _secret_expired(self) -> bool:
+        return (
+            self._expander is None
+            or self._expander.counter >= self.rekey_keys
+            or 0 < self.rekey_seconds <= self._expander.age()
+        )
+
+    def _expanded_get_key(self) -> bytes:
+        """Derives the next key from the current shared secret, and exchanges a new one when it expires.
+
+        If the secrets only expire after rekey_keys keys, both peers count them. If they also expire
+        by time, the clocks of the peers cannot agree on it, so the client decides and sends a marker
+        before each key.
+        """
+        if self.rekey_seconds > 0 and self.role == ConnectionRole.SERVER:
+            marker = receive_nbytes(self.secure_socket, len(REKEY_MARKER))
+            if marker not in (REKEY_MARKER, CONTINUE_MARKER):
+                raise PqcError(f"Invalid key expansion marker from the client: {marker!r}")
+            if marker == CONTINUE_MARKER and self._expander is None:
+                raise PqcError("The client derived a key from a secret that was never exchanged")
+            rekey = marker == REKEY_MARKER
+        else:
+            rekey = self._secret_expired()
+            if self.rekey_seconds > 0:
+                self.secure_socket.sendall(REKEY_MARKER if rekey else CONTINUE_MARKER)
+
+        if rekey:
+            secret = self._exchange_secret()
+            self._expander = CounterKeyExpander(
+                self.key_expansion, secret, self.peer_session_id.encode(), len(secret)
+            )
+            log.debug("[%s] New shared secret exchanged to derive the next keys.", self.role)
+
+        return self._expander.next_key()
+
+    def get_key(self, retries: int = 5, timeout: float | None = 10) -> bytes:
         """Implements the get_key method from KeySource.
 
         Performs the key exchange process based on the role.
         - CLIENT: Generates keypair, sends public key, and receives ciphertext to get the shared secret
         - SERVER: Receives public key from the secure socket and sends the ciphertext.
+        With a batch_size over 1, each round trip exchanges batch_size keys and the next calls use them.
+        With a rekey_keys over 1, the keys are derived from each shared secret until it expires.
 
         Raises:
             PQCException: If the key exchange fails after all retries.
         """
         # delay = 1
-        self.secure_socket.settimeout(timeout)
-
         if not self.secure_socket:
             raise PqcError(f"[{self.role}] Secure socket not established")
+
+        self.secure_socket.settimeout(timeout)
         try:
-            if self.role == ConnectionRole.CLIENT:
-                return self._client_side_get_key()
-            elif self.role == ConnectionRole.SERVER:
-                return self._server_side_get_key()
-            else:
-                raise ValueError(f"Invalid role: must be {ConnectionRole.CLIENT} or {ConnectionRole.SERVER}")
+            if self.rekey_keys > 1:
+                return self._expanded_get_key()
+            return self._exchange_secret()
         except Exception as e:
             log.error("[%s] Failure Getting key for KSID %s: %s", self.role, self.key_stream_id, e)
             raise e
@@ -153,7 +370,15 @@ class PQCSource(KeySource):
 
         Closes the socket connection.
         """
+        self._batched_secrets.clear()
+        self._expander = None
         if self.secure_socket:
+            try:
+                # Wakes up any thread still waiting for the peer in this socket
+                self.secure_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
             try:
                 self.secure_socket.close()
                 log.debug("%s socket connection closed", self.id)
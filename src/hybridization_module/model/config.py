@@ -1,6 +1,14 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from hybridization_module.model.shared_enums import LogType
+from hybridization_module.model.shared_enums import (
+    KeyExtractionAlgorithm,
+    KeyType,
+    LatencyDistribution,
+    LogType,
+    MessageFraming,
+    PeerConnectorMode,
+    ServerEngine,
+)
 from hybridization_module.model.shared_types import NetworkAddress
 
 
@@ -17,6 +25,52 @@ class CertificateConfiguration(BaseModel):
     cert_path: str
     key_path: str
 
+class ServerConfiguration(BaseModel):
+    engine: ServerEngine = ServerEngine.THREADED
+    max_workers: int = 10
+    framing: MessageFraming = MessageFraming.NONE
+
+class PeerConnectorConfiguration(BaseModel):
+    mode: PeerConnectorMode = PeerConnectorMode.DIRECT
+    handshake_workers: int = Field(default=16, gt=0) # Incoming TLS handshakes done at the same time
+    handshake_timeout: float = Field(default=5, gt=0) # Seconds an incoming peer has to finish the handshake
+    unclaimed_ttl: float = Field(default=30, gt=0) # Seconds a peer connection waits for its session before being closed
+    warm_pool_min_size: int = Field(default=0, ge=0) # Warm connections always kept to each trusted peer
+    warm_pool_max_size: int = Field(default=0, ge=0) # Upper bound when adapting to the connection rate (0 disables)
+    warm_idle_timeout: float = Field(default=60, gt=0) # Seconds an unused warm connection is kept before it is replaced
+
+class SourceExecutorConfiguration(BaseModel):
+    max_workers: int = 32
+    max_concurrency_per_key_type: dict[KeyType, int] = {} # Key types without entry are only limited by max_workers
+    max_peer_workers: int = Field(default=1024, ge=1) # Threads for the operations that wait for the peer (created on demand)
+
+class KmsConnectionPoolConfiguration(BaseModel):
+    max_connections: int = Field(default=16, ge=1) # Connections to the KMS open at the same time
+    idle_timeout: float = 30 # Seconds an unused connection is kept open
+    request_timeout: float = 10 # Seconds per KMS request when the caller does not give a timeout
+
+class KemKeypairPoolConfiguration(BaseModel):
+    depth: int = Field(default=0, ge=0) # Keypairs kept ready per KEM algorithm (0 disables the pool)
+    producer_threads: int = Field(default=2, ge=1)
+    algorithms: list[KeyExtractionAlgorithm] = [] # Filled from the start, the rest once they are first used
+
+class KemContextPoolConfiguration(BaseModel):
+    max_idle_per_algorithm: int = Field(default=8, ge=0) # KEM contexts kept for reuse per algorithm (0 disables reuse)
+
+class KemProcessPoolConfiguration(BaseModel):
+    enabled: bool = False # Run the KEM operations of the PQC sources in worker processes
+    workers: int = Field(default=0, ge=0) # Worker processes (0 is one per core)
+    algorithms: list[KeyExtractionAlgorithm] = [] # Algorithms run in the processes (empty is all of them)
+
+class HybridizationBatcherConfiguration(BaseModel):
+    enabled: bool = False # Hybridize the keys of every session together in a node-wide thread
+    max_batch_size: int = Field(default=256, ge=1) # Hybridizations run in the same batch at most
+    window: float = Field(default=0.0005, ge=0) # Seconds the batcher waits for more jobs after the first one
+
+class SessionConfiguration(BaseModel):
+    key_store_window: int = Field(default=1024, ge=1) # Last keys of each session that can be requested again
+    default_timeout: float = Field(default=10, gt=0) # Seconds per request when the QoS timeout is 0
+
 class GeneralConfiguration(BaseModel):
     uuid: str
 
@@ -26,6 +80,33 @@ class GeneralConfiguration(BaseModel):
     peer_local_address: NetworkAddress
     qkd_address: NetworkAddress
 
+    server_config: ServerConfiguration = ServerConfiguration()
+    peer_connector_config: PeerConnectorConfiguration = PeerConnectorConfiguration()
+    source_executor_config: SourceExecutorConfiguration = SourceExecutorConfiguration()
+    session_config: SessionConfiguration = SessionConfiguration()
+    kms_pool_config: KmsConnectionPoolConfiguration = KmsConnectionPoolConfiguration()
+    kem_keypair_pool_config: KemKeypairPoolConfiguration = KemKeypairPoolConfiguration()
+    kem_context_pool_config: KemContextPoolConfiguration = KemContextPoolConfiguration()
+    kem_process_pool_config: KemProcessPoolConfiguration = KemProcessPoolConfiguration()
+    hybridization_batcher_config: HybridizationBatcherConfiguration = HybridizationBatcherConfiguration()
+    mock_qkd: bool = False # Use the in-process MockQKDStack instead of the KMS in qkd_address
+
+
+# ---- KMS emulator
+
+class KmsEmulatorConfiguration(BaseModel):
+    address: NetworkAddress
+    seed: str = "kms-emulator" # Both emulators of a link need the same seed to produce the same keys
+    key_size: int | None = Field(default=None, ge=1) # Bytes per key, None uses the key_chunk_size of the QoS
+    key_rate_bps: float = Field(default=0, ge=0) # Key bits generated per second by the link (0 is unlimited)
+
+    latency_distribution: LatencyDistribution = LatencyDistribution.CONSTANT
+    latency_ms: float = Field(default=0, ge=0) # Mean latency added to every response
+    latency_jitter_ms: float = Field(default=0, ge=0)
+
+    error_rate: float = Field(default=0, ge=0, le=1) # Probability that a request is answered with an error
+    error_codes: list[int] = [2] # Status codes (see check_status) used for the injected errors
+
 
 # ---- Trusted Peers info
 
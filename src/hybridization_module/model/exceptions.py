@@ -8,6 +8,26 @@ class PqcError(Exception):
     """Base exception for PQC-related errors."""
     pass
 
+class FramingError(Exception):
+    """Exception raised when a message stream does not follow the expected framing."""
+    pass
+
+class DeadlineExceededError(Exception):
+    """Exception raised when the deadline of a request expires before an operation can start."""
+    pass
+
+class KeyIndexError(Exception):
+    """Exception raised when the requested key index is not available in the session."""
+    pass
+
+class SessionDesynchronizedError(Exception):
+    """Exception raised when a session can no longer derive the same keys as the peer session."""
+    pass
+
+class PeerOptionsMismatchError(Exception):
+    """Exception raised when the peer session was opened with different exchange options."""
+    pass
+
 class PeerNotConnectedError(QkdError):
     """Exception raised when peer is not connected."""
     pass
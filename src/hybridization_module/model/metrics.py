@@ -0,0 +1,78 @@
+from pydantic import BaseModel
+
+from hybridization_module.model.shared_enums import KeyExtractionAlgorithm, KeyType
+
+
+class SourceExecutorMetrics(BaseModel):
+    max_workers: int
+    max_peer_workers: int
+    queued: int  # Operations waiting for a worker or for the concurrency cap of their key type
+    running: int
+    completed: int
+    failed: int
+    peak_queued: int
+
+    queued_per_key_type: dict[KeyType, int]
+    running_per_key_type: dict[KeyType, int]
+
+class KmsConnectionPoolMetrics(BaseModel):
+    max_connections: int
+    idle: int
+    in_use: int
+    created: int
+    reused: int # Requests sent through an already open connection
+    discarded: int # Connections closed because of errors, idleness or the KMS closing them
+
+class KemKeypairPoolMetrics(BaseModel):
+    depth: int
+    hits: int # Keypairs taken from the pool
+    misses: int # Keypairs generated inline because the pool of the algorithm was empty
+    failed: int
+    ready: dict[KeyExtractionAlgorithm, int]
+
+class KemContextPoolMetrics(BaseModel):
+    max_idle_per_algorithm: int
+    allocated: int # KEM contexts created
+    reused: int # Checkouts served with an idle context (allocations avoided)
+    discarded: int # Contexts freed because the pool of their algorithm was full
+    in_use: int
+    idle: dict[KeyExtractionAlgorithm, int]
+    live_bytes: int # Key buffers of the contexts not freed
+    peak_bytes: int
+
+class KemProcessPoolMetrics(BaseModel):
+    enabled: bool
+    workers: int
+    pending: int # Operations sent to the workers that have not finished
+    completed: int
+    failed: int
+    restarts: int # Times the workers were replaced after one of them died
+
+class HybridizationBatcherMetrics(BaseModel):
+    enabled: bool
+    batches: int
+    completed: int
+    vectorized: int # Hybridizations done in a single XOR with the rest of their batch
+    failed: int
+    largest_batch: int
+    mean_batch_size: float
+    queued: int # Waiting for the next batch
+
+class TlsSessionMetrics(BaseModel):
+    client_handshakes: int
+    client_resumed: int # Handshakes that resumed a cached session instead of doing a full one
+    server_handshakes: int
+    server_resumed: int
+    resumption_rate: float # Resumed handshakes over all the handshakes (0 to 1)
+    cached_sessions: int # Peers with a session that can be resumed
+
+class WarmPoolMetrics(BaseModel):
+    hits: int # Client connections that used a warm connection
+    misses: int # Client connections that had to open a new connection
+    failed: int # Warm connections that could not be opened
+    idle: dict[str, int] # Warm connections ready, per peer
+    target_size: dict[str, int] # Current size of the pool of each peer, adapted to its connection rate
+
+class PeerConnectorMetrics(BaseModel):
+    tls: TlsSessionMetrics
+    warm_pool: WarmPoolMetrics | None = None # Only if the warm pool is enabled
@@ -1,12 +1,19 @@
 import hashlib
 from urllib.parse import parse_qs, urlparse
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from hybridization_module.model.shared_enums import HybridizationMethod, KeyExtractionAlgorithm
+from hybridization_module.model.shared_enums import (
+    HybridizationMethod,
+    KeyBufferEncoding,
+    KeyExpansionFunction,
+    KeyExtractionAlgorithm,
+)
 
 # OPEN CONNECT
 
+MAX_PQC_BATCH_SIZE = 256
+
 class  OpenConnectQos(BaseModel):
     key_chunk_size: int
     max_bps: int
@@ -25,10 +32,27 @@ class OpenConnectUriParameters(BaseModel):
     key_algorithms: list[KeyExtractionAlgorithm]
 
 
+class OpenConnectOptions(BaseModel):
+    """Hybridization module specific options of the session (they are not part of ETSI 004)."""
+    key_buffer_encoding: KeyBufferEncoding = KeyBufferEncoding.LIST
+    prefetch_depth: int = Field(default=0, ge=0) # Hybrid keys generated in advance (0 disables the prefetch)
+    pqc_batch_size: int = Field(default=1, ge=1, le=MAX_PQC_BATCH_SIZE) # KEM exchanges per round trip with the peer
+    pqc_rekey_keys: int = Field(default=1, ge=1) # Keys derived from each KEM shared secret (1 uses a KEM exchange per key)
+    pqc_rekey_seconds: float = Field(default=0, ge=0) # Maximum age of the KEM shared secret keys are derived from (0 has no limit)
+    pqc_key_expansion: KeyExpansionFunction = KeyExpansionFunction.HKDF
+
+    def get_peer_options(self) -> dict:
+        """Returns the options that change the messages exchanged with the peer, both sessions must have the same."""
+        return self.model_dump(
+            mode="json", include={"pqc_batch_size", "pqc_rekey_keys", "pqc_rekey_seconds", "pqc_key_expansion"}
+        )
+
+
 class OpenConnectRequest(BaseModel):
     source: str
     destination: str
     qos: OpenConnectQos
+    options: OpenConnectOptions = OpenConnectOptions()
 
     def get_uri_parameters(self) -> OpenConnectUriParameters:
         # Parse URIs
@@ -72,9 +96,12 @@ class GetKeyMetadata(BaseModel):
 
 class GetKeyRequest(BaseModel):
     key_stream_id: str
-    index: int
+    index: int = Field(ge=0) # Position of the key in the key stream of the session
     metadata: GetKeyMetadata = GetKeyMetadata()
 
+class GetKeysRequest(GetKeyRequest):
+    count: int = Field(ge=1) # Number of hybrid keys returned in the same response
+
 # CLOSE
 
 class CloseRequest(BaseModel):
@@ -1,4 +1,4 @@
-from enum import Enum, StrEnum
+from enum import Enum, IntEnum, StrEnum
 from typing import Self
 
 ## Base classes
@@ -27,6 +27,17 @@ class LogType(CaseInsensitiveStrEnum):
     ERROR = "ERROR"
 
 
+class ServerEngine(CaseInsensitiveStrEnum):
+    THREADED = "threaded"  # One worker thread per connected application
+    ASYNCIO = "asyncio"  # One event loop for every application, workers only for blocking requests
+
+
+class MessageFraming(CaseInsensitiveStrEnum):
+    NONE = "none"  # Every recv() contains exactly one JSON message
+    LENGTH_PREFIXED = "length_prefixed"  # 4 bytes (big endian) with the size of the JSON message
+    NEWLINE = "newline"  # Newline-delimited JSON messages
+
+
 ## Connection coordinaton
 
 
@@ -39,6 +50,21 @@ class PeerSessionType(Enum):
     BLINK = 0  # Special command that just makes the peer session server do a roundtrip so it can stop
     SHARE_KSID = 1
     PQC = 2
+    WARM = 3  # Connection of the warm pool of the peer, the reference of the session it is used for comes later
+
+
+class PeerConnectorMode(CaseInsensitiveStrEnum):
+    DIRECT = "direct"  # A new TLS connection for every peer session
+    MULTIPLEXED = "multiplexed"  # Peer sessions are streams of a persistent TLS channel per peer
+    ASYNCIO = "asyncio"  # Same protocol as DIRECT, served by a single asyncio event loop
+
+
+class PeerFrameType(IntEnum):
+    OPEN = 0  # Opens a stream, the payload is the PeerSessionReference
+    ACCEPT = 1  # The other peer claimed the stream
+    DATA = 2
+    WINDOW = 3  # Gives the sender more credit, the payload is the number of bytes (4 bytes, big endian)
+    CLOSE = 4  # The sender will neither send nor read more data in the stream
 
 ## Key sources
 
@@ -46,6 +72,26 @@ class KeyType(StrEnum):
     QKD = "QKD"
     PQC = "PQC"
 
+
+class KeyExpansionFunction(CaseInsensitiveStrEnum):
+    HKDF = "hkdf"  # HKDF-SHA256 (RFC 5869), the counter goes in the info of the expand step
+    KMAC = "kmac"  # KMAC256 (NIST SP 800-185, KMAC128 for 128 bit secrets) keyed with the secret, the counter is the message
+
+## KMS emulation
+
+class LatencyDistribution(CaseInsensitiveStrEnum):
+    CONSTANT = "constant"  # Always the mean
+    UNIFORM = "uniform"  # Between mean - jitter and mean + jitter
+    NORMAL = "normal"  # Gaussian with the jitter as standard deviation
+    EXPONENTIAL = "exponential"  # Exponential with the given mean (jitter is ignored)
+
+## Responses
+
+class KeyBufferEncoding(CaseInsensitiveStrEnum):
+    LIST = "list"  # JSON array with one integer per byte
+    BASE64 = "base64"
+    HEX = "hex"
+
 ## Query parameters
 
 
@@ -53,6 +99,9 @@ class HybridizationMethod(CaseInsensitiveStrEnum):
     XOR = "xoring"
     HMAC = "hmac"
     XORHMAC = "xorhmac"
+    HKDF = "hkdf"  # HKDF-SHA256, up to 8160 bytes
+    SHAKE = "shake256"  # Any key_chunk_size
+    KMAC = "kmac256"  # Any key_chunk_size from 8 bytes
 
 
 class KeyExtractionAlgorithm(CaseInsensitiveStrEnum):
@@ -0,0 +1,391 @@
+import asyncio
+import json
+import logging
+import ssl
+import threading
+from collections.abc import Coroutine
+from ssl import SSLContext
+
+from hybridization_module.model.config import CertificateConfiguration, PeerConnectorConfiguration
+from hybridization_module.model.exceptions import PeerNotConnectedError
+from hybridization_module.model.metrics import PeerConnectorMetrics
+from hybridization_module.model.shared_enums import ConnectionRole, PeerSessionType
+from hybridization_module.model.shared_types import NetworkAddress, PeerSessionReference
+from hybridization_module.peer_connector.connector_interface import PeerConnectionManager
+from hybridization_module.peer_connector.tls import TlsSessionCache, create_ssl_context
+
+log = logging.getLogger(__name__)
+
+ACCEPT_MESSAGE = b"ok" # Sent by the server peer when it claims the connection
+
+PeerConnection = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class AsyncPeerSocket:
+    """Blocking, socket-like view of a connection of the AsyncPeerConnectionManager.
+
+    Each call runs in the event loop of the manager and blocks the calling thread until it
+    finishes, so the sessions can use it as the socket returned by the other connectors.
+    """
+
+    def __init__(self, manager: "AsyncPeerConnectionManager", connection: PeerConnection, timeout: float | None) -> None:
+        self._manager: AsyncPeerConnectionManager = manager
+        self._loop: asyncio.AbstractEventLoop = manager.loop
+        self._connection: PeerConnection = connection
+        self._reader: asyncio.StreamReader = connection[0]
+        self._writer: asyncio.StreamWriter = connection[1]
+        self._timeout: float | None = timeout
+
+    def _run(self, coroutine: Coroutine) -> object:
+        """Runs the coroutine in the loop of the manager with the timeout of the socket.
+
+        Raises:
+            TimeoutError: If the timeout expires.
+            ConnectionError: If the manager stopped.
+        """
+        try:
+            future = asyncio.run_coroutine_threadsafe(asyncio.wait_for(coroutine, self._timeout), self._loop)
+        except RuntimeError as e:
+            coroutine.close()
+            raise ConnectionError("The peer connection manager is stopped.") from e
+
+        try:
+            return future.result()
+        except asyncio.CancelledError as e:
+            raise ConnectionError("The peer connection manager stopped.") from e
+
+    def _close_transport(self) -> None:
+        try:
+            self._loop.call_soon_threadsafe(self._manager.close_connection, self._connection)
+        except RuntimeError:
+            pass # The loop is closed, and so is the connection
+
+    def settimeout(self, timeout: float | None) -> None:
+        self._timeout = timeout
+
+    def gettimeout(self) -> float | None:
+        return self._timeout
+
+    def getpeername(self) -> tuple[str, int]:
+        return self._writer.get_extra_info("peername")
+
+    def recv(self, bufsize: int) -> bytes:
+        return self._run(self._reader.read(bufsize))
+
+    def sendall(self, data: bytes) -> None:
+        async def write() -> None:
+            self._writer.write(data)
+            await self._writer.drain()
+
+        self._run(write())
+
+    def send(self, data: bytes) -> int:
+        self.sendall(data)
+        return len(data)
+
+    def shutdown(self, how: int) -> None:
+        """TLS connections cannot be half closed, so any shutdown closes the connection.
+
+        As with a socket, a thread blocked in recv() then receives b"".
+        """
+        self._close_transport()
+
+    def close(self) -> None:
+        self._close_transport()
+
+    def __enter__(self) -> "AsyncPeerSocket":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+class AsyncPeerConnectionManager(PeerConnectionManager):
+    """Peer connection manager that runs every peer connection in a single asyncio event loop.
+
+    It uses the same protocol as the PeerToPeerConnectionManager (a TLS connection per peer
+    session), so nodes using either of them can talk to each other. A session waiting for its
+    peer is a future in the loop instead of a blocked thread, so thousands of pending rendezvous
+    only cost coroutines.
+
+    Coroutines running in the loop of the manager can use connect_peer_async(), which returns the
+    asyncio streams of the connection. connect_peer() wraps them in an AsyncPeerSocket for the
+    blocking sessions.
+    """
+
+    def __init__(
+            self,
+            address: NetworkAddress,
+            cert_config: CertificateConfiguration,
+            config: PeerConnectorConfiguration = PeerConnectorConfiguration()
+        ) -> None:
+
+        self.address = address
+        self.timeout = 10 # Default seconds a peer waits for the other one when connect_peer() has no timeout
+        self.handshake_timeout: float = config.handshake_timeout
+        self.unclaimed_ttl: float = config.unclaimed_ttl
+        self.warm_idle_timeout: float = config.warm_idle_timeout
+
+        self._server_ssl_context: SSLContext = create_ssl_context(ssl.Purpose.CLIENT_AUTH, cert_config)
+        self._client_ssl_context: SSLContext = create_ssl_context(ssl.Purpose.SERVER_AUTH, cert_config)
+        self._tls_sessions: TlsSessionCache = TlsSessionCache()
+
+        self.loop: asyncio.AbstractEventLoop = None
+        self._loop_thread: threading.Thread = None
+        self._started: threading.Event = threading.Event()
+        self._stop_event: asyncio.Event = None
+        self._start_error: Exception | None = None
+
+        ## Only accessed from the loop
+        self._waiters: dict[PeerSessionReference, asyncio.Future] = {}
+        self._unclaimed: dict[PeerSessionReference, tuple[PeerConnection, asyncio.TimerHandle]] = {}
+        self._connections: set[asyncio.StreamWriter] = set()
+
+    ## Rendezvous (in the loop) ##
+
+    def close_connection(self, connection: PeerConnection) -> None:
+        """Closes a connection of the manager, it must be called from its loop."""
+        writer = connection[1]
+        self._connections.discard(writer)
+        writer.close()
+
+    def _evict(self, session_ref: PeerSessionReference) -> None:
+        connection, _ = self._unclaimed.pop(session_ref)
+        log.warning("Evicting the peer connection %s, no session claimed it in %s seconds.", session_ref, self.unclaimed_ttl)
+        self.close_connection(connection)
+
+    def _offer(self, session_ref: PeerSessionReference, connection: PeerConnection) -> None:
+        waiter = self._waiters.pop(session_ref, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(connection)
+            return
+
+        replaced = self._unclaimed.pop(session_ref, None)
+        if replaced is not None:
+            replaced[1].cancel()
+            self.close_connection(replaced[0])
+
+        eviction = self.loop.call_later(self.unclaimed_ttl, self._evict, session_ref)
+        self._unclaimed[session_ref] = (connection, eviction)
+
+    async def _claim(self, session_ref: PeerSessionReference, timeout: float) -> PeerConnection | None:
+        unclaimed = self._unclaimed.pop(session_ref, None)
+        if unclaimed is not None:
+            unclaimed[1].cancel()
+            return unclaimed[0]
+
+        waiter = self.loop.create_future()
+        self._waiters[session_ref] = waiter
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except TimeoutError:
+            return None
+        finally:
+            if self._waiters.get(session_ref) is waiter:
+                del self._waiters[session_ref]
+
+    ## Server (in the loop) ##
+
+    async def _read_session_reference(self, reader: asyncio.StreamReader, timeout: float) -> PeerSessionReference | None:
+        """Reads the reference of the peer session, returns None if the peer closed the connection instead."""
+        async with asyncio.timeout(timeout):
+            encoded_message = await reader.read(1024)
+        if not encoded_message:
+            return None
+
+        json_message = json.loads(encoded_message.decode())
+        log.debug("Received the following JSON: %s", json_message)
+        return PeerSessionReference(type=PeerSessionType(json_message["session_type"]), id=json_message["id"])
+
+    async def _handle_peer_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        addr = writer.get_extra_info("peername")
+        self._tls_sessions.record_handshake(writer.get_extra_info("ssl_object"))
+        self._connections.add(writer)
+
+        try:
+            message_ref = await self._read_session_reference(reader, self.handshake_timeout)
+
+            if message_ref is not None and message_ref.type == PeerSessionType.WARM:
+                # The peer keeps it in its warm pool, the real reference arrives when a session uses it. The
+                # peer replaces its idle warm connections after its own idle timeout, so the forgotten ones expire.
+                writer.write(ACCEPT_MESSAGE)
+                await writer.drain()
+                message_ref = await self._read_session_reference(reader, 2 * self.warm_idle_timeout)
+        except Exception as e:
+            log.error("Failed to process client connection from %s: %s", addr, e)
+            self.close_connection((reader, writer))
+            return
+
+        if message_ref is None or message_ref.type == PeerSessionType.BLINK:
+            log.debug("The peer %s closed the connection before starting a session.", addr)
+            self.close_connection((reader, writer))
+            return
+
+        self._offer(message_ref, (reader, writer))
+        log.info("Peer connection with reference %s registered.", message_ref)
+
+    async def _serve(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+
+        try:
+            server = await asyncio.start_server(
+                self._handle_peer_connection,
+                *self.address.to_tuple(),
+                ssl=self._server_ssl_context,
+                ssl_handshake_timeout=self.handshake_timeout,
+            )
+        except Exception as e:
+            self._start_error = e
+            self._started.set()
+            return
+
+        log.info("Listening to peers at %s (asyncio)", self.address)
+        self._started.set()
+
+        try:
+            await self._stop_event.wait()
+        finally:
+            # Since Python 3.12.1 wait_closed() waits for every connection, so they are aborted first
+            server.close()
+            for waiter in self._waiters.values():
+                waiter.cancel()
+            for _, eviction in self._unclaimed.values():
+                eviction.cancel()
+            for writer in list(self._connections):
+                writer.transport.abort()
+            await server.wait_closed()
+            await asyncio.sleep(0) # Let the connections notify their readers
+
+    ## Client (in the loop) ##
+
+    async def _connect_as_server(self, session_ref: PeerSessionReference, timeout: float) -> PeerConnection:
+        log.debug("Starting seach for session with type %s and id %s", session_ref.type, session_ref.id)
+
+        connection = await self._claim(session_ref, timeout)
+        if connection is None:
+            log.error("After %s seconds, the client did not connect.", timeout)
+            raise PeerNotConnectedError("The client peer did not start the session")
+
+        reader, writer = connection
+        writer.write(ACCEPT_MESSAGE)
+        await writer.drain()
+        log.info("Peer session %s established with %s.", session_ref, writer.get_extra_info("peername"))
+        return connection
+
+    async def _connect_as_client(
+            self,
+            target: NetworkAddress,
+            session_ref: PeerSessionReference,
+            timeout: float
+        ) -> PeerConnection:
+
+        log.debug("Preparing for session with type %s and id %s", session_ref.type, session_ref.id)
+        message = {
+            "session_type" : session_ref.type.value,
+            "id" : session_ref.id,
+        }
+
+        writer = None
+        try:
+            async with asyncio.timeout(timeout):
+                reader, writer = await asyncio.open_connection(
+                    *target.to_tuple(), ssl=self._client_ssl_context, server_hostname=target.host
+                )
+                self._tls_sessions.record_handshake(writer.get_extra_info("ssl_object"))
+                self._connections.add(writer)
+
+                log.debug("Sending server peer reference to server: %s", message)
+                writer.write(json.dumps(message).encode())
+                await writer.drain()
+                await reader.readexactly(len(ACCEPT_MESSAGE))
+        except (TimeoutError, asyncio.IncompleteReadError) as e:
+            if writer is not None:
+                self.close_connection((reader, writer))
+            log.error("After %s seconds, the server did not accept the session.", timeout)
+            raise PeerNotConnectedError("The server peer did not accept the session") from e
+        except BaseException:
+            if writer is not None:
+                self.close_connection((reader, writer))
+            raise
+
+        log.info("Peer session %s established with %s.", session_ref, target)
+        return reader, writer
+
+    async def connect_peer_async(
+            self,
+            session_ref: PeerSessionReference,
+            role: ConnectionRole,
+            target: NetworkAddress,
+            timeout: float | None = None
+        ) -> PeerConnection:
+        """Asynchronous version of connect_peer(), it must be awaited in the loop of the manager.
+
+        Returns:
+            PeerConnection: The StreamReader and StreamWriter of the connection with the peer.
+        """
+        if timeout is None:
+            timeout = self.timeout
+
+        if role == ConnectionRole.SERVER:
+            return await self._connect_as_server(session_ref, timeout)
+        elif role == ConnectionRole.CLIENT:
+            return await self._connect_as_client(target, session_ref, timeout)
+        else:
+            raise ValueError(f"Invalid role. Must be {ConnectionRole.CLIENT} or {ConnectionRole.SERVER}.")
+
+    ## PeerConnectionManager ##
+
+    def start_listening(self) -> None:
+        if self._loop_thread is not None and self._loop_thread.is_alive():
+            log.warning("Cannot start the peer connection manager because it is already started.")
+            return
+
+        self._started.clear()
+        self._start_error = None
+        self._loop_thread = threading.Thread(target=asyncio.run, args=(self._serve(),), name="peer_manager_loop")
+        self._loop_thread.start()
+
+        self._started.wait()
+        if self._start_error is not None:
+            raise self._start_error
+        log.debug("Peer connection manager event loop started.")
+
+    def stop_listening(self) -> None:
+        """Stops accepting connections and closes the existing ones."""
+        if self._loop_thread is None or not self._loop_thread.is_alive():
+            log.warning("Cannot close the peer connection manager because it is already closed.")
+            return
+
+        self.loop.call_soon_threadsafe(self._stop_event.set)
+        self._loop_thread.join()
+        log.info("The peer connection manager has stopped listening as asked.")
+        self._loop_thread = None
+
+    def get_metrics(self) -> PeerConnectorMetrics:
+        return PeerConnectorMetrics(tls=self._tls_sessions.get_metrics())
+
+    def connect_peer(
+            self,
+            session_ref: PeerSessionReference,
+            role: ConnectionRole,
+            target: NetworkAddress,
+            timeout: float | None = None
+        ) -> AsyncPeerSocket:
+
+        if timeout is None:
+            timeout = self.timeout
+
+        coroutine = self.connect_peer_async(session_ref, role, target, timeout)
+        try:
+            future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        except (RuntimeError, AttributeError) as e:
+            coroutine.close()
+            raise PeerNotConnectedError("The peer connection manager is not running.") from e
+
+        try:
+            connection = future.result()
+        except asyncio.CancelledError as e:
+            raise PeerNotConnectedError("The peer connection manager stopped.") from e
+
+        return AsyncPeerSocket(self, connection, timeout)
@@ -2,6 +2,7 @@
 import socket
 from abc import ABC, abstractmethod
 
+from hybridization_module.model.metrics import PeerConnectorMetrics
 from hybridization_module.model.shared_enums import ConnectionRole
 from hybridization_module.model.shared_types import NetworkAddress, PeerSessionReference
 
@@ -25,7 +26,13 @@ class PeerConnectionManager(ABC):
         pass
 
     @abstractmethod
-    def connect_peer(self, session_ref: PeerSessionReference, role: ConnectionRole, target: NetworkAddress) -> socket.socket:
+    def connect_peer(
+            self,
+            session_ref: PeerSessionReference,
+            role: ConnectionRole,
+            target: NetworkAddress,
+            timeout: float | None = None
+        ) -> socket.socket:
         """Returns a socket that connect you to the peer with the same session_ref.
 
         Depending on the role, this method will send the session_ref to the other peer to
@@ -35,9 +42,23 @@ class PeerConnectionManager(ABC):
             session_ref (PeerSessionReference): Unique identifier of the session you want to create.
             role (ConnectionRole): Role in the connection (SERVER or CLIENT).
             target (NetworkAddress): Network address of the other peer.
+            timeout (float | None): Maximum number of seconds to wait for the peer, None uses the
+                default timeout of the manager. It is also the timeout of the returned socket.
 
         Returns:
             socket.socket: Reserved socket that should be used for the purpose
             defined in session_ref.type
         """
-        pass
\ No newline at end of file
+        pass
+
+    def set_trusted_peers(self, addresses: list[NetworkAddress]) -> None:
+        """Tells the manager which peers the node can connect to, so it can prepare connections to them.
+
+        Managers that do not prepare connections ignore it.
+        """
+        pass
+
+    @abstractmethod
+    def get_metrics(self) -> PeerConnectorMetrics:
+        """Returns the metrics of the connections with the peers (TLS handshakes and resumptions)."""
+        pass
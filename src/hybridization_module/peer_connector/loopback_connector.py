@@ -0,0 +1,195 @@
+import logging
+import socket
+import threading
+import time
+
+from hybridization_module.model.config import PeerConnectorConfiguration
+from hybridization_module.model.exceptions import PeerNotConnectedError
+from hybridization_module.model.metrics import PeerConnectorMetrics, TlsSessionMetrics
+from hybridization_module.model.shared_enums import ConnectionRole
+from hybridization_module.model.shared_types import NetworkAddress, PeerSessionReference
+from hybridization_module.peer_connector.connector_interface import PeerConnectionManager
+from hybridization_module.peer_connector.rendezvous import RendezvousTable
+from hybridization_module.utils.io_utils import receive_nbytes
+
+log = logging.getLogger(__name__)
+
+ACCEPT_MESSAGE = b"ok" # Sent by the server peer when it claims the connection
+
+
+class EmulatedLinkSocket:
+    """One end of a socketpair that delays what it sends as a network link would.
+
+    Each send waits for the latency plus the time the data takes at bandwidth_bps before writing
+    it, so the sender sees the cost of the link. The rest of the socket API is the one of the
+    wrapped socket.
+    """
+
+    def __init__(self, sock: socket.socket, latency: float, bandwidth_bps: float) -> None:
+        self.sock: socket.socket = sock
+        self.latency: float = latency
+        self.bandwidth_bps: float = bandwidth_bps
+
+    def _delay(self, size: int) -> None:
+        delay = self.latency
+        if self.bandwidth_bps > 0:
+            delay += size * 8 / self.bandwidth_bps
+        if delay > 0:
+            time.sleep(delay)
+
+    def sendall(self, data: bytes) -> None:
+        self._delay(len(data))
+        self.sock.sendall(data)
+
+    def send(self, data: bytes) -> int:
+        self._delay(len(data))
+        return self.sock.send(data)
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(self.sock, name)
+
+    def __enter__(self) -> "EmulatedLinkSocket":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.sock.close()
+
+
+class LoopbackNetwork:
+    """In-process network that connects the LoopbackPeerConnectionManagers created with it.
+
+    Each peer session is a socketpair instead of a TLS connection, so two Etsi004Server in the same
+    process can run the whole session pipeline without certificates or network. The links can
+    emulate a latency (seconds added to each send) and a bandwidth (bits per second, 0 is unlimited).
+    """
+
+    def __init__(self, latency: float = 0, bandwidth_bps: float = 0) -> None:
+        self.latency: float = latency
+        self.bandwidth_bps: float = bandwidth_bps
+
+        self._lock: threading.Lock = threading.Lock()
+        self._managers: dict[NetworkAddress, LoopbackPeerConnectionManager] = {}
+
+    def register(self, manager: "LoopbackPeerConnectionManager") -> None:
+        with self._lock:
+            self._managers[manager.address] = manager
+
+    def unregister(self, manager: "LoopbackPeerConnectionManager") -> None:
+        with self._lock:
+            if self._managers.get(manager.address) is manager:
+                del self._managers[manager.address]
+
+    def get_manager(self, address: NetworkAddress) -> "LoopbackPeerConnectionManager":
+        """
+        Raises:
+            ConnectionRefusedError: If no manager is listening at address.
+        """
+        with self._lock:
+            manager = self._managers.get(address)
+
+        if manager is None:
+            raise ConnectionRefusedError(f"No loopback peer is listening at {address}.")
+        return manager
+
+    def create_link(self) -> tuple[socket.socket, socket.socket]:
+        """Returns both ends of a new link."""
+        client_end, server_end = socket.socketpair()
+        if self.latency <= 0 and self.bandwidth_bps <= 0:
+            return client_end, server_end
+
+        return (
+            EmulatedLinkSocket(client_end, self.latency, self.bandwidth_bps),
+            EmulatedLinkSocket(server_end, self.latency, self.bandwidth_bps),
+        )
+
+
+class LoopbackPeerConnectionManager(PeerConnectionManager):
+    """Peer connection manager that connects the servers of the same process through a LoopbackNetwork.
+
+    It is meant for benchmarks and profiling: the sessions behave as with the other managers, but
+    without the cost of TLS and the network (or with an emulated one).
+    """
+
+    def __init__(
+            self,
+            address: NetworkAddress,
+            network: LoopbackNetwork,
+            config: PeerConnectorConfiguration = PeerConnectorConfiguration()
+        ) -> None:
+
+        self.address = address
+        self.network: LoopbackNetwork = network
+        self.timeout = 10 # Default seconds a peer waits for the other one when connect_peer() has no timeout
+
+        self._rendezvous: RendezvousTable[socket.socket] = RendezvousTable(
+            config.unclaimed_ttl, lambda sock: sock.close()
+        )
+
+    def offer_connection(self, session_ref: PeerSessionReference, sock: socket.socket) -> None:
+        """Called by the client peer, gives the server end of a link to the session with session_ref."""
+        self._rendezvous.offer(session_ref, sock)
+        log.info("Peer connection with reference %s registered.", session_ref)
+
+    def _connect_as_server(self, session_ref: PeerSessionReference, timeout: float) -> socket.socket:
+        sock = self._rendezvous.claim(session_ref, timeout)
+        if sock is None:
+            log.error("After %s seconds, the client did not connect.", timeout)
+            raise PeerNotConnectedError("The client peer did not start the session")
+
+        sock.settimeout(timeout)
+        sock.sendall(ACCEPT_MESSAGE)
+        log.info("Peer session %s established through the loopback network.", session_ref)
+        return sock
+
+    def _connect_as_client(self, target: NetworkAddress, session_ref: PeerSessionReference, timeout: float) -> socket.socket:
+        client_end, server_end = self.network.create_link()
+        self.network.get_manager(target).offer_connection(session_ref, server_end)
+
+        client_end.settimeout(timeout)
+        try:
+            receive_nbytes(client_end, len(ACCEPT_MESSAGE))
+        except (TimeoutError, ConnectionError) as e:
+            client_end.close()
+            log.error("After %s seconds, the server did not accept the session.", timeout)
+            raise PeerNotConnectedError("The server peer did not accept the session") from e
+
+        log.info("Peer session %s established with %s through the loopback network.", session_ref, target)
+        return client_end
+
+    def start_listening(self) -> None:
+        self.network.register(self)
+        log.info("Listening to peers at %s (loopback)", self.address)
+
+    def stop_listening(self) -> None:
+        self.network.unregister(self)
+        self._rendezvous.close()
+        log.info("The peer connection manager has stopped listening as asked.")
+
+    def get_metrics(self) -> PeerConnectorMetrics:
+        no_tls = TlsSessionMetrics(
+            client_handshakes=0,
+            client_resumed=0,
+            server_handshakes=0,
+            server_resumed=0,
+            resumption_rate=0.0,
+            cached_sessions=0,
+        )
+        return PeerConnectorMetrics(tls=no_tls)
+
+    def connect_peer(
+            self,
+            session_ref: PeerSessionReference,
+            role: ConnectionRole,
+            target: NetworkAddress,
+            timeout: float | None = None
+        ) -> socket.socket:
+
+        if timeout is None:
+            timeout = self.timeout
+
+        if role == ConnectionRole.SERVER:
+            return self._connect_as_server(session_ref, timeout)
+        elif role == ConnectionRole.CLIENT:
+            return self._connect_as_client(target, session_ref, timeout)
+        else:
+            raise ValueError(f"Invalid role. Must be {ConnectionRole.CLIENT} or {ConnectionRole.SERVER}.")
@@ -0,0 +1,620 @@
+import json
+import logging
+import selectors
+import socket
+import ssl
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from ssl import SSLContext
+
+from hybridization_module.model.config import CertificateConfiguration, PeerConnectorConfiguration
+from hybridization_module.model.exceptions import PeerNotConnectedError
+from hybridization_module.model.metrics import PeerConnectorMetrics
+from hybridization_module.model.shared_enums import ConnectionRole, PeerFrameType, PeerSessionType
+from hybridization_module.model.shared_types import NetworkAddress, PeerSessionReference
+from hybridization_module.peer_connector.connector_interface import PeerConnectionManager
+from hybridization_module.peer_connector.rendezvous import RendezvousTable
+from hybridization_module.peer_connector.tls import TlsSessionCache, create_ssl_context
+
+log = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct("!BII") # Frame type, stream id and payload size
+MAX_FRAME_PAYLOAD = 16 * 1024
+INITIAL_WINDOW = 256 * 1024 # Bytes a stream can send before the receiver gives it more credit
+MAX_SSL_WRITE = 64 * 1024
+MAX_READ_PER_EVENT = 256 * 1024 # So that a busy channel does not starve the others
+
+
+class PeerStream:
+    """Logical connection between two peer sessions, carried by a PeerChannel.
+
+    It implements the subset of the socket API used by the peer sessions (sendall, recv, settimeout,
+    shutdown, close...), so it can be used in place of the socket returned by the direct connector.
+    """
+
+    def __init__(self, channel: "PeerChannel", stream_id: int, session_ref: PeerSessionReference) -> None:
+        self.channel: PeerChannel = channel
+        self.stream_id: int = stream_id
+        self.session_ref: PeerSessionReference = session_ref
+
+        self._condition: threading.Condition = threading.Condition()
+        self._timeout: float | None = None
+        self._receive_buffer: bytearray = bytearray()
+        self._consumed: int = 0 # Bytes read by the application that have not been returned as credit
+        self._send_credit: int = INITIAL_WINDOW
+
+        self._accepted: bool = False
+        self._remote_closed: bool = False # The other peer closed the stream
+        self._read_shutdown: bool = False
+        self._write_shutdown: bool = False
+        self._error: Exception | None = None # Set if the channel fails
+
+    ## Socket API ##
+
+    def settimeout(self, timeout: float | None) -> None:
+        self._timeout = timeout
+
+    def gettimeout(self) -> float | None:
+        return self._timeout
+
+    def getpeername(self) -> tuple[str, int]:
+        return self.channel.peer_address.to_tuple()
+
+    def _deadline(self) -> float | None:
+        return time.monotonic() + self._timeout if self._timeout is not None else None
+
+    def _wait(self, predicate: object, deadline: float | None) -> None:
+        """Waits until predicate() is true (condition must be held).
+
+        Raises:
+            TimeoutError: If the deadline expires first.
+        """
+        while not predicate():
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("timed out")
+            self._condition.wait(remaining)
+
+    def recv(self, bufsize: int) -> bytes:
+        with self._condition:
+            self._wait(
+                lambda: self._receive_buffer or self._remote_closed or self._read_shutdown or self._error,
+                self._deadline(),
+            )
+
+            if not self._receive_buffer:
+                if self._error is not None and not self._remote_closed and not self._read_shutdown:
+                    raise ConnectionError(f"The peer channel failed: {self._error}")
+                return b""
+
+            data = bytes(self._receive_buffer[:bufsize])
+            del self._receive_buffer[:len(data)]
+
+            # Give the credit back once half of the window has been consumed
+            self._consumed += len(data)
+            credit = 0
+            if self._consumed >= INITIAL_WINDOW // 2:
+                credit, self._consumed = self._consumed, 0
+
+        if credit and not self._remote_closed:
+            self.channel.send_frame(PeerFrameType.WINDOW, self.stream_id, credit.to_bytes(4, "big"))
+
+        return data
+
+    def sendall(self, data: bytes) -> None:
+        view = memoryview(data)
+        deadline = self._deadline()
+
+        while view:
+            with self._condition:
+                self._wait(
+                    lambda: self._send_credit > 0 or self._write_shutdown or self._remote_closed or self._error,
+                    deadline,
+                )
+                if self._write_shutdown:
+                    raise OSError("The peer stream is closed.")
+                if self._remote_closed:
+                    raise BrokenPipeError("The peer closed the stream.")
+                if self._error is not None:
+                    raise ConnectionError(f"The peer channel failed: {self._error}")
+
+                size = min(len(view), self._send_credit, MAX_FRAME_PAYLOAD)
+                self._send_credit -= size
+
+            self.channel.send_frame(PeerFrameType.DATA, self.stream_id, bytes(view[:size]))
+            view = view[size:]
+
+    def send(self, data: bytes) -> int:
+        self.sendall(data)
+        return len(data)
+
+    def shutdown(self, how: int) -> None:
+        """Stops reading and/or writing, a thread blocked in recv() gets b"" as if the peer closed."""
+        with self._condition:
+            if how in (socket.SHUT_RD, socket.SHUT_RDWR):
+                self._read_shutdown = True
+            send_close = how in (socket.SHUT_WR, socket.SHUT_RDWR) and not self._write_shutdown
+            if send_close:
+                self._write_shutdown = True
+            self._condition.notify_all()
+
+        if send_close and self._error is None:
+            try:
+                self.channel.send_frame(PeerFrameType.CLOSE, self.stream_id)
+            except ConnectionError:
+                pass
+
+    def close(self) -> None:
+        self.shutdown(socket.SHUT_RDWR)
+        self.channel.remove_stream(self.stream_id)
+
+    def __enter__(self) -> "PeerStream":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    ## Channel events (called from the IO thread) ##
+
+    def wait_accepted(self, timeout: float | None) -> bool:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            try:
+                self._wait(lambda: self._accepted or self._remote_closed or self._error, deadline)
+            except TimeoutError:
+                return False
+            return self._accepted
+
+    def on_accept(self) -> None:
+        with self._condition:
+            self._accepted = True
+            self._condition.notify_all()
+
+    def on_data(self, payload: bytes) -> None:
+        with self._condition:
+            if not self._read_shutdown:
+                self._receive_buffer += payload
+            self._condition.notify_all()
+
+    def on_window(self, credit: int) -> None:
+        with self._condition:
+            self._send_credit += credit
+            self._condition.notify_all()
+
+    def on_remote_close(self) -> None:
+        with self._condition:
+            self._remote_closed = True
+            self._condition.notify_all()
+
+    def on_channel_error(self, error: Exception) -> None:
+        with self._condition:
+            self._error = error
+            self._condition.notify_all()
+
+
+class PeerChannel:
+    """Persistent TLS connection with a peer that carries many PeerStreams.
+
+    Every frame is FRAME_HEADER (type, stream id, payload size) followed by the payload. Only the
+    side that opened the channel opens streams in it. The socket is non-blocking and only the IO
+    thread of the manager reads and writes it, the other threads queue frames with send_frame().
+    """
+
+    def __init__(
+            self,
+            manager: "MultiplexedPeerConnectionManager",
+            sock: ssl.SSLSocket,
+            peer_address: NetworkAddress,
+            initiator: bool
+        ) -> None:
+        self.manager: MultiplexedPeerConnectionManager = manager
+        self.sock: ssl.SSLSocket = sock
+        self.peer_address: NetworkAddress = peer_address
+        self.initiator: bool = initiator
+        self.closed: bool = False
+        self._session_stored: bool = not initiator # Only the initiator resumes the TLS session later
+
+        self._lock: threading.Lock = threading.Lock()
+        self._streams: dict[int, PeerStream] = {}
+        self._next_stream_id: int = 1
+
+        self._output: bytearray = bytearray()
+        self._pending_write: int = 0 # Size of the last SSL write that has to be retried
+        self._input: bytearray = bytearray()
+
+    ## Any thread ##
+
+    def send_frame(self, frame_type: PeerFrameType, stream_id: int, payload: bytes = b"") -> None:
+        with self._lock:
+            if self.closed:
+                raise ConnectionError(f"The channel with {self.peer_address} is closed.")
+            self._output += FRAME_HEADER.pack(frame_type, stream_id, len(payload))
+            self._output += payload
+
+        self.manager.wakeup()
+
+    def open_stream(self, session_ref: PeerSessionReference) -> PeerStream:
+        with self._lock:
+            stream_id = self._next_stream_id
+            self._next_stream_id += 1
+            stream = PeerStream(self, stream_id, session_ref)
+            self._streams[stream_id] = stream
+
+        payload = json.dumps({"session_type": session_ref.type.value, "id": session_ref.id}).encode()
+        self.send_frame(PeerFrameType.OPEN, stream_id, payload)
+        return stream
+
+    def remove_stream(self, stream_id: int) -> None:
+        with self._lock:
+            self._streams.pop(stream_id, None)
+
+    def has_output(self) -> bool:
+        with self._lock:
+            return bool(self._output)
+
+    ## IO thread ##
+
+    def on_readable(self) -> None:
+        received = 0
+        try:
+            while received < MAX_READ_PER_EVENT:
+                data = self.sock.recv(MAX_SSL_WRITE)
+                if not data:
+                    raise ConnectionError("The peer closed the channel.")
+                self._input += data
+                received += len(data)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            pass
+
+        if not self._session_stored:
+            # The session ticket arrives after the handshake, with the first data of the peer
+            self._session_stored = self.manager.tls_sessions.store(self.peer_address, self.sock)
+
+        while len(self._input) >= FRAME_HEADER.size:
+            frame_type, stream_id, size = FRAME_HEADER.unpack_from(self._input)
+            if len(self._input) < FRAME_HEADER.size + size:
+                break
+
+            payload = bytes(self._input[FRAME_HEADER.size:FRAME_HEADER.size + size])
+            del self._input[:FRAME_HEADER.size + size]
+            self._dispatch(PeerFrameType(frame_type), stream_id, payload)
+
+    def _dispatch(self, frame_type: PeerFrameType, stream_id: int, payload: bytes) -> None:
+        if frame_type == PeerFrameType.OPEN:
+            message = json.loads(payload.decode())
+            session_ref = PeerSessionReference(type=PeerSessionType(message["session_type"]), id=message["id"])
+            stream = PeerStream(self, stream_id, session_ref)
+            with self._lock:
+                self._streams[stream_id] = stream
+            self.manager.register_unclaimed_stream(stream)
+            return
+
+        with self._lock:
+            stream = self._streams.get(stream_id)
+        if stream is None:
+            return # The stream was already closed locally
+
+        if frame_type == PeerFrameType.ACCEPT:
+            stream.on_accept()
+        elif frame_type == PeerFrameType.DATA:
+            stream.on_data(payload)
+        elif frame_type == PeerFrameType.WINDOW:
+            stream.on_window(int.from_bytes(payload, "big"))
+        elif frame_type == PeerFrameType.CLOSE:
+            stream.on_remote_close()
+
+    def on_writable(self) -> None:
+        with self._lock:
+            # A retried SSL write must have the same size as the one that could not be completed
+            size = self._pending_write or min(len(self._output), MAX_SSL_WRITE)
+            chunk = bytes(self._output[:size])
+
+        if not chunk:
+            return
+
+        try:
+            sent = self.sock.send(chunk)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            self._pending_write = size
+            return
+
+        self._pending_write = 0
+        with self._lock:
+            del self._output[:sent]
+
+    def fail(self, error: Exception) -> None:
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            streams = list(self._streams.values())
+            self._streams.clear()
+
+        for stream in streams:
+            stream.on_channel_error(error)
+
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class MultiplexedPeerConnectionManager(PeerConnectionManager):
+    """Peer connection manager that keeps one persistent TLS channel per peer.
+
+    Peer sessions are PeerStreams inside the channel instead of new TLS connections, so the
+    handshake is only paid the first time a peer is contacted. The streams have credit-based flow
+    control, so a session that does not read cannot block the rest of the channel.
+
+    Each node opens its own channel towards every peer it contacts (streams opened by the peer
+    arrive through the channel the peer opened), so there are at most two channels per pair of nodes.
+    """
+
+    def __init__(
+            self,
+            address: NetworkAddress,
+            cert_config: CertificateConfiguration,
+            config: PeerConnectorConfiguration = PeerConnectorConfiguration()
+        ) -> None:
+
+        self.address = address
+        self.timeout = 10 # Default seconds a peer waits for the other one when connect_peer() has no timeout
+        self.handshake_workers: int = config.handshake_workers
+        self.handshake_timeout: float = config.handshake_timeout
+
+        self._server_ssl_context: SSLContext = create_ssl_context(ssl.Purpose.CLIENT_AUTH, cert_config)
+        self._client_ssl_context: SSLContext = create_ssl_context(ssl.Purpose.SERVER_AUTH, cert_config)
+        self.tls_sessions: TlsSessionCache = TlsSessionCache()
+
+        self._io_thread: threading.Thread = None
+        self._running: bool = False
+        self._selector: selectors.BaseSelector = None
+        self._listening_socket: socket.socket = None
+        self._wakeup_receiver: socket.socket = None
+        self._wakeup_sender: socket.socket = None
+        self._handshake_pool: ThreadPoolExecutor = None
+
+        self._channels_lock: threading.Lock = threading.Lock()
+        self._channels: set[PeerChannel] = set()
+        self._outgoing_channels: dict[NetworkAddress, PeerChannel] = {}
+        self._connect_locks: dict[NetworkAddress, threading.Lock] = {}
+        self._pending_channels: deque[PeerChannel] = deque() # Waiting to be registered by the IO thread
+
+        self._rendezvous: RendezvousTable[PeerStream] = RendezvousTable(config.unclaimed_ttl, PeerStream.close)
+
+    ## Channels ##
+
+    def wakeup(self) -> None:
+        """Makes the IO thread check for new channels and output."""
+        try:
+            self._wakeup_sender.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass # There is already a wakeup pending, or the manager stopped
+
+    def _add_channel(self, channel: PeerChannel) -> None:
+        with self._channels_lock:
+            self._channels.add(channel)
+            self._pending_channels.append(channel)
+        self.wakeup()
+
+    def _remove_channel(self, channel: PeerChannel, error: Exception) -> None:
+        if self._running:
+            log.warning("Peer channel with %s closed: %s", channel.peer_address, error)
+        else:
+            log.info("Peer channel with %s closed: %s", channel.peer_address, error)
+        with self._channels_lock:
+            self._channels.discard(channel)
+            if self._outgoing_channels.get(channel.peer_address) is channel:
+                del self._outgoing_channels[channel.peer_address]
+
+        try:
+            self._selector.unregister(channel.sock)
+        except (KeyError, ValueError, OSError):
+            pass
+        channel.fail(error)
+
+    def _get_outgoing_channel(self, target: NetworkAddress, timeout: float) -> PeerChannel:
+        with self._channels_lock:
+            channel = self._outgoing_channels.get(target)
+            if channel is not None and not channel.closed:
+                return channel
+            connect_lock = self._connect_locks.setdefault(target, threading.Lock())
+
+        # Only one thread connects to each peer, the rest wait and use its channel
+        with connect_lock:
+            with self._channels_lock:
+                channel = self._outgoing_channels.get(target)
+                if channel is not None and not channel.closed:
+                    return channel
+
+            raw_socket = socket.create_connection(target.to_tuple(), timeout=timeout)
+            secure_socket = self._client_ssl_context.wrap_socket(
+                raw_socket, server_hostname=target.host, session=self.tls_sessions.get(target)
+            )
+            self.tls_sessions.record_handshake(secure_socket)
+            secure_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            secure_socket.setblocking(False)
+
+            channel = PeerChannel(self, secure_socket, target, initiator=True)
+            with self._channels_lock:
+                self._outgoing_channels[target] = channel
+            self._add_channel(channel)
+            log.info("Peer channel with %s established.", target)
+            return channel
+
+    def _handshake_incoming(self, raw_socket: socket.socket, addr: tuple[str, int]) -> None:
+        try:
+            raw_socket.settimeout(self.handshake_timeout)
+            secure_socket = self._server_ssl_context.wrap_socket(raw_socket, server_side=True)
+            self.tls_sessions.record_handshake(secure_socket)
+            secure_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            secure_socket.setblocking(False)
+        except Exception as e:
+            log.error("Failed the TLS handshake of the peer channel from %s: %s", addr, e)
+            raw_socket.close()
+            return
+
+        self._add_channel(PeerChannel(self, secure_socket, NetworkAddress.from_tuple(addr), initiator=False))
+        log.info("Accepted peer channel from %s.", addr)
+
+    def register_unclaimed_stream(self, stream: PeerStream) -> None:
+        self._rendezvous.offer(stream.session_ref, stream)
+        log.info("Peer stream with reference %s registered.", stream.session_ref)
+
+    ## IO thread ##
+
+    def _io_loop(self) -> None:
+        log.info("Listening to peers at %s", self.address)
+
+        while self._running:
+            for key, mask in self._selector.select(timeout=1):
+                if key.data == "wakeup":
+                    try:
+                        while self._wakeup_receiver.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+
+                elif key.data == "listen":
+                    try:
+                        raw_socket, addr = self._listening_socket.accept()
+                    except BlockingIOError:
+                        continue
+                    raw_socket.setblocking(True)
+                    self._handshake_pool.submit(self._handshake_incoming, raw_socket, addr)
+
+                else:
+                    channel: PeerChannel = key.data
+                    try:
+                        if mask & selectors.EVENT_READ:
+                            channel.on_readable()
+                        if mask & selectors.EVENT_WRITE and not channel.closed:
+                            channel.on_writable()
+                    except Exception as e:
+                        self._remove_channel(channel, e)
+
+            self._update_registrations()
+
+        with self._channels_lock:
+            channels = list(self._channels)
+        for channel in channels:
+            self._remove_channel(channel, ConnectionError("The peer connection manager stopped."))
+
+    def _update_registrations(self) -> None:
+        with self._channels_lock:
+            while self._pending_channels:
+                channel = self._pending_channels.popleft()
+                if not channel.closed:
+                    self._selector.register(channel.sock, selectors.EVENT_READ, channel)
+            channels = list(self._channels)
+
+        for channel in channels:
+            if channel.closed:
+                continue
+            events = selectors.EVENT_READ
+            if channel.has_output():
+                events |= selectors.EVENT_WRITE
+            try:
+                if self._selector.get_key(channel.sock).events != events:
+                    self._selector.modify(channel.sock, events, channel)
+            except (KeyError, ValueError):
+                pass
+
+    ## PeerConnectionManager ##
+
+    def start_listening(self) -> None:
+        if self._io_thread is not None and self._io_thread.is_alive():
+            log.warning("Cannot start the peer connection manager because it is already started.")
+            return
+
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_receiver.setblocking(False)
+        self._wakeup_sender.setblocking(False)
+        self._selector.register(self._wakeup_receiver, selectors.EVENT_READ, "wakeup")
+
+        self._listening_socket = socket.create_server(self.address.to_tuple())
+        self._listening_socket.setblocking(False)
+        self._selector.register(self._listening_socket, selectors.EVENT_READ, "listen")
+
+        self._handshake_pool = ThreadPoolExecutor(
+            max_workers=self.handshake_workers, thread_name_prefix="peer_handshake"
+        )
+
+        self._running = True
+        self._io_thread = threading.Thread(target=self._io_loop, name="peer_channels_io")
+        self._io_thread.start()
+        log.debug("Peer connection manager IO thread started.")
+
+    def stop_listening(self) -> None:
+        """Stops accepting channels and closes the existing ones (with all their streams)."""
+        if self._io_thread is None or not self._io_thread.is_alive():
+            log.warning("Cannot close the peer connection manager because it is already closed.")
+            return
+
+        self._running = False
+        self.wakeup()
+        self._io_thread.join()
+        self._handshake_pool.shutdown(wait=True)
+        self._rendezvous.close()
+
+        self._selector.close()
+        self._listening_socket.close()
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
+
+        log.info("The peer connection manager has stopped listening as asked.")
+        self._io_thread = None
+
+    def _connect_as_server(self, session_ref: PeerSessionReference, timeout: float) -> PeerStream:
+        log.debug("Starting seach for session with type %s and id %s", session_ref.type, session_ref.id)
+
+        stream = self._rendezvous.claim(session_ref, timeout)
+        if stream is None:
+            log.error("After %s seconds, the client did not connect.", timeout)
+            raise PeerNotConnectedError("The client peer did not start the session")
+
+        stream.settimeout(timeout)
+        stream.channel.send_frame(PeerFrameType.ACCEPT, stream.stream_id)
+        log.info("Peer session %s established with %s.", session_ref, stream.getpeername())
+        return stream
+
+    def _connect_as_client(self, target: NetworkAddress, session_ref: PeerSessionReference, timeout: float) -> PeerStream:
+        log.debug("Preparing for session with type %s and id %s", session_ref.type, session_ref.id)
+
+        deadline = time.monotonic() + timeout
+        channel = self._get_outgoing_channel(target, timeout)
+        stream = channel.open_stream(session_ref)
+
+        if not stream.wait_accepted(max(0.0, deadline - time.monotonic())):
+            stream.close()
+            log.error("After %s seconds, the server did not accept the session.", timeout)
+            raise PeerNotConnectedError("The server peer did not accept the session")
+
+        stream.settimeout(timeout)
+        log.info("Peer session %s established with %s.", session_ref, target)
+        return stream
+
+    def get_metrics(self) -> PeerConnectorMetrics:
+        return PeerConnectorMetrics(tls=self.tls_sessions.get_metrics())
+
+    def connect_peer(
+            self,
+            session_ref: PeerSessionReference,
+            role: ConnectionRole,
+            target: NetworkAddress,
+            timeout: float | None = None
+        ) -> PeerStream:
+
+        if timeout is None:
+            timeout = self.timeout
+
+        if role == ConnectionRole.SERVER:
+            return self._connect_as_server(session_ref, timeout)
+        elif role == ConnectionRole.CLIENT:
+            return self._connect_as_client(target, session_ref, timeout)
+        else:
+            raise ValueError(f"Invalid role. Must be {ConnectionRole.CLIENT} or {ConnectionRole.SERVER}.")
@@ -6,57 +6,112 @@ import threading
 from concurrent.futures import ThreadPoolExecutor
 from ssl import SSLContext
 
-from hybridization_module.model.config import CertificateConfiguration
+from hybridization_module.model.config import CertificateConfiguration, PeerConnectorConfiguration
 from hybridization_module.model.exceptions import PeerNotConnectedError
+from hybridization_module.model.metrics import PeerConnectorMetrics
 from hybridization_module.model.shared_enums import ConnectionRole, PeerSessionType
 from hybridization_module.model.shared_types import NetworkAddress, PeerSessionReference
 from hybridization_module.peer_connector.connector_interface import PeerConnectionManager
+from hybridization_module.peer_connector.rendezvous import RendezvousTable
+from hybridization_module.peer_connector.tls import TlsSessionCache, create_ssl_context
+from hybridization_module.peer_connector.warm_pool import WarmConnectionPool, WarmConnectionWatcher
 
 log = logging.getLogger(__name__)
 
+ACCEPT_MESSAGE = b"ok" # Sent by the server peer when it claims the connection
+WARM_MESSAGE = json.dumps({"session_type": PeerSessionType.WARM.value, "id": "warm"}).encode()
+
 class PeerToPeerConnectionManager(PeerConnectionManager):
 
-    def __init__(self, address: NetworkAddress, cert_config: CertificateConfiguration) -> None:
+    def __init__(
+            self,
+            address: NetworkAddress,
+            cert_config: CertificateConfiguration,
+            config: PeerConnectorConfiguration = PeerConnectorConfiguration()
+        ) -> None:
 
         self.address = address
-        self.timeout = 10 # Seconds the receiving peer (get_data) will wait for a message until it throws an exception
+        self.timeout = 10 # Default seconds a peer waits for the other one when connect_peer() has no timeout
+        self.handshake_workers: int = config.handshake_workers
+        self.handshake_timeout: float = config.handshake_timeout
+        self.warm_idle_timeout: float = config.warm_idle_timeout
 
         self._listening_thread: threading.Thread = None
         self._continue_listening: bool = False
 
-        self._unclaimed_sockets: dict[PeerSessionReference, socket.socket] = {}
-        self._sockets_dict_cond_lock: threading.Condition = threading.Condition()
+        self._rendezvous: RendezvousTable[socket.socket] = RendezvousTable(config.unclaimed_ttl, socket.socket.close)
+
+        self._server_ssl_context: SSLContext = create_ssl_context(ssl.Purpose.CLIENT_AUTH, cert_config)
+        self._client_ssl_context: SSLContext = create_ssl_context(ssl.Purpose.SERVER_AUTH, cert_config)
+        self._tls_sessions: TlsSessionCache = TlsSessionCache()
+
+        self._warm_pool: WarmConnectionPool | None = None
+        if config.warm_pool_max_size > 0:
+            self._warm_pool = WarmConnectionPool(self._open_warm_connection, config)
+        self._warm_watcher: WarmConnectionWatcher = None
+
 
-        self._server_ssl_context: SSLContext = self._setup_ssl_context(ssl.Purpose.CLIENT_AUTH, cert_config)
-        self._client_ssl_context: SSLContext = self._setup_ssl_context(ssl.Purpose.SERVER_AUTH, cert_config)
+    def _process_peer_connection(self, connection_socket: socket.socket, addr: tuple[str, int]) -> None:
+        """Does the TLS handshake of an accepted socket and reads the reference sent by the peer.
+
+        Both the handshake and the reference have to arrive within handshake_timeout, so a slow peer
+        only holds one of the handshake workers for a limited time.
+        """
+        try:
+            connection_socket.settimeout(self.handshake_timeout)
+            new_socket = self._server_ssl_context.wrap_socket(connection_socket, server_side=True)
+            self._tls_sessions.record_handshake(new_socket)
+            log.debug("Accepted client connection from %s (TLS session resumed: %s).", addr, new_socket.session_reused)
+        except Exception as e:
+            log.error("Failed to accept client connection from %s: %s", addr, e)
+            connection_socket.close()
+            return
 
+        self._read_session_reference(new_socket, addr)
 
-    def _setup_ssl_context(self, ssl_purpose: ssl.Purpose, cert_config: CertificateConfiguration) -> SSLContext:
-        context = ssl.create_default_context(ssl_purpose)
-        context.load_cert_chain(certfile=cert_config.cert_path, keyfile=cert_config.key_path)
-        context.load_verify_locations(cert_config.cert_authority_path)
-        context.verify_mode = ssl.CERT_REQUIRED
-        return context
 
-    def _process_peer_connection(self, new_socket: socket.socket) -> None:
-        encoded_message = new_socket.recv(1024)
-        json_message = json.loads(encoded_message.decode())
-        log.debug("Received the following JSON: %s", json_message)
-        session_type = PeerSessionType(json_message["session_type"])
+    def _read_session_reference(self, new_socket: ssl.SSLSocket, addr: tuple[str, int]) -> None:
+        """Reads the reference of the peer session and registers the socket with it."""
+        try:
+            new_socket.settimeout(self.handshake_timeout)
+            encoded_message = new_socket.recv(1024)
+            if not encoded_message:
+                log.debug("The peer %s closed the connection before starting a session.", addr)
+                new_socket.close()
+                return
+
+            json_message = json.loads(encoded_message.decode())
+            log.debug("Received the following JSON: %s", json_message)
+            session_type = PeerSessionType(json_message["session_type"])
+
+            if session_type == PeerSessionType.WARM:
+                # The peer keeps it in its warm pool, wait for the reference without holding a worker
+                new_socket.sendall(ACCEPT_MESSAGE)
+                new_socket.settimeout(None)
+                self._warm_watcher.watch(new_socket, addr)
+                return
+        except Exception as e:
+            log.error("Failed to process client connection from %s: %s", addr, e)
+            new_socket.close()
+            return
 
         if session_type == PeerSessionType.BLINK:
             log.debug("The peer connection server blinked.")
             return
 
+        new_socket.settimeout(None) # connect_peer() sets the timeout of the session
         message_ref = PeerSessionReference(type=session_type, id=json_message["id"])
-        with self._sockets_dict_cond_lock:
-            self._unclaimed_sockets[message_ref] = new_socket
-            log.info("Peer connection with reference %s registered.", message_ref)
-            self._sockets_dict_cond_lock.notify_all()
+        self._rendezvous.offer(message_ref, new_socket)
+        log.info("Peer connection with reference %s registered.", message_ref)
 
 
     def _listen_to_peers(self) -> None:
-        peer_listener_thread_pool = ThreadPoolExecutor(max_workers=5, thread_name_prefix="peer_connection")
+        peer_listener_thread_pool = ThreadPoolExecutor(
+            max_workers=self.handshake_workers, thread_name_prefix="peer_connection"
+        )
+        self._warm_watcher = WarmConnectionWatcher(
+            peer_listener_thread_pool, self._read_session_reference, self.warm_idle_timeout
+        )
 
         log.info("Listening to peers at %s", self.address)
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
@@ -64,37 +119,63 @@ class PeerToPeerConnectionManager(PeerConnectionManager):
             sock.listen()
             while self._continue_listening:
                 try:
+                    # The handshakes are done by the workers, so a slow peer cannot stop the accept loop
                     connection_socket, addr = sock.accept()
-                    secure_socket = self._server_ssl_context.wrap_socket(connection_socket, server_side=True)
-                    log.debug("Accepted client connection.")
-
-                    peer_listener_thread_pool.submit(self._process_peer_connection, secure_socket)
+                    peer_listener_thread_pool.submit(self._process_peer_connection, connection_socket, addr)
                 except Exception as e:
-                    log.error("Failed to accept or process client connection: %s", e)
+                    log.error("Failed to accept client connection: %s", e)
 
+        self._warm_watcher.stop()
         peer_listener_thread_pool.shutdown(wait=True)
 
 
-    def _connect_as_server(self, session_ref: PeerSessionReference) -> socket.socket:
+    def _connect_as_server(self, session_ref: PeerSessionReference, timeout: float) -> socket.socket:
         log.debug("Starting seach for session with type %s and id %s", session_ref.type, session_ref.id)
 
-        with self._sockets_dict_cond_lock:
-            self._sockets_dict_cond_lock.wait_for(lambda: session_ref in self._unclaimed_sockets, timeout=self.timeout)
-
-            if session_ref in self._unclaimed_sockets:
-                log.debug("Found a socket matching the type %s and id %s.", session_ref.type, session_ref.id)
-                secure_socket = self._unclaimed_sockets.pop(session_ref)
+        secure_socket = self._rendezvous.claim(session_ref, timeout)
+        if secure_socket is not None:
+            log.debug("Found a socket matching the type %s and id %s.", session_ref.type, session_ref.id)
 
-                secure_socket.settimeout(self.timeout)
-                secure_socket.sendall("ok".encode())
-                log.info("Peer session %s established with %s.", session_ref, secure_socket.getpeername())
-                return secure_socket
+            secure_socket.settimeout(timeout)
+            secure_socket.sendall(ACCEPT_MESSAGE)
+            log.info("Peer session %s established with %s.", session_ref, secure_socket.getpeername())
+            return secure_socket
 
-        log.error("After %s seconds, the client did not connect.", self.timeout)
+        log.error("After %s seconds, the client did not connect.", timeout)
         raise PeerNotConnectedError("The client peer did not start the session")
 
 
-    def _connect_as_client(self, target: NetworkAddress, session_ref: PeerSessionReference) -> socket.socket:
+    def _open_connection(self, target: NetworkAddress, timeout: float) -> ssl.SSLSocket:
+        raw_socket = socket.create_connection(target.to_tuple(), timeout=timeout)
+        secure_socket = self._client_ssl_context.wrap_socket(
+            raw_socket, server_hostname=target.host, session=self._tls_sessions.get(target)
+        )
+        self._tls_sessions.record_handshake(secure_socket)
+        return secure_socket
+
+    def _open_warm_connection(self, target: NetworkAddress) -> ssl.SSLSocket:
+        """Opens a connection for the warm pool, the peer waits for its session reference until it is used."""
+        secure_socket = self._open_connection(target, self.handshake_timeout)
+        try:
+            self._send_session_reference(secure_socket, WARM_MESSAGE)
+            self._tls_sessions.store(target, secure_socket)
+        except Exception:
+            secure_socket.close()
+            raise
+
+        secure_socket.settimeout(None)
+        return secure_socket
+
+    def _send_session_reference(self, secure_socket: ssl.SSLSocket, encoded_message: bytes) -> bool:
+        """Sends the reference of the session and waits for the answer of the peer.
+
+        Returns:
+            bool: False if the peer closed the connection instead of answering.
+        """
+        secure_socket.sendall(encoded_message)
+        return bool(secure_socket.recv(256))
+
+    def _connect_as_client(self, target: NetworkAddress, session_ref: PeerSessionReference, timeout: float) -> socket.socket:
 
         log.debug("Preparing for session with type %s and id %s", session_ref.type, session_ref.id)
         message = {
@@ -103,17 +184,35 @@ class PeerToPeerConnectionManager(PeerConnectionManager):
         }
         encoded_message = json.dumps(message).encode()
 
-        raw_socket = socket.create_connection(target.to_tuple())
-        secure_socket = self._client_ssl_context.wrap_socket(raw_socket, server_hostname=target.host)
-        secure_socket.settimeout(self.timeout)
+        warm_socket = self._warm_pool.take(target) if self._warm_pool is not None else None
+        if warm_socket is not None:
+            try:
+                warm_socket.settimeout(timeout)
+                log.debug("Sending server peer reference to server through a warm connection: %s", message)
+                if self._send_session_reference(warm_socket, encoded_message):
+                    log.info("Peer session %s established with %s (warm connection).", session_ref, target)
+                    return warm_socket
+            except TimeoutError:
+                warm_socket.close() # The peer did not claim the session, a new connection would not help
+                raise
+            except OSError as e:
+                log.debug("The warm connection with %s failed, opening a new one: %s", target, e)
+            warm_socket.close()
+
+        secure_socket = self._open_connection(target, timeout)
 
         log.debug("Sending server peer reference to server: %s", message)
-        secure_socket.sendall(encoded_message)
-        secure_socket.recv(256)
+        self._send_session_reference(secure_socket, encoded_message)
+        # The session ticket arrives after the handshake, so it is available once the answer is read
+        self._tls_sessions.store(target, secure_socket)
 
         log.info("Peer session %s established with %s.", session_ref, target)
         return secure_socket
 
+    def set_trusted_peers(self, addresses: list[NetworkAddress]) -> None:
+        if self._warm_pool is not None:
+            self._warm_pool.set_peers(addresses)
+
     def start_listening(self) -> None:
         if self._listening_thread is not None and self._listening_thread.is_alive():
             log.warning("Cannot start the peer connection manager because it is already started.")
@@ -125,6 +224,8 @@ class PeerToPeerConnectionManager(PeerConnectionManager):
 
         self._continue_listening = True
         self._listening_thread.start()
+        if self._warm_pool is not None:
+            self._warm_pool.start()
         log.debug("Peer connection manager listener thread started.")
 
     def stop_listening(self) -> None:
@@ -132,23 +233,43 @@ class PeerToPeerConnectionManager(PeerConnectionManager):
             log.warning("Cannot close the peer connection manager because it is already closed.")
             return
 
+        if self._warm_pool is not None:
+            self._warm_pool.stop()
+
         self._continue_listening = False
         try:
-            sock = self._connect_as_client(self.address, PeerSessionReference(type=PeerSessionType.BLINK, id="blink"))
+            sock = self._connect_as_client(
+                self.address, PeerSessionReference(type=PeerSessionType.BLINK, id="blink"), self.timeout
+            )
             sock.close()
         except ssl.SSLCertVerificationError as e:
             log.warning(f"The ssl verification during peer connector close failed, but the thread should have been closed. Error message: {e}")
 
         self._listening_thread.join()
+        self._rendezvous.close()
         log.info("The peer connection manager has stopped listening as asked.")
         self._listening_thread = None
 
-    def connect_peer(self, session_ref: PeerSessionReference, role: ConnectionRole, target: NetworkAddress) -> socket.socket:
+    def connect_peer(
+            self,
+            session_ref: PeerSessionReference,
+            role: ConnectionRole,
+            target: NetworkAddress,
+            timeout: float | None = None
+        ) -> socket.socket:
+
+        if timeout is None:
+            timeout = self.timeout
 
         if role == ConnectionRole.SERVER:
-            return self._connect_as_server(session_ref)
+            return self._connect_as_server(session_ref, timeout)
         elif role == ConnectionRole.CLIENT:
-            return self._connect_as_client(target, session_ref)
+            return self._connect_as_client(target, session_ref, timeout)
         else:
             raise ValueError(f"Invalid role. Must be {ConnectionRole.CLIENT} or {ConnectionRole.SERVER}.")
 
+    def get_metrics(self) -> PeerConnectorMetrics:
+        return PeerConnectorMetrics(
+            tls=self._tls_sessions.get_metrics(),
+            warm_pool=self._warm_pool.get_metrics() if self._warm_pool is not None else None,
+        )
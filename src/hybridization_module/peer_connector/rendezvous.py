@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Generic, TypeVar
+
+from hybridization_module.model.exceptions import PeerNotConnectedError
+from hybridization_module.model.shared_types import PeerSessionReference
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RendezvousTable(Generic[T]):
+    """Meeting point between the connections that peers open and the sessions that claim them.
+
+    Each session waiting for a connection gets its own future, so a new connection only wakes up
+    the session it belongs to. Connections that arrive before their session are kept until it
+    claims them, or evicted (and closed with on_evict) once they have waited for longer than ttl,
+    by a timer that only runs while there are unclaimed connections.
+    """
+
+    def __init__(self, ttl: float, on_evict: Callable[[T], None]) -> None:
+        """
+        Args:
+            ttl (float): Seconds a connection is kept if no session claims it.
+            on_evict (Callable[[T], None]): Called with the connections that are evicted.
+        """
+        self.ttl: float = ttl
+        self._on_evict: Callable[[T], None] = on_evict
+
+        self._lock: threading.Lock = threading.Lock()
+        self._waiters: dict[PeerSessionReference, Future] = {}
+        self._unclaimed: dict[PeerSessionReference, tuple[T, float]] = {} # Connection and arrival time
+        self._sweep_timer: threading.Timer | None = None
+
+    def _pop_expired(self) -> list[T]:
+        """Removes the unclaimed connections older than ttl (lock must be held)."""
+        expiration = time.monotonic() - self.ttl
+        expired_refs = [ref for ref, (_, arrival) in self._unclaimed.items() if arrival <= expiration]
+        return [self._unclaimed.pop(ref)[0] for ref in expired_refs]
+
+    def _schedule_sweep(self) -> None:
+        """Starts the timer that evicts the oldest unclaimed connection when it expires (lock must be held)."""
+        if self._sweep_timer is not None or not self._unclaimed:
+            return
+
+        oldest_arrival = min(arrival for _, arrival in self._unclaimed.values())
+        self._sweep_timer = threading.Timer(max(0.0, oldest_arrival + self.ttl - time.monotonic()), self._sweep)
+        self._sweep_timer.daemon = True
+        self._sweep_timer.start()
+
+    def _sweep(self) -> None:
+        with self._lock:
+            self._sweep_timer = None
+            expired = self._pop_expired()
+            self._schedule_sweep()
+
+        self._evict(expired)
+
+    def _evict(self, connections: list[T]) -> None:
+        for connection in connections:
+            log.warning("Evicting a peer connection that no session claimed in %s seconds.", self.ttl)
+            try:
+                self._on_evict(connection)
+            except Exception as e:
+                log.debug("Error evicting a peer connection: %s", e)
+
+    def offer(self, session_ref: PeerSessionReference, connection: T) -> None:
+        """Hands the connection to the session waiting for session_ref, or keeps it until it is claimed."""
+        with self._lock:
+            expired = self._pop_expired()
+            waiter = self._waiters.pop(session_ref, None)
+
+            replaced = None
+            if waiter is None:
+                replaced = self._unclaimed.pop(session_ref, None)
+                self._unclaimed[session_ref] = (connection, time.monotonic())
+                self._schedule_sweep()
+            else:
+                waiter.set_result(connection)
+
+        self._evict(expired)
+        if replaced is not None:
+            log.warning("A new peer connection with reference %s replaced the unclaimed one.", session_ref)
+            self._on_evict(replaced[0])
+
+    def claim(self, session_ref: PeerSessionReference, timeout: float | None) -> T | None:
+        """Waits for the connection with session_ref.
+
+        Returns:
+            T | None: The connection, or None if it did not arrive within timeout.
+
+        Raises:
+            PeerNotConnectedError: If another session is already waiting for session_ref.
+        """
+        duplicate = False
+        with self._lock:
+            expired = self._pop_expired()
+            unclaimed = self._unclaimed.pop(session_ref, None)
+            if unclaimed is None:
+                duplicate = session_ref in self._waiters
+                if not duplicate:
+                    waiter = self._waiters[session_ref] = Future()
+
+        self._evict(expired)
+        if unclaimed is not None:
+            return unclaimed[0]
+        if duplicate:
+            # Both sessions would get the same connection
+            raise PeerNotConnectedError(f"Another session is already waiting for the peer connection {session_ref}.")
+
+        try:
+            return waiter.result(timeout)
+        except TimeoutError:
+            pass
+
+        with self._lock:
+            if self._waiters.get(session_ref) is waiter:
+                del self._waiters[session_ref]
+
+        # The connection may have arrived right after the timeout
+        return waiter.result() if waiter.done() else None
+
+    def close(self) -> None:
+        """Stops the eviction timer and evicts every unclaimed connection."""
+        with self._lock:
+            if self._sweep_timer is not None:
+                self._sweep_timer.cancel()
+                self._sweep_timer = None
+            unclaimed = [connection for connection, _ in self._unclaimed.values()]
+            self._unclaimed.clear()
+
+        for connection in unclaimed:
+            try:
+                self._on_evict(connection)
+            except Exception as e:
+                log.debug("Error closing an unclaimed peer connection: %s", e)
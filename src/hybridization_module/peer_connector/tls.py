@@ -0,0 +1,94 @@
+import ssl
+import threading
+from ssl import SSLContext, SSLObject, SSLSession, SSLSocket
+
+from hybridization_module.model.config import CertificateConfiguration
+from hybridization_module.model.metrics import TlsSessionMetrics
+from hybridization_module.model.shared_types import NetworkAddress
+
+SESSION_TICKETS = 2 # Tickets the server sends after each handshake (TLS 1.3)
+
+
+def create_ssl_context(ssl_purpose: ssl.Purpose, cert_config: CertificateConfiguration) -> SSLContext:
+    """Creates the mutual TLS context used between hybridization modules.
+
+    Args:
+        ssl_purpose (ssl.Purpose): CLIENT_AUTH for the context of the listening side, SERVER_AUTH
+            for the context of the connecting side.
+        cert_config (CertificateConfiguration): The certificates of the node and its CA.
+    """
+    context = ssl.create_default_context(ssl_purpose)
+    context.load_cert_chain(certfile=cert_config.cert_path, keyfile=cert_config.key_path)
+    context.load_verify_locations(cert_config.cert_authority_path)
+    context.verify_mode = ssl.CERT_REQUIRED
+
+    if ssl_purpose == ssl.Purpose.CLIENT_AUTH:
+        # Allow the peers to resume their sessions with the tickets instead of a full handshake
+        context.options &= ~ssl.OP_NO_TICKET
+        context.num_tickets = SESSION_TICKETS
+
+    return context
+
+
+class TlsSessionCache:
+    """Last TLS session obtained from each peer, so that new connections resume it.
+
+    A resumed handshake skips the certificate chain verification and the key exchange of a full
+    one. If the peer no longer accepts the session (for example, because it restarted), the
+    handshake silently falls back to a full one and the new session replaces the cached one.
+
+    It also counts the handshakes done by the peer connector, as clients and as servers.
+    """
+
+    def __init__(self) -> None:
+        self._lock: threading.Lock = threading.Lock()
+        self._sessions: dict[NetworkAddress, SSLSession] = {}
+
+        self._client_handshakes: int = 0
+        self._client_resumed: int = 0
+        self._server_handshakes: int = 0
+        self._server_resumed: int = 0
+
+    def get(self, target: NetworkAddress) -> SSLSession | None:
+        """Returns the session to resume with target, to be passed to SSLContext.wrap_socket()."""
+        with self._lock:
+            return self._sessions.get(target)
+
+    def store(self, target: NetworkAddress, secure_socket: SSLSocket) -> bool:
+        """Caches the session of a client socket.
+
+        With TLS 1.3 the server sends the session tickets after the handshake, so this has to be
+        called once something has been read from the socket.
+
+        Returns:
+            bool: Whether the socket had a resumable session.
+        """
+        session = secure_socket.session
+        if session is None or not session.has_ticket:
+            return False
+
+        with self._lock:
+            self._sessions[target] = session
+        return True
+
+    def record_handshake(self, secure_socket: SSLSocket | SSLObject) -> None:
+        with self._lock:
+            if secure_socket.server_side:
+                self._server_handshakes += 1
+                self._server_resumed += secure_socket.session_reused
+            else:
+                self._client_handshakes += 1
+                self._client_resumed += secure_socket.session_reused
+
+    def get_metrics(self) -> TlsSessionMetrics:
+        with self._lock:
+            handshakes = self._client_handshakes + self._server_handshakes
+            resumed = self._client_resumed + self._server_resumed
+            return TlsSessionMetrics(
+                client_handshakes=self._client_handshakes,
+                client_resumed=self._client_resumed,
+                server_handshakes=self._server_handshakes,
+                server_resumed=self._server_resumed,
+                resumption_rate=resumed / handshakes if handshakes else 0.0,
+                cached_sessions=len(self._sessions),
+            )
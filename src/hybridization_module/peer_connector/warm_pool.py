@@ -0,0 +1,237 @@
+import logging
+import math
+import select
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Executor
+
+from hybridization_module.model.config import PeerConnectorConfiguration
+from hybridization_module.model.metrics import WarmPoolMetrics
+from hybridization_module.model.shared_types import NetworkAddress
+
+log = logging.getLogger(__name__)
+
+RATE_WINDOW = 10 # Seconds of claims used to estimate the connection rate of each peer
+DEMAND_HORIZON = 2 # The pool of a peer keeps the connections claimed in this many seconds at the current rate
+REFILL_INTERVAL = 1 # Seconds between checks of the pools when nothing wakes up the refill thread
+
+
+def is_idle_connection_healthy(sock: socket.socket) -> bool:
+    """Checks, without blocking, that the peer has not closed an idle connection.
+
+    Nothing should arrive through an idle connection, so if it is readable the peer closed it.
+    """
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+
+class _PeerWarmPool:
+    def __init__(self) -> None:
+        self.connections: deque[tuple[socket.socket, float]] = deque() # Connection and creation time
+        self.claims: deque[float] = deque() # When each connection (warm or not) was claimed
+        self.target_size: int = 0
+
+
+class WarmConnectionPool:
+    """Client connections to the trusted peers that are established before the sessions need them.
+
+    The connections are already connected and authenticated (TLS handshake done), so a session only
+    has to send its reference through one to start. A background thread refills the pool of each
+    peer, whose size follows the rate at which connections to that peer are claimed (between the
+    minimum and the maximum size of the configuration). Warm connections not used within the idle
+    timeout are replaced, so the peer does not close them first.
+    """
+
+    def __init__(
+            self,
+            connect: Callable[[NetworkAddress], socket.socket],
+            config: PeerConnectorConfiguration
+        ) -> None:
+        """
+        Args:
+            connect (Callable[[NetworkAddress], socket.socket]): Opens a new warm connection to a peer.
+            config (PeerConnectorConfiguration): Sizes and idle timeout of the pools.
+        """
+        self.min_size: int = config.warm_pool_min_size
+        self.max_size: int = config.warm_pool_max_size
+        self.idle_timeout: float = config.warm_idle_timeout
+        self._connect: Callable[[NetworkAddress], socket.socket] = connect
+
+        self._condition: threading.Condition = threading.Condition()
+        self._pools: dict[NetworkAddress, _PeerWarmPool] = {}
+        self._running: bool = False
+        self._refill_thread: threading.Thread = None
+
+        self._hits: int = 0
+        self._misses: int = 0
+        self._failed: int = 0
+
+    def set_peers(self, addresses: list[NetworkAddress]) -> None:
+        """Sets the peers the pool keeps connections to."""
+        with self._condition:
+            for address in addresses:
+                self._pools.setdefault(address, _PeerWarmPool())
+            self._condition.notify_all()
+
+    def take(self, target: NetworkAddress) -> socket.socket | None:
+        """Returns a healthy warm connection to target, or None if there are none."""
+        with self._condition:
+            pool = self._pools.get(target)
+            if pool is None:
+                return None
+
+            pool.claims.append(time.monotonic())
+            self._condition.notify_all()
+
+            while pool.connections:
+                sock, _ = pool.connections.popleft()
+                if is_idle_connection_healthy(sock):
+                    self._hits += 1
+                    return sock
+                sock.close()
+
+            self._misses += 1
+            return None
+
+    def _update_target_size(self, pool: _PeerWarmPool, now: float) -> None:
+        """Sizes the pool for the connections claimed in DEMAND_HORIZON at the current rate (lock must be held)."""
+        while pool.claims and now - pool.claims[0] > RATE_WINDOW:
+            pool.claims.popleft()
+
+        rate = len(pool.claims) / RATE_WINDOW
+        pool.target_size = max(self.min_size, min(self.max_size, math.ceil(rate * DEMAND_HORIZON)))
+
+    def _pending_connections(self) -> list[NetworkAddress]:
+        """Drops the expired connections and returns a target for each connection missing (lock must be held)."""
+        now = time.monotonic()
+        missing = []
+        for address, pool in self._pools.items():
+            while pool.connections and now - pool.connections[0][1] > self.idle_timeout:
+                pool.connections.popleft()[0].close()
+
+            self._update_target_size(pool, now)
+            missing += [address] * (pool.target_size - len(pool.connections))
+        return missing
+
+    def _refill(self) -> None:
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                missing = self._pending_connections()
+                if not missing:
+                    self._condition.wait(REFILL_INTERVAL)
+                    continue
+
+            failures = 0
+            for address in missing:
+                try:
+                    sock = self._connect(address)
+                except Exception as e:
+                    log.debug("Failed to open a warm connection to %s: %s", address, e)
+                    failures += 1
+                    with self._condition:
+                        self._failed += 1
+                    continue
+
+                with self._condition:
+                    if not self._running:
+                        sock.close()
+                        return
+                    self._pools[address].connections.append((sock, time.monotonic()))
+
+            if failures:
+                with self._condition:
+                    self._condition.wait(REFILL_INTERVAL) # Do not retry unreachable peers in a loop
+
+    def start(self) -> None:
+        with self._condition:
+            self._running = True
+        self._refill_thread = threading.Thread(target=self._refill, name="peer_warm_pool")
+        self._refill_thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            for pool in self._pools.values():
+                for sock, _ in pool.connections:
+                    sock.close()
+                pool.connections.clear()
+            self._condition.notify_all()
+
+        if self._refill_thread is not None:
+            self._refill_thread.join()
+            self._refill_thread = None
+
+    def get_metrics(self) -> WarmPoolMetrics:
+        with self._condition:
+            return WarmPoolMetrics(
+                hits=self._hits,
+                misses=self._misses,
+                failed=self._failed,
+                idle={str(address): len(pool.connections) for address, pool in self._pools.items()},
+                target_size={str(address): pool.target_size for address, pool in self._pools.items()},
+            )
+
+
+class WarmConnectionWatcher:
+    """Server side of the warm connections: waits, in a single thread, for their session reference.
+
+    The idle warm connections of the peers do not hold a worker each. When one becomes readable
+    (its session reference arrived or the peer closed it) it is handed to process in the executor.
+    """
+
+    def __init__(
+            self,
+            executor: Executor,
+            process: Callable[[socket.socket, tuple[str, int]], None],
+            idle_timeout: float
+        ) -> None:
+        self._executor: Executor = executor
+        self._process: Callable[[socket.socket, tuple[str, int]], None] = process
+        self.idle_timeout: float = idle_timeout
+
+        self._lock: threading.Lock = threading.Lock()
+        self._selector: selectors.BaseSelector = selectors.DefaultSelector()
+        self._running: bool = True
+        self._thread: threading.Thread = threading.Thread(target=self._watch, name="peer_warm_watcher")
+        self._thread.start()
+
+    def watch(self, sock: socket.socket, addr: tuple[str, int]) -> None:
+        with self._lock:
+            if not self._running:
+                sock.close()
+                return
+            self._selector.register(sock, selectors.EVENT_READ, (addr, time.monotonic()))
+
+    def _watch(self) -> None:
+        while self._running:
+            now = time.monotonic()
+            for key, _ in self._selector.select(timeout=0.1):
+                with self._lock:
+                    self._selector.unregister(key.fileobj)
+                self._executor.submit(self._process, key.fileobj, key.data[0])
+
+            # The client replaces its warm connections after its own idle timeout, close the forgotten ones
+            with self._lock:
+                for key in list(self._selector.get_map().values()):
+                    if now - key.data[1] > 2 * self.idle_timeout:
+                        self._selector.unregister(key.fileobj)
+                        key.fileobj.close()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._running = False
+        self._thread.join()
+
+        with self._lock:
+            for key in list(self._selector.get_map().values()):
+                key.fileobj.close()
+            self._selector.close()
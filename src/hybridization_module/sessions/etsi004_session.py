@@ -1,27 +1,46 @@
 #kdfix/interface/interface_etsi004.py
 
 
+import json
 import logging
-import threading
+import struct
 import uuid
-
-from hybridization_module.hybridization_functions.hmac import hmac_kdf
-from hybridization_module.hybridization_functions.xorhmac import xorhmac_kdf
-from hybridization_module.hybridization_functions.xoring import xoring_kdf
+from collections.abc import Callable
+from concurrent.futures import Future, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from hybridization_module.hybridization_functions.batcher import HybridizationBatcher
+from hybridization_module.hybridization_functions.registry import (
+    check_chunk_size,
+    get_hybridization_function,
+)
+from hybridization_module.key_generation.kem_context_pool import KemContextPool
+from hybridization_module.key_generation.kem_keypair_pool import KemKeypairPool
+from hybridization_module.key_generation.kem_process_pool import KemProcessPool
 from hybridization_module.key_generation.key_source_interface import KeySource
-from hybridization_module.key_generation.key_source_threads import (
-    handle_close_thread,
-    handle_get_key_thread,
-    handle_open_connect_thread,
+from hybridization_module.key_generation.key_source_operations import (
+    handle_close,
+    handle_get_key,
+    handle_get_keys,
+    handle_open_connect,
 )
+from hybridization_module.key_generation.kms_connection_pool import KmsConnectionPool
+from hybridization_module.key_generation.source_executor import SourceOperationExecutor
 from hybridization_module.key_generation.sources.pqc_source import PQCSource
 from hybridization_module.key_generation.sources.qkd_source import QKDSource
 from hybridization_module.model.config import GeneralConfiguration, PeerInfo
 from hybridization_module.model.converters import KEY_ALGORITHM_TO_KEY_TYPE
-from hybridization_module.model.exceptions import PeerNotConnectedError
+from hybridization_module.model.exceptions import (
+    DeadlineExceededError,
+    KeyIndexError,
+    PeerNotConnectedError,
+    PeerOptionsMismatchError,
+    SessionDesynchronizedError,
+)
 from hybridization_module.model.requests import (
     CloseRequest,
     GetKeyRequest,
+    GetKeysRequest,
     OpenConnectQos,
     OpenConnectRequest,
     OpenConnectUriParameters,
@@ -29,15 +48,25 @@ from hybridization_module.model.requests import (
 from hybridization_module.model.shared_enums import (
     ConnectionRole,
     HybridizationMethod,
+    KeyBufferEncoding,
     KeyExtractionAlgorithm,
     KeyType,
     PeerSessionType,
 )
 from hybridization_module.model.shared_types import NetworkAddress, PeerSessionReference
 from hybridization_module.peer_connector.connector_interface import PeerConnectionManager
+from hybridization_module.sessions.indexed_key_store import IndexedKeyStore
+from hybridization_module.sessions.key_prefetcher import HybridKeyPrefetcher
+from hybridization_module.utils.deadline import Deadline
+from hybridization_module.utils.io_utils import receive_nbytes
+from hybridization_module.utils.key_formatting import encode_key_buffer
 
 log = logging.getLogger(__name__)
 
+PEER_OPTIONS_HEADER = struct.Struct("!H") # Size of the peer options sent after the ksid
+PEER_OPTIONS_ACCEPTED = b"\x00"
+PEER_OPTIONS_REJECTED = b"\x01"
+
 class Etsi004Session:
 
     ### Initialization ###
@@ -47,6 +76,12 @@ class Etsi004Session:
             node_config: GeneralConfiguration,
             peers_info: dict[str, PeerInfo],
             peer_manager: PeerConnectionManager,
+            source_executor: SourceOperationExecutor,
+            kms_pool: KmsConnectionPool,
+            kem_keypair_pool: KemKeypairPool,
+            kem_processes: KemProcessPool,
+            kem_contexts: KemContextPool,
+            hybridization_batcher: HybridizationBatcher | None,
             uri_params: OpenConnectUriParameters
         ) -> None:
         """
@@ -92,7 +127,7 @@ class Etsi004Session:
 
 
             if key_type == KeyType.QKD:
-                key_source = QKDSource(uri_params, node_config.qkd_address)
+                key_source = QKDSource(uri_params, kms_pool, node_config.mock_qkd)
 
             elif key_type == KeyType.PQC:
                 key_source = PQCSource(
@@ -100,7 +135,10 @@ class Etsi004Session:
                     peer_address=peer.address,
                     role=connection_role,
                     kem_algorithm=key_algorithm,
-                    kem_appearance_index=algorithm_appearances[key_algorithm]
+                    kem_appearance_index=algorithm_appearances[key_algorithm],
+                    keypair_pool=kem_keypair_pool,
+                    kem_processes=kem_processes,
+                    kem_contexts=kem_contexts
                 )
 
             else:
@@ -118,34 +156,138 @@ class Etsi004Session:
         ## Initializing instance variables
 
         self.peer_manager: PeerConnectionManager = peer_manager
+        self.source_executor: SourceOperationExecutor = source_executor
+        self.hybridization_batcher: HybridizationBatcher | None = hybridization_batcher
         self.role: ConnectionRole = connection_role
         self.peer: PeerInfo = peer
 
         self.qos: OpenConnectQos = None
+        self.timeout: float = node_config.session_config.default_timeout # Seconds each request can take
+        self.key_stream_id: str = None
+        self.prefetcher: HybridKeyPrefetcher = None
+        self.key_store: IndexedKeyStore = IndexedKeyStore(node_config.session_config.key_store_window)
         self.key_sources: dict[str, KeySource] = key_sources
         self.hybrid_method: HybridizationMethod = uri_params.hybrid_method
+        self.key_buffer_encoding: KeyBufferEncoding = KeyBufferEncoding.LIST
+        self.desync_reason: str | None = None # Set once the session is torn down
         log.debug("Etsi004Session initialized.")
 
+    ### Source operations ###
+
+    def _new_deadline(self) -> Deadline:
+        return Deadline(self.timeout)
+
+    def _run_on_sources(
+            self,
+            operation: Callable[..., object],
+            *args: object,
+            deadline: Deadline,
+            tear_down_on_timeout: bool = True
+        ) -> dict[str, object]:
+        """
+        Runs operation(key_source, *args) for every key source concurrently in the node source executor.
+
+        It only waits until the deadline. A source that has not finished by then may still consume its key
+        afterwards, and the peer cannot know which sources finished here, so the session can no longer
+        derive the same keys as its peer: the whole session is torn down and the request fails.
+
+        Args:
+            operation (Callable): One of the key_source_operations handlers.
+            *args: Arguments for the operation after the key source.
+            deadline (Deadline): Deadline of the request the operation belongs to.
+            tear_down_on_timeout (bool): Whether to tear down the session if a source does not finish in time.
+
+        Returns:
+            dict[str, object]: The results of the sources that succeeded, indexed by source id.
+
+        Raises:
+            DeadlineExceededError: If a source did not finish in time (and tear_down_on_timeout is set).
+        """
+        futures: dict[str, Future] = {}
+        for key_source_id, key_source in self.key_sources.items():
+            log.debug("Submitting %s for %s", operation.__name__, key_source_id)
+            futures[key_source_id] = self.source_executor.submit(key_source, operation, key_source, *args)
+
+        _, not_done = wait(futures.values(), timeout=deadline.remaining())
+
+        timed_out_ids = [key_source_id for key_source_id, future in futures.items() if future in not_done]
+        for key_source_id in timed_out_ids:
+            futures.pop(key_source_id).cancel()
+            log.warning("The source %s did not finish %s before the deadline.", key_source_id, operation.__name__)
+
+        if timed_out_ids and tear_down_on_timeout:
+            self._tear_down(f"The sources {timed_out_ids} did not finish {operation.__name__} before the deadline.")
+            raise DeadlineExceededError(self.desync_reason)
+
+        return {
+            key_source_id: future.result()
+            for key_source_id, future in futures.items()
+            if future.exception() is None
+        }
+
+    def _tear_down(self, reason: str) -> None:
+        """
+        Stops the session for good: every source is closed in the background (which releases the workers
+        still blocked in them and makes the peer sources fail too), and the next requests that need new
+        keys fail, so the applications open a new session and both peers start again in sync.
+        """
+        log.error("Tearing down the session %s: %s", self.key_stream_id, reason)
+        self.desync_reason = reason
+
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+
+        key_sources, self.key_sources = self.key_sources, {}
+        for key_source in key_sources.values():
+            self.source_executor.submit(key_source, handle_close, key_source)
+
     ### Open Connect ###
 
-    def _share_ksid(self, connection_id: str, target: NetworkAddress) -> uuid.UUID:
+    def _share_ksid(
+            self,
+            connection_id: str,
+            target: NetworkAddress,
+            peer_options: dict,
+            deadline: Deadline
+        ) -> str:
+        """
+        Shares the ksid of the session with the peer. The client also sends the options that change the messages
+        exchanged with the peer (see OpenConnectOptions.get_peer_options()), and the server answers whether they
+        match its own, so both sessions fail instead of deriving different keys.
+
+        Raises:
+            PeerOptionsMismatchError: If the peer session was opened with different options.
+        """
         session_ref = PeerSessionReference(
             type=PeerSessionType.SHARE_KSID,
             id=connection_id
         )
 
         log.debug("Connecting peer %s to get the ksid of the session.", target)
-        with self.peer_manager.connect_peer(session_ref, self.role, target) as sock:
+        with self.peer_manager.connect_peer(session_ref, self.role, target, deadline.check_remaining()) as sock:
             if self.role == ConnectionRole.CLIENT:
                 ksid_bytes = uuid.uuid4().bytes
+                encoded_options = json.dumps(peer_options).encode()
                 log.debug("[CLIENT] Shared Hybrid KSID generated. Sending it to the server.")
-                sock.sendall(ksid_bytes)
+                sock.sendall(ksid_bytes + PEER_OPTIONS_HEADER.pack(len(encoded_options)) + encoded_options)
+                accepted = receive_nbytes(sock, 1) == PEER_OPTIONS_ACCEPTED
+                peer_description = "the server"
             elif self.role == ConnectionRole.SERVER:
                 log.debug("[SEVER] Waiting for connection ksid.")
-                ksid_bytes = sock.recv(16)
+                ksid_bytes = receive_nbytes(sock, 16)
+                (options_size,) = PEER_OPTIONS_HEADER.unpack(receive_nbytes(sock, PEER_OPTIONS_HEADER.size))
+                client_options = json.loads(receive_nbytes(sock, options_size))
+                accepted = client_options == peer_options
+                sock.sendall(PEER_OPTIONS_ACCEPTED if accepted else PEER_OPTIONS_REJECTED)
+                peer_description = f"the client ({client_options})"
             else:
                 raise ValueError(f"Invalid role. Must be {ConnectionRole.CLIENT} or {ConnectionRole.SERVER}.")
 
+        if not accepted:
+            raise PeerOptionsMismatchError(
+                f"The options {peer_options} of the session do not match the ones of {peer_description}."
+            )
+
         return str(uuid.UUID(bytes=ksid_bytes))
 
 
@@ -161,35 +303,41 @@ class Etsi004Session:
             dict: Response with status and key_stream_id.
         """
         self.qos = oc_request.qos
+        self.key_buffer_encoding = oc_request.options.key_buffer_encoding
+
+        # The QoS timeout (in milliseconds) applies to every request of the session, 0 uses the node default
+        if self.qos.timeout > 0:
+            self.timeout = self.qos.timeout / 1000
+        deadline = self._new_deadline()
+
+        try:
+            check_chunk_size(self.hybrid_method, self.qos.key_chunk_size)
+        except ValueError as e:
+            log.error("Invalid key_chunk_size for the session: %s", e)
+            return {"status": 1, "message": str(e)}
 
         try:
             # Generate a key_stream_id of the hybrid session
-            hybrid_ksid = self._share_ksid(oc_request.get_connection_id(), self.peer.address)
+            hybrid_ksid = self._share_ksid(
+                oc_request.get_connection_id(), self.peer.address, oc_request.options.get_peer_options(), deadline
+            )
             log.info("Hybrid ksid generated with %s: %s", self.peer.address, hybrid_ksid)
-        except (PeerNotConnectedError, TimeoutError, RuntimeError) as e:
+        except (
+            PeerNotConnectedError, PeerOptionsMismatchError, TimeoutError, ConnectionError, DeadlineExceededError,
+            RuntimeError
+        ) as e:
             log.error("Failed to share ksid with %s: %s", self.peer.address, e)
             return {"status": 1, "message": str(e)}
 
 
-        # Initiate arrays for threading flow
-        threads: list[threading.Thread] = []
-        results = {}
-        results_lock = threading.Lock()
-
-        for key_source_id, key_source in self.key_sources.items():
-            log.debug("Starting OPEN_CONNECT thread for %s", key_source.get_id())
-            oc_thread = threading.Thread(
-                target=handle_open_connect_thread,
-                args=(key_source, hybrid_ksid, self.qos, results, results_lock),
-                name=key_source_id[:12],
-            )
-            oc_thread.start()
-            threads.append(oc_thread)
+        for key_source in self.key_sources.values():
+            if isinstance(key_source, PQCSource):
+                key_source.set_options(oc_request.options)
 
-        for t in threads:
-            t.join()
-            if t.is_alive():
-                log.warning("Thread %s exceeded timeout and is still running.", t.name)
+        try:
+            results = self._run_on_sources(handle_open_connect, hybrid_ksid, self.qos, deadline, deadline=deadline)
+        except DeadlineExceededError as e:
+            return {"status": 1, "message": str(e)}
 
         if not results:
             log.error("None of the sources could open connect, sending error response to agent.")
@@ -204,6 +352,14 @@ class Etsi004Session:
             log.warning("The source %s failed to open connect, removing it from available key sources for future operations.", key_source_id)
             self.key_sources.pop(key_source_id)
 
+        self.key_stream_id = hybrid_ksid
+
+        if oc_request.options.prefetch_depth > 0:
+            self.prefetcher = HybridKeyPrefetcher(
+                hybrid_ksid, self._prefetch_next_key, oc_request.options.prefetch_depth, self.qos
+            )
+            self.prefetcher.start()
+
         # Respond with the key_stream_id
         return {"status": 0, "key_stream_id": hybrid_ksid}
 
@@ -212,7 +368,8 @@ class Etsi004Session:
     def get_key(self, gk_request: GetKeyRequest) -> dict:
         """
         Handles GET_KEY requests.
-        Retrieves keys from sources and hybridizes them.
+        Returns the key in gk_request.index of the key stream, keys that were already derived are taken
+        from the key store and new ones are retrieved from the sources and hybridized.
 
         Args:
             request_gk (GetKeyRequest): The data of a GET_KEY request aimed to this session.
@@ -221,70 +378,235 @@ class Etsi004Session:
             dict: Response with status and key buffer.
         """
 
-        # Initiate arrays for threading flow
-        threads: list[threading.Thread] = []
-        results = {}
-        results_lock = threading.Lock()
+        try:
+            hybrid_keys = self._get_indexed_keys(gk_request.index, 1, self._new_deadline())
+        except DeadlineExceededError as e:
+            log.error("GET KEY of %s could not be answered in time: %s", gk_request.key_stream_id, e)
+            return {"status": 1, "message": str(e)}
+        except KeyIndexError as e:
+            log.error("Invalid key index for %s: %s", gk_request.key_stream_id, e)
+            return {"status": 1, "message": str(e)}
+        except SessionDesynchronizedError as e:
+            log.error("GET KEY of %s failed, the session must be opened again: %s", gk_request.key_stream_id, e)
+            return {"status": 1, "message": str(e)}
 
-        for key_source_id, key_source in self.key_sources.items():
-            log.debug("Starting GET_KEY thread for %s", key_source.get_id())
-            qk_thread = threading.Thread(
-                target=handle_get_key_thread,
-                args=(key_source, results, results_lock),
-                name=key_source_id[:12],
-            )
-            qk_thread.start()
-            threads.append(qk_thread)
+        # If no keys were fetched, return an error
+        if not hybrid_keys:
+            log.error("Failed to fetch any keys from sources. Aborting operation")
+            return {"status": 1, "message": "Failed to fetch any keys from sources"}
 
-        for t in threads:
-            t.join()
-            if t.is_alive():
-                log.warning("Thread %s exceeded timeout and is still running.", t.name)
+        # Respond with the hybrid key
+        key_buffer = encode_key_buffer(hybrid_keys[0], self.key_buffer_encoding)
+        log.debug("Hybrid Key: %s", key_buffer)
+        return {"status": 0, "key_buffer": key_buffer}
+
+    def get_keys(self, gks_request: GetKeysRequest) -> dict:
+        """
+        Handles GET_KEYS requests.
+        Returns the gks_request.count keys of the key stream that start at gks_request.index, the keys
+        that have not been derived yet are retrieved from each source in a single operation.
+
+        Args:
+            gks_request (GetKeysRequest): The data of a GET_KEYS request aimed to this session.
+
+        Returns:
+            dict: Response with status and the list of key buffers.
+        """
+
+        try:
+            hybrid_keys = self._get_indexed_keys(gks_request.index, gks_request.count, self._new_deadline())
+        except DeadlineExceededError as e:
+            log.error("GET KEYS of %s could not be answered in time: %s", gks_request.key_stream_id, e)
+            return {"status": 1, "message": str(e)}
+        except KeyIndexError as e:
+            log.error("Invalid key index for %s: %s", gks_request.key_stream_id, e)
+            return {"status": 1, "message": str(e)}
+        except SessionDesynchronizedError as e:
+            log.error("GET KEYS of %s failed, the session must be opened again: %s", gks_request.key_stream_id, e)
+            return {"status": 1, "message": str(e)}
 
         # If no keys were fetched, return an error
-        if not results:
+        if not hybrid_keys:
             log.error("Failed to fetch any keys from sources. Aborting operation")
             return {"status": 1, "message": "Failed to fetch any keys from sources"}
 
-        log.debug("Fetched key dict: %s", results)
-        keys = list(results.values())
+        if len(hybrid_keys) < gks_request.count:
+            log.warning("Only %s of the %s requested keys could be generated.", len(hybrid_keys), gks_request.count)
+
+        key_buffers = [encode_key_buffer(hybrid_key, self.key_buffer_encoding) for hybrid_key in hybrid_keys]
+        return {"status": 0, "key_buffers": key_buffers}
+
+    def _get_indexed_keys(self, index: int, count: int, deadline: Deadline) -> list[bytes]:
+        """
+        Returns the keys of the key stream from index to index + count.
+
+        Keys below key_store.next_index are served from the key store. The missing ones are derived
+        in order (including the ones between next_index and index, since both peers must derive the
+        same sequence) and added to the store.
+
+        Raises:
+            KeyIndexError: If the first key was evicted from the store or index is further ahead
+            than the store window.
+            DeadlineExceededError: If another request of the session held the store until the deadline.
+        """
 
-        # There cannot be hybridization if there was only one key
-        if len(keys) < 2:
-            key_buffer = list(keys[0])
+        if not self.key_store.lock.acquire(timeout=deadline.remaining()):
+            raise DeadlineExceededError("The key store of the session was busy until the deadline.")
+
+        try:
+            next_index = self.key_store.next_index
+
+            if index - next_index >= self.key_store.window:
+                raise KeyIndexError(
+                    f"The key {index} is too far ahead, the next key of the session is {next_index}."
+                )
 
-            if len(key_buffer) > self.qos.key_chunk_size:
-                key_buffer = key_buffer[:self.qos.key_chunk_size]
+            stored_keys = self.key_store.get_range(index, count) if index < next_index else []
 
-            log.info("Only one key was generated, no hibridization is required.")
-            log.debug("Hybrid Key: %s", key_buffer)
-            return {"status": 0, "key_buffer": key_buffer}
+            missing = index + count - next_index
+            if missing <= 0:
+                log.debug("Keys %s to %s served from the key store.", index, index + count - 1)
+                return stored_keys
 
-        if not all(isinstance(key, bytes) for key in keys):
-            raise TypeError("All keys must be bytes.")
+            new_keys = self._obtain_hybrid_keys(missing, deadline)
+            self.key_store.extend(new_keys)
 
-        log.info("Key generation completed, starting key hybridization proccess using %s.", self.hybrid_method)
+            # Skip the new keys placed before index
+            return stored_keys + new_keys[max(0, index - next_index):]
+        finally:
+            self.key_store.lock.release()
 
-        keys.sort() # We do this to ensure the order of the keys is the same in both modules.
+    def _obtain_hybrid_keys(self, count: int, deadline: Deadline) -> list[bytes]:
+        """Returns the next count hybrid keys of the session, from the prefetch buffer if there is one."""
 
-        if self.hybrid_method == HybridizationMethod.XOR:
-            hybrid_key = xoring_kdf(keys, self.qos.key_chunk_size)
-        elif self.hybrid_method == HybridizationMethod.HMAC:
-            hybrid_key = hmac_kdf(keys)
-        elif self.hybrid_method == HybridizationMethod.XORHMAC:
-            hybrid_key = xorhmac_kdf(keys, self.qos.key_chunk_size)
+        if self.desync_reason is not None:
+            raise SessionDesynchronizedError(f"The session was torn down: {self.desync_reason}")
+
+        if self.prefetcher is None:
+            return self._generate_hybrid_keys(count, deadline)
+
+        hybrid_keys = self.prefetcher.pop(count, deadline.remaining())
+        if len(hybrid_keys) < count:
+            log.warning(
+                "The prefetch buffer only had %s of %s keys (%s)",
+                len(hybrid_keys), count, self.prefetcher.get_finish_reason() or "Timeout"
+            )
+
+        return hybrid_keys
+
+    def _generate_hybrid_keys(self, count: int, deadline: Deadline) -> list[bytes]:
+        """Obtains count keys from every source (each source in parallel) and hybridizes them."""
+
+        if count == 1:
+            results = self._run_on_sources(handle_get_key, deadline, deadline=deadline)
+            source_keys = [[key] for key in results.values()]
         else:
-            return {"status": 1, "message": "Unknown hybrid method"}
+            # Each source obtains all its keys in a single operation
+            results = self._run_on_sources(handle_get_keys, count, deadline, deadline=deadline)
+            source_keys = list(results.values())
 
-        # Truncate the hybrid key to the specified chunk_size
-        if len(hybrid_key) > self.qos.key_chunk_size:
-            hybrid_key = hybrid_key[:self.qos.key_chunk_size]
+        if not source_keys:
+            return []
 
-        # Respond with the hybrid key
-        log.info("Keys successfully hybridazed using %s.", self.hybrid_method)
-        log.debug("Hybrid Key: %s", list(hybrid_key))
+        # Only the keys that every source obtained are hybridized, a key made with fewer sources would be weaker
+        obtained = min(len(keys) for keys in source_keys)
+        if obtained < count:
+            log.warning("Only %s of the %s keys were obtained from every source.", obtained, count)
 
-        return {"status": 0, "key_buffer": list(hybrid_key)}
+        # The i-th hybrid key is made with the i-th key of every source
+        try:
+            hybrid_keys = self._hybridize_many([[keys[i] for keys in source_keys] for i in range(obtained)], deadline)
+        except DeadlineExceededError as e:
+            # The keys of the sources were used, but the peer may have hybridized them in time
+            self._tear_down(f"The hybridization did not finish before the deadline: {e}")
+            raise
+
+        log.info("%s keys successfully hybridazed using %s.", len(hybrid_keys), self.hybrid_method)
+        return hybrid_keys
+
+    def _prefetch_next_key(self) -> bytes:
+        """
+        Obtains the next hybrid key for the prefetch buffer, it runs in the refill thread of the prefetcher.
+
+        The sources are called one after the other and without timeout (in the same order in both peers),
+        this way a peer whose buffer is full holds the refill of the other one instead of breaking it.
+        """
+
+        keys = []
+        for key_source_id, key_source in self.key_sources.items():
+            try:
+                keys.append(key_source.get_key(timeout=None))
+            except Exception as e:
+                log.error("Failed GET KEY from %s during prefetch: %s", key_source_id, e)
+
+        if not keys:
+            raise RuntimeError("Failed to fetch any keys from sources")
+
+        return self._hybridize(keys)
+
+    ### Hybridization ###
+
+    def _hybridize(self, keys: list[bytes]) -> bytes:
+        """
+        Combines the keys obtained from the sources into a single hybrid key of key_chunk_size bytes.
+
+        Args:
+            keys (list[bytes]): One key per source that succeeded.
+
+        Returns:
+            bytes: The hybrid key.
+        """
+        return self._hybridize_many([keys])[0]
+
+    def _hybridize_many(self, key_sets: list[list[bytes]], deadline: Deadline | None = None) -> list[bytes]:
+        """
+        Combines each list of keys into a hybrid key of key_chunk_size bytes. With the node hybridization batcher,
+        every hybridization is submitted before waiting for any, so they all go in the same batch.
+
+        Args:
+            key_sets (list[list[bytes]]): The keys of each hybrid key, one per source that succeeded.
+            deadline (Deadline | None): Deadline of the request, None waits for the batcher without limit.
+
+        Returns:
+            list[bytes]: The hybrid keys, in the order of key_sets.
+
+        Raises:
+            DeadlineExceededError: If the batcher did not hybridize the keys before the deadline.
+        """
+        chunk_size = self.qos.key_chunk_size
+        hybrid_keys: list[bytes | Future] = []
+
+        for keys in key_sets:
+            # There cannot be hybridization if there was only one key
+            if len(keys) < 2:
+                log.debug("Only one key was generated, no hibridization is required.")
+                hybrid_keys.append(keys[0][:chunk_size])
+                continue
+
+            if not all(isinstance(key, bytes) for key in keys):
+                raise TypeError("All keys must be bytes.")
+
+            keys = sorted(keys) # We do this to ensure the order of the keys is the same in both modules.
+
+            if self.hybridization_batcher is not None:
+                hybrid_keys.append(self.hybridization_batcher.submit(self.hybrid_method, keys, chunk_size))
+            else:
+                hybrid_keys.append(get_hybridization_function(self.hybrid_method)(keys, chunk_size))
+
+        log.debug("Key generation completed, hybridizing %s keys using %s.", len(key_sets), self.hybrid_method)
+
+        # Truncate the hybrid keys to the specified chunk_size
+        return [
+            (self._wait_hybrid_key(hybrid_key, deadline) if isinstance(hybrid_key, Future) else hybrid_key)[:chunk_size]
+            for hybrid_key in hybrid_keys
+        ]
+
+    def _wait_hybrid_key(self, hybrid_key: Future, deadline: Deadline | None) -> bytes:
+        """Waits for a hybridization submitted to the batcher, until the deadline (if there is one)."""
+        try:
+            return hybrid_key.result(deadline.check_remaining() if deadline is not None else None)
+        except FutureTimeoutError as e:
+            raise DeadlineExceededError("The hybridization batcher did not finish before the deadline.") from e
 
     ### Close ###
 
@@ -300,21 +622,14 @@ class Etsi004Session:
             dict: Response with status.
         """
 
-        threads: list[threading.Thread] = []
+        deadline = self._new_deadline()
 
-        for key_source_id, key_source in self.key_sources.items():
-            log.debug("Starting CLOSE thread for %s", key_source.get_id())
-            cl_thread = threading.Thread(
-                target=handle_close_thread,
-                args=(key_source ,),
-                name=key_source_id[:12],
-            )
-            cl_thread.start()
-            threads.append(cl_thread)
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+
+        self._run_on_sources(handle_close, deadline=deadline, tear_down_on_timeout=False)
 
-        for t in threads:
-            t.join()
-            if t.is_alive():
-                log.warning("Thread %s exceeded timeout and is still running.", t.name)
+        if self.prefetcher is not None:
+            self.prefetcher.join(deadline.remaining())
 
         return {"status" : 0}
\ No newline at end of file
@@ -0,0 +1,51 @@
+import threading
+from collections import deque
+
+from hybridization_module.model.exceptions import KeyIndexError
+
+
+class IndexedKeyStore:
+    """Hybrid keys of a session indexed by their position in the key stream.
+
+    Only the last `window` keys are kept, older ones are evicted as new keys are added. Keys
+    are stored back to back in a deque, so a key is located with its offset from first_index.
+    """
+
+    def __init__(self, window: int) -> None:
+        """
+        Args:
+            window (int): Maximum number of keys kept in the store.
+        """
+        self.window: int = window
+        self.lock: threading.Lock = threading.Lock() # Held by the session while it looks up and adds keys
+
+        self._keys: deque[bytes] = deque(maxlen=window)
+        self._next_index: int = 0
+
+    @property
+    def next_index(self) -> int:
+        """Index that the next key added to the store will have."""
+        return self._next_index
+
+    @property
+    def first_index(self) -> int:
+        """Index of the oldest key still in the store."""
+        return self._next_index - len(self._keys)
+
+    def extend(self, keys: list[bytes]) -> None:
+        """Adds the keys that follow next_index, evicting the oldest ones if the window is full."""
+        self._keys.extend(keys)
+        self._next_index += len(keys)
+
+    def get_range(self, index: int, count: int) -> list[bytes]:
+        """Returns the stored keys from index to index + count (or up to next_index if it is lower).
+
+        Raises:
+            KeyIndexError: If the key in index has already been evicted.
+        """
+        if index < self.first_index:
+            raise KeyIndexError(f"The key {index} is no longer available, the oldest stored key is {self.first_index}.")
+
+        offset = index - self.first_index
+        end = min(offset + count, len(self._keys))
+        return [self._keys[i] for i in range(offset, end)]
@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+
+from hybridization_module.model.requests import OpenConnectQos
+
+log = logging.getLogger(__name__)
+
+
+class HybridKeyPrefetcher:
+    """Bounded buffer of hybrid keys that is refilled in the background.
+
+    Both peers of the session run their own prefetcher, the sources make them advance in lockstep
+    (a PQC exchange needs both peers), so both buffers contain the same keys in the same order.
+    When the buffer is full the refill stops until the application takes keys from it, which also
+    holds the refill of the peer.
+
+    The refill is paced so that it does not exceed qos.max_bps, and it stops for good when the
+    session is closed or its qos.ttl expires.
+    """
+
+    def __init__(self, name: str, generate_key: Callable[[], bytes], depth: int, qos: OpenConnectQos) -> None:
+        """
+        Args:
+            name (str): Name used in the logs and the refill thread (usually the hybrid ksid).
+            generate_key (Callable[[], bytes]): Function that obtains the next hybrid key from the sources.
+            depth (int): Maximum number of keys in the buffer.
+            qos (OpenConnectQos): The QoS of the session (key_chunk_size, max_bps, min_bps and ttl are used).
+        """
+        self.name: str = name
+        self.depth: int = depth
+
+        self._generate_key: Callable[[], bytes] = generate_key
+        self._key_bits: int = qos.key_chunk_size * 8
+        self._min_bps: int = qos.min_bps
+        self._key_interval: float = self._key_bits / qos.max_bps if qos.max_bps > 0 else 0
+        self._expiration: float | None = time.monotonic() + qos.ttl if qos.ttl > 0 else None
+
+        self._buffer: deque[bytes] = deque()
+        self._condition: threading.Condition = threading.Condition()
+        self._stopped: bool = False
+        self._finish_reason: str | None = None # Set once the refill thread stops
+
+        self._refill_thread: threading.Thread = threading.Thread(
+            target=self._refill, name=f"prefetch-{name[:8]}", daemon=True
+        )
+
+    def start(self) -> None:
+        self._refill_thread.start()
+        log.info("Prefetching up to %s keys for %s.", self.depth, self.name)
+
+    def _finish(self, reason: str) -> None:
+        with self._condition:
+            self._finish_reason = reason
+            self._condition.notify_all()
+
+    def _refill(self) -> None:
+        next_key_time = time.monotonic()
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._stopped or len(self._buffer) < self.depth)
+
+                # Pace the refill according to max_bps
+                self._condition.wait_for(lambda: self._stopped, timeout=next_key_time - time.monotonic())
+                if self._stopped:
+                    self._finish_reason = "The session was closed."
+                    return
+
+            if self._expiration is not None and time.monotonic() >= self._expiration:
+                log.info("The TTL of %s expired, no more keys will be prefetched.", self.name)
+                self._finish("The TTL of the session expired.")
+                return
+
+            generation_start = time.monotonic()
+            try:
+                key = self._generate_key()
+            except Exception as e:
+                if not self._stopped:
+                    log.error("Prefetch of %s stopped, failed to generate a key: %s", self.name, e)
+                self._finish("Failed to fetch any keys from sources")
+                return
+
+            generation_time = time.monotonic() - generation_start
+            if self._min_bps > 0 and generation_time > 0 and self._key_bits / generation_time < self._min_bps:
+                log.warning("Prefetch of %s is below the min_bps of the session.", self.name)
+
+            with self._condition:
+                self._buffer.append(key)
+                self._condition.notify_all()
+
+            next_key_time = max(next_key_time + self._key_interval, generation_start)
+
+    def pop(self, count: int, timeout: float) -> list[bytes]:
+        """Takes the next keys of the buffer, waiting for the refill if necessary.
+
+        Args:
+            count (int): Number of keys wanted.
+            timeout (float): Maximum number of seconds to wait for the keys.
+
+        Returns:
+            list[bytes]: The keys, in order. It may contain less than count keys if the timeout
+            expired or the refill stopped.
+        """
+        keys: list[bytes] = []
+        deadline = time.monotonic() + timeout
+
+        with self._condition:
+            while len(keys) < count:
+                self._condition.wait_for(
+                    lambda: self._buffer or self._finish_reason is not None,
+                    timeout=deadline - time.monotonic(),
+                )
+                if not self._buffer:
+                    break
+
+                while self._buffer and len(keys) < count:
+                    keys.append(self._buffer.popleft())
+
+                # Let the refill continue while the rest of the keys are awaited
+                self._condition.notify_all()
+
+        return keys
+
+    def get_finish_reason(self) -> str | None:
+        """Returns why the refill stopped, or None if it is still running."""
+        with self._condition:
+            return self._finish_reason
+
+    def stop(self) -> None:
+        """Stops the refill, a refill blocked in a source is released once the sources are closed."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def join(self, timeout: float) -> None:
+        self._refill_thread.join(timeout)
+        if self._refill_thread.is_alive():
+            log.warning("The prefetch thread of %s is still running.", self.name)
@@ -0,0 +1,38 @@
+import time
+
+from hybridization_module.model.exceptions import DeadlineExceededError
+
+
+class Deadline:
+    """Point in time by which a request must be answered.
+
+    The same deadline is passed to every step of the request (session, sources and peer connector),
+    so each blocking call only waits for the time the request has left instead of its own timeout.
+    """
+
+    def __init__(self, timeout: float) -> None:
+        """
+        Args:
+            timeout (float): Seconds from now until the deadline expires.
+        """
+        self.timeout: float = timeout
+        self._expiration: float = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        """Returns the seconds left until the deadline (0 if it already expired)."""
+        return max(0.0, self._expiration - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self._expiration
+
+    def check_remaining(self) -> float:
+        """Returns the seconds left until the deadline, to be used as the timeout of a blocking call.
+
+        Raises:
+            DeadlineExceededError: If the deadline already expired (a timeout of 0 makes some blocking
+            calls, like socket operations, non-blocking instead of failing).
+        """
+        remaining = self._expiration - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError(f"The deadline of {self.timeout} seconds expired.")
+        return remaining
@@ -0,0 +1,97 @@
+from hybridization_module.model.exceptions import FramingError
+from hybridization_module.model.shared_enums import MessageFraming
+
+LENGTH_PREFIX_SIZE = 4
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+def encode_frame(payload: bytes, framing: MessageFraming) -> bytes:
+    """Frames a message so that it can be sent through a stream.
+
+    Args:
+        payload (bytes): The encoded message (usually a JSON).
+        framing (MessageFraming): The framing used in the stream.
+
+    Returns:
+        bytes: The framed message.
+    """
+    if framing == MessageFraming.LENGTH_PREFIXED:
+        return len(payload).to_bytes(LENGTH_PREFIX_SIZE, "big") + payload
+    elif framing == MessageFraming.NEWLINE:
+        return payload + b"\n"
+
+    return payload
+
+
+class FrameDecoder:
+    """Incremental decoder that extracts the framed messages of a stream.
+
+    The received data can be fed in chunks of any size, the decoder keeps the incomplete
+    frames until the rest of the message arrives.
+    """
+
+    def __init__(self, framing: MessageFraming, max_frame_size: int = MAX_FRAME_SIZE) -> None:
+        self.framing: MessageFraming = framing
+        self.max_frame_size: int = max_frame_size
+        self._buffer: bytearray = bytearray()
+
+    def has_partial_frame(self) -> bool:
+        """Returns True if part of a message is waiting for the rest of its data."""
+        return len(self._buffer) > 0
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Adds received data to the decoder.
+
+        Args:
+            data (bytes): Data received from the stream.
+
+        Returns:
+            list[bytes]: The messages completed with this data (without the framing), in order.
+
+        Raises:
+            FramingError: If the stream does not follow the framing.
+        """
+        if self.framing == MessageFraming.NONE:
+            # Legacy behaviour, the data received is assumed to be a complete message
+            return [data] if data else []
+
+        self._buffer += data
+
+        if self.framing == MessageFraming.LENGTH_PREFIXED:
+            return self._extract_length_prefixed_frames()
+        elif self.framing == MessageFraming.NEWLINE:
+            return self._extract_newline_frames()
+        else:
+            raise FramingError(f"Framing {self.framing} not implemented.")
+
+    def _extract_length_prefixed_frames(self) -> list[bytes]:
+        frames = []
+
+        while len(self._buffer) >= LENGTH_PREFIX_SIZE:
+            frame_size = int.from_bytes(self._buffer[:LENGTH_PREFIX_SIZE], "big")
+            if frame_size > self.max_frame_size:
+                raise FramingError(f"Frame of {frame_size} bytes exceeds the limit of {self.max_frame_size} bytes.")
+
+            frame_end = LENGTH_PREFIX_SIZE + frame_size
+            if len(self._buffer) < frame_end:
+                break
+
+            frames.append(bytes(self._buffer[LENGTH_PREFIX_SIZE:frame_end]))
+            del self._buffer[:frame_end]
+
+        return frames
+
+    def _extract_newline_frames(self) -> list[bytes]:
+        frames = []
+
+        while (newline_position := self._buffer.find(b"\n")) != -1:
+            frame = bytes(self._buffer[:newline_position]).strip()
+            del self._buffer[:newline_position + 1]
+
+            if frame:
+                frames.append(frame)
+
+        if len(self._buffer) > self.max_frame_size:
+            raise FramingError(f"Line exceeds the limit of {self.max_frame_size} bytes.")
+
+        return frames
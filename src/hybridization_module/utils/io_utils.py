@@ -15,11 +15,16 @@ def receive_nbytes(sock: socket.socket, num_bytes: int) -> bytes:
 
     Returns:
         bytes: A buffer with a bytes object of lenght num_bytes
+
+    Raises:
+        ConnectionError: If the other socket closes the connection before sending all the bytes.
     """
     buffer = b''
 
     while len(buffer) < num_bytes:
         received_data = sock.recv(num_bytes-len(buffer))
+        if not received_data:
+            raise ConnectionError(f"Connection closed after receiving {len(buffer)} of {num_bytes} bytes.")
         buffer += received_data
 
     return buffer
@@ -1,6 +1,8 @@
 #kdfix/utils/validate_key.py
 import base64
 
+from hybridization_module.model.shared_enums import KeyBufferEncoding
+
 
 def key_to_bytes(key: bytes | list[int] | str | int) -> bytes:
 
@@ -31,6 +33,26 @@ def key_to_bytes(key: bytes | list[int] | str | int) -> bytes:
         raise ValueError(f"Unsupported key type: {type(key)}. Expected str, bytes, int, or list of integers.")
 
 
+def encode_key_buffer(key: bytes, encoding: KeyBufferEncoding) -> list[int] | str:
+    """Converts a key into the key_buffer representation sent to the applications.
+
+    Args:
+        key (bytes): The key to encode.
+        encoding (KeyBufferEncoding): The encoding negotiated in the OPEN_CONNECT.
+
+    Returns:
+        list[int] | str: A list of integers (LIST) or a string (BASE64 and HEX).
+    """
+    if encoding == KeyBufferEncoding.BASE64:
+        return base64.b64encode(key).decode("ascii")
+    elif encoding == KeyBufferEncoding.HEX:
+        return key.hex()
+    elif encoding == KeyBufferEncoding.LIST:
+        return list(key)
+    else:
+        raise ValueError(f"Key buffer encoding {encoding} not implemented.")
+
+
 #kdfix/utils/resize.py
 
 def enforce_key_size(key: bytes, size: int) -> bytes:
@@ -40,4 +62,9 @@ def enforce_key_size(key: bytes, size: int) -> bytes:
     elif len(key) < size:
         # Pad the key with zeros if it's too short
         return key.ljust(size, b'\0')
-    return key
\ No newline at end of file
+    return key
+
+def encode_key_sizes(keys: list[bytes]) -> bytes:
+    """Encodes the size of each key (4 bytes, big endian), so the KDFs that hash the keys one after the other
+    never get the same input from two different lists of keys."""
+    return b"".join(len(key).to_bytes(4, "big") for key in keys)
@@ -31,11 +31,43 @@ def load_config() -> dict:
         exit(1)
 
 
-def send_request(socket_conn: socket.socket, request: dict) -> dict:
+def receive_exactly(socket_conn: socket.socket, num_bytes: int) -> bytes:
+    """
+    Receive exactly num_bytes from the socket.
+    """
+    buffer = b""
+    while len(buffer) < num_bytes:
+        received_data = socket_conn.recv(num_bytes - len(buffer))
+        if not received_data:
+            raise ConnectionError("Connection closed by the Hybridization Module")
+        buffer += received_data
+    return buffer
+
+
+def send_request(socket_conn: socket.socket, request: dict, framing: str = "none") -> dict:
     """
     Send a JSON request via the socket and return the response.
+
+    The framing must match the server_config.framing of the Hybridization Module.
     """
-    socket_conn.sendall(json.dumps(request).encode("utf8"))
+    payload = json.dumps(request).encode("utf8")
+
+    if framing == "length_prefixed":
+        socket_conn.sendall(len(payload).to_bytes(4, "big") + payload)
+        response_size = int.from_bytes(receive_exactly(socket_conn, 4), "big")
+        return json.loads(receive_exactly(socket_conn, response_size).decode("utf8"))
+
+    if framing == "newline":
+        socket_conn.sendall(payload + b"\n")
+        response_bytes = b""
+        while not response_bytes.endswith(b"\n"):
+            received_data = socket_conn.recv(BUFFER_SIZE)
+            if not received_data:
+                raise ConnectionError("Connection closed by the Hybridization Module")
+            response_bytes += received_data
+        return json.loads(response_bytes.decode("utf8"))
+
+    socket_conn.sendall(payload)
     while True:
         response_bytes = socket_conn.recv(BUFFER_SIZE)
         if response_bytes:
@@ -63,7 +95,7 @@ def create_open_connect_request(driver_id: int) -> dict:
 
 
 
-def do_full_connection_cicle(driver_id: int, hm_address: dict) -> None:
+def do_full_connection_cicle(driver_id: int, hm_address: dict, framing: str) -> None:
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as kdfix_socket:
             # Connect to the Hybridization Module
@@ -71,7 +103,7 @@ def do_full_connection_cicle(driver_id: int, hm_address: dict) -> None:
 
             #  OPEN_CONNECT
             oc_request = create_open_connect_request(driver_id)
-            oc_response = send_request(kdfix_socket, oc_request)
+            oc_response = send_request(kdfix_socket, oc_request, framing)
             print(f"Driver {driver_id} OPEN_CONNECT response:", oc_response)
 
             # Ensure session establishment
@@ -94,7 +126,7 @@ def do_full_connection_cicle(driver_id: int, hm_address: dict) -> None:
                     }
                 }
             }
-            gk_response = send_request(kdfix_socket, gk_request)
+            gk_response = send_request(kdfix_socket, gk_request, framing)
             print(f"Driver {driver_id} GET_KEY response:", gk_response)
 
             #  CLOSE
@@ -105,7 +137,7 @@ def do_full_connection_cicle(driver_id: int, hm_address: dict) -> None:
                 }
             }
 
-            cl_response = send_request(kdfix_socket, cl_request)
+            cl_response = send_request(kdfix_socket, cl_request, framing)
             print(f"Driver {driver_id} CLOSE response:", cl_response)
 
     except ConnectionError as e:
@@ -122,10 +154,11 @@ def run_driver() -> None:
     # Load configuration
     config = load_config()
     hm_address = config["hybridization_server_address"]
+    framing = config.get("server_config", {}).get("framing", "none").lower()
     thread_list: list[threading.Thread] = []
 
     for i in range(NUM_DRIVERS):
-        new_thread = threading.Thread(target=do_full_connection_cicle, args=(i, hm_address))
+        new_thread = threading.Thread(target=do_full_connection_cicle, args=(i, hm_address, framing))
         new_thread.start()
         thread_list.append(new_thread)
 
@@ -40,11 +40,43 @@ def load_request(filename: str) -> dict:
         return json.load(file)
 
 
-def send_request(socket_conn: socket.socket, request: dict) -> dict:
+def receive_exactly(socket_conn: socket.socket, num_bytes: int) -> bytes:
+    """
+    Receive exactly num_bytes from the socket.
+    """
+    buffer = b""
+    while len(buffer) < num_bytes:
+        received_data = socket_conn.recv(num_bytes - len(buffer))
+        if not received_data:
+            raise ConnectionError("Connection closed by the Hybridization Module")
+        buffer += received_data
+    return buffer
+
+
+def send_request(socket_conn: socket.socket, request: dict, framing: str = "none") -> dict:
     """
     Send a JSON request via the socket and return the response.
+
+    The framing must match the server_config.framing of the Hybridization Module.
     """
-    socket_conn.sendall(json.dumps(request).encode("utf8"))
+    payload = json.dumps(request).encode("utf8")
+
+    if framing == "length_prefixed":
+        socket_conn.sendall(len(payload).to_bytes(4, "big") + payload)
+        response_size = int.from_bytes(receive_exactly(socket_conn, 4), "big")
+        return json.loads(receive_exactly(socket_conn, response_size).decode("utf8"))
+
+    if framing == "newline":
+        socket_conn.sendall(payload + b"\n")
+        response_bytes = b""
+        while not response_bytes.endswith(b"\n"):
+            received_data = socket_conn.recv(BUFFER_SIZE)
+            if not received_data:
+                raise ConnectionError("Connection closed by the Hybridization Module")
+            response_bytes += received_data
+        return json.loads(response_bytes.decode("utf8"))
+
+    socket_conn.sendall(payload)
     while True:
         response_bytes = socket_conn.recv(BUFFER_SIZE)
         if response_bytes:
@@ -58,6 +90,7 @@ def run_driver() -> None:
     """
     # Load configuration
     config = load_config()
+    framing = config.get("server_config", {}).get("framing", "none").lower()
 
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as kdfix_socket:
@@ -69,7 +102,7 @@ def run_driver() -> None:
             #  OPEN_CONNECT
             print("\n--- OPEN_CONNECT ---")
             oc_request = load_request(OPEN_CONNECT_REQUEST_FILE)
-            oc_response = send_request(kdfix_socket, oc_request)
+            oc_response = send_request(kdfix_socket, oc_request, framing)
             print("OPEN_CONNECT response:", oc_response)
 
             # Ensure session establishment
@@ -93,14 +126,14 @@ def run_driver() -> None:
                     },
                 },
             }
-            gk_response = send_request(kdfix_socket, gk_request)
+            gk_response = send_request(kdfix_socket, gk_request, framing)
             print("GET_KEY response:", gk_response)
 
             #  CLOSE
             print("\n--- CLOSE ---")
             cl_request = {"command": "CLOSE", "data": {"key_stream_id": key_stream_id}}
 
-            cl_response = send_request(kdfix_socket, cl_request)
+            cl_response = send_request(kdfix_socket, cl_request, framing)
             print("CLOSE response:", cl_response)
 
     except ConnectionError as e:
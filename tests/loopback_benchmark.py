@@ -0,0 +1,199 @@
+"""
+Two-node benchmark of the session pipeline in a single process.
+
+Both Hybridization Modules run in this process, connected by a LoopbackNetwork (socketpairs, with
+an optional emulated latency and bandwidth) instead of TLS, and share an in-process KMS emulator.
+Running it again with --tls uses the real peer connector over localhost, so the difference is the
+cost of TLS and the network stack.
+
+    python3 tests/loopback_benchmark.py --sessions 20 --keys 100 --key-sources ML-KEM-512,QKD
+    python3 tests/loopback_benchmark.py --sessions 20 --keys 100 --latency-ms 5 --bandwidth-mbps 100
+    python3 tests/loopback_benchmark.py --sessions 20 --keys 100 --latency-ms 5 --pqc-batch-size 16
+    python3 tests/loopback_benchmark.py --tls --ca ca.crt --cert node.crt --key node.key
+"""
+import argparse
+import json
+import socket
+import statistics
+import threading
+import time
+
+from hybridization_module.kdfix_server import Etsi004Server
+from hybridization_module.key_generation.kms_emulator import KmsEmulator
+from hybridization_module.model.config import (
+    GeneralConfiguration,
+    KmsEmulatorConfiguration,
+    PeerInfo,
+)
+from hybridization_module.model.shared_types import NetworkAddress
+from hybridization_module.peer_connector.loopback_connector import (
+    LoopbackNetwork,
+    LoopbackPeerConnectionManager,
+)
+
+NODE_A = "aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa"
+NODE_B = "bbbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbb"
+BUFFER_SIZE = 65536
+
+
+def free_address() -> NetworkAddress:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return NetworkAddress.from_tuple(sock.getsockname())
+
+
+def create_node_config(uuid: str, kms_address: NetworkAddress, args: argparse.Namespace) -> GeneralConfiguration:
+    return GeneralConfiguration.model_validate({
+        "uuid": uuid,
+        "logging_config": {
+            "console_log_type": "error",
+            "colorless_console_log": True,
+            "file_log_type": "none",
+            "filename": "",
+        },
+        "certificate_config": {
+            "certificate_ip": "127.0.0.1",
+            "cert_authority_path": args.ca,
+            "cert_path": args.cert,
+            "key_path": args.key,
+        },
+        "hybridization_server_address": free_address().model_dump(),
+        "peer_local_address": free_address().model_dump(),
+        "qkd_address": kms_address.model_dump(),
+        "server_config": {"max_workers": 2 * args.sessions},
+    })
+
+
+def send_request(socket_conn: socket.socket, request: dict) -> dict:
+    socket_conn.sendall(json.dumps(request).encode("utf8"))
+
+    response_bytes = b""
+    decoder = json.JSONDecoder()
+    while True:
+        received_data = socket_conn.recv(BUFFER_SIZE)
+        if not received_data:
+            raise ConnectionError("Connection closed by the Hybridization Module")
+        response_bytes += received_data
+        try:
+            return decoder.decode(response_bytes.decode("utf8"))
+        except ValueError:
+            continue
+
+
+def run_application(
+        node: Etsi004Server,
+        spi: int,
+        args: argparse.Namespace,
+        results: dict
+    ) -> None:
+    uri_query = f"hybridization={args.hybridization}&key_sources={args.key_sources}"
+    open_connect_request = {
+        "command": "OPEN_CONNECT",
+        "data": {
+            "source": f"hybrid://SPI_{spi}@{NODE_A}?{uri_query}",
+            "destination": f"hybrid://SPI_{spi}@{NODE_B}?{uri_query}",
+            "qos": {
+                "key_chunk_size": args.chunk,
+                "max_bps": 0,
+                "min_bps": 0,
+                "jitter": 0,
+                "priority": 0,
+                "timeout": 0,
+                "ttl": 0,
+                "metadata_mimetype": "application/json",
+            },
+            "options": {"pqc_batch_size": args.pqc_batch_size},
+        },
+    }
+
+    address = node.config.hybridization_server_address.to_tuple()
+    with socket.create_connection(address) as kdfix_socket:
+        start = time.perf_counter()
+        oc_response = send_request(kdfix_socket, open_connect_request)
+        opened = time.perf_counter()
+        if oc_response.get("status") != 0:
+            results[(node.config.uuid, spi)] = {"error": oc_response}
+            return
+
+        key_stream_id = oc_response["key_stream_id"]
+        gk_response = send_request(kdfix_socket, {
+            "command": "GET_KEYS",
+            "data": {"key_stream_id": key_stream_id, "index": 0, "count": args.keys},
+        })
+        got_keys = time.perf_counter()
+        send_request(kdfix_socket, {"command": "CLOSE", "data": {"key_stream_id": key_stream_id}})
+
+    results[(node.config.uuid, spi)] = {
+        "keys": gk_response.get("key_buffers"),
+        "open_connect": opened - start,
+        "get_keys": got_keys - opened,
+    }
+
+
+def run_benchmark() -> None:
+    parser = argparse.ArgumentParser(description="Two-node benchmark of the session pipeline in a single process.")
+    parser.add_argument("--sessions", type=int, default=10, help="Sessions run at the same time.")
+    parser.add_argument("--keys", type=int, default=100, help="Keys requested by each session.")
+    parser.add_argument("--chunk", type=int, default=32, help="Bytes per key.")
+    parser.add_argument("--key-sources", default="ML-KEM-512,QKD")
+    parser.add_argument("--hybridization", default="xoring")
+    parser.add_argument("--pqc-batch-size", type=int, default=1, help="KEM exchanges per peer round trip.")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Emulated latency of each peer message.")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0, help="Emulated peer bandwidth (0 is unlimited).")
+    parser.add_argument("--tls", action="store_true", help="Use the real peer connector instead of the loopback one.")
+    parser.add_argument("--ca", default="", help="CA certificate (only with --tls).")
+    parser.add_argument("--cert", default="", help="Node certificate (only with --tls).")
+    parser.add_argument("--key", default="", help="Node key (only with --tls).")
+    args = parser.parse_args()
+
+    kms = KmsEmulator(KmsEmulatorConfiguration(address=free_address()))
+    threading.Thread(target=kms.serve_forever, daemon=True).start()
+
+    configs = [create_node_config(uuid, kms.config.address, args) for uuid in (NODE_A, NODE_B)]
+    peers_info = {config.uuid: PeerInfo(address=config.peer_local_address) for config in configs}
+
+    network = LoopbackNetwork(args.latency_ms / 1000, args.bandwidth_mbps * 1_000_000)
+    nodes = []
+    for config in configs:
+        peer_manager = None if args.tls else LoopbackPeerConnectionManager(config.peer_local_address, network)
+        nodes.append(Etsi004Server(config, peers_info, peer_manager))
+
+    for node in nodes:
+        threading.Thread(target=node.start_server, daemon=True).start()
+    time.sleep(0.5)
+
+    results: dict = {}
+    thread_list: list[threading.Thread] = []
+    start = time.perf_counter()
+    for spi in range(args.sessions):
+        for node in nodes:
+            new_thread = threading.Thread(target=run_application, args=(node, spi, args, results))
+            new_thread.start()
+            thread_list.append(new_thread)
+
+    for thread in thread_list:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    for node in nodes:
+        node.shutdown()
+    kms.shutdown()
+
+    errors = [result["error"] for result in results.values() if "error" in result]
+    matching = sum(
+        1 for spi in range(args.sessions)
+        if results[(NODE_A, spi)].get("keys") is not None
+        and results[(NODE_A, spi)].get("keys") == results[(NODE_B, spi)].get("keys")
+    )
+    finished = [result for result in results.values() if "error" not in result]
+
+    print(f"Peer connector: {'TLS' if args.tls else 'loopback'}")
+    print(f"Sessions with matching keys: {matching}/{args.sessions} ({len(errors)} errors)")
+    print(f"Total time: {elapsed:.3f} s, {args.sessions * args.keys / elapsed:.1f} hybrid keys/s")
+    if finished:
+        print(f"OPEN_CONNECT median: {statistics.median(r['open_connect'] for r in finished) * 1000:.1f} ms")
+        print(f"GET_KEYS median: {statistics.median(r['get_keys'] for r in finished) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    run_benchmark()